@@ -3,125 +3,102 @@ FaaSr Step: Aquifer Simulation
 Simulates aquifer dynamics (groundwater depletion from pumping)
 """
 
+import os
 import sys
-import json
-import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pychamp_faasr import codec, deps, memo, phases, snapshot, stages
+from pychamp_faasr.state import ShardedState
+from pychamp_faasr.store import DataStore
+
+# State shards this step downloads and uploads (see pychamp_faasr.state)
+READS = ("aquifer", "settings")
+WRITES = ("aquifer",)
 
 def install_dependencies():
     """Install required packages in FaaSr container"""
-    print("Installing dependencies...")
-    subprocess.check_call([
-        sys.executable, "-m", "pip", "install", "-q",
-        "numpy", "pandas", "mesa==2.1.1"
-    ])
-    subprocess.check_call([
-        sys.executable, "-m", "pip", "install", "-q",
-        "git+https://github.com/philip928lin/PyCHAMP.git"
-    ])
-    print("Dependencies installed")
+    return deps.install_dependencies(globals().get("faasr_get_file"))
+
+def aquifer_step_faasr(output1="payload", state_codec=codec.DEFAULT_CODEC, horizon=0,
+                       withdrawal_schedules=None, snapshots=True, result_cache=True):
+    """
+    Step the aquifer(s) one season. With horizon > 0, also project every
+    aquifer horizon seasons ahead under withdrawal_schedules (default: the
+    constant stage withdrawal) and upload the float32 trajectory, shape
+    (aquifers, schedules, horizon), as the aquifer.trajectory sidecar.
+    With snapshots, the aquifer comes from init's component snapshot.
+    With result_cache, a step already run on the same shards, arguments and
+    code reuses that run's output (see pychamp_faasr.memo).
+    """
+    layout = ShardedState(DataStore.from_globals(globals()), state_codec=state_codec)
+    timer = phases.Phases("aquifer_step_faasr", layout.store)
+    key = None
+    if result_cache:
+        with timer.phase("lookup"):
+            cache, key, hit = memo.lookup(
+                "aquifer", layout, READS,
+                args={"horizon": horizon, "withdrawal_schedules": withdrawal_schedules},
+                sources=[__file__], completes="aquifer_step_faasr",
+            )
+        if hit:
+            print(f"Updated state shards restored from step cache: {', '.join(WRITES)}")
+            layout.mark_complete("aquifer_step_faasr")
+            timer.report("cache_hit")
+            return
 
-def aquifer_step_faasr(output1="payload"):    
-    # Read state from previous step    
+    # Prefetch the aquifer and settings shards and, when the aquifer is
+    # restored from it, init's component snapshot (see pychamp_faasr.phases)
+    fetched = timer.concurrently("Prelude", {
+        "download": lambda: phases.prefetch(layout, READS, snapshots=snapshots),
+        "stack": lambda: phases.install_and_import(timer, install_dependencies),
+    })["download"]
     try:
-        faasr_get_file(
-            server_name="S3",
-            remote_folder="pychamp-workflow",
-            remote_file="payload",
-            local_folder="",
-            local_file="payload"
-        )
-        print("Downloaded payload from S3")
-        
-        with open("payload", "r") as f:
-            faasr_data = json.load(f)
+        with timer.phase("decode"):
+            state = layout.read(READS)
+        print(f"Downloaded state shards: {', '.join(READS)}")
     except Exception as e:
-        print(f" Could not download payload: {e}")
-        faasr_data = {}
+        print(f" Could not download state: {e}")
+        state = {}
 
-    
-    install_dependencies()
-    
-    # Import after installation
-    from mesa import Model
-    from mesa.time import RandomActivation
-    from py_champ.components.aquifer import Aquifer
-
-    
-    # Get state
-    state = faasr_data.get("state", {})
     if not state or "settings" not in state:
-            print("No valid state found - workflow needs to run init_components first")
-            print("Available keys in faasr_data:", list(faasr_data.keys()))
-            #  sys.exit(1)
-            return
+        print("No valid state found - workflow needs to run init_components first")
+        return
     
     print(f"Previous step: {state.get('workflow_step')}")
     
-    # Recreate model and aquifer from state
-    model = Model()
-    model.schedule = RandomActivation(model)
-    model.current_step = state.get("model_step", 0)
-    
-    # Get aquifer settings and recreate component
-    aquifer_settings = state["settings"]["aquifer"]
-    aquifer_settings["init"]["st"] = state["components"]["aquifer"]["st"]
-    aquifer_settings["init"]["dwl"] = state["components"]["aquifer"]["dwl"]
-    aquifer = Aquifer("aq1", model, aquifer_settings)
-    model.schedule.add(aquifer)
-    
-    print(f"\nAquifer state before step:")
-    print(f"  Saturated thickness: {aquifer.st} m")
-    print(f"  Depth to water: {aquifer.dwl} m")
-    
-    # Simulate pumping withdrawal
-    withdrawal = 5.0  # m-ha
-    inflow = 2.0      # m-ha
-    
-    print(f"\nSimulation inputs:")
-    print(f"  Withdrawal: {withdrawal} m-ha")
-    print(f"  Inflow: {inflow} m-ha")
-    
-    # Run aquifer step
-    dwl_change = aquifer.step(withdrawal=withdrawal, inflow=inflow)
-    
-    print(f"\nAquifer state after step:")
-    print(f"  Saturated thickness: {aquifer.st} m")
-    print(f"  Change in water level: {dwl_change} m")
-    
-    # Update state
-    model.current_step += 1
-    state["workflow_step"] = "aquifer_simulation"
-    state["model_step"] = model.current_step
-    state["components"]["aquifer"].update({
-        "st": aquifer.st,
-        "dwl": aquifer.dwl,
-        "withdrawal": withdrawal,
-        "inflow": inflow,
-        "dwl_change": dwl_change
-    })
-    print("AQUIFER STEP COMPLETED")
-    
-    # Save updated state
-    faasr_data["state"] = state
+    # Array-valued settings describe many aquifers: step them all at once
+    # with the vectorized kernel. Otherwise recreate model and aquifer from
+    # state, then step it
+    if stages.is_array_valued(state["settings"]["aquifer"]):
+        with timer.phase("step"):
+            stages.aquifer_batch_stage(state)
+    else:
+        with timer.phase("construct"):
+            objects = snapshot.restore(layout.store, layout.folder, state["settings"],
+                                       fetched) if snapshots else None
+            sim = stages.restore_aquifer(state, objects)
+        with timer.phase("step"):
+            stages.aquifer_stage(sim)
 
-    # At the end, upload updated state
-    with open("payload", "w") as f:
-        json.dump(faasr_data, f, indent=2)
-    
-    faasr_put_file(
-        server_name="S3",
-        local_folder="",
-        local_file="payload",
-        remote_folder="pychamp-workflow",
-        remote_file="payload"
-    )
-    
-    print("Updated payload uploaded to S3")
-    
-    # with open(output1, "w") as f:
-    #     json.dump(faasr_data, f, indent=2)
-    
-    # print(f"State saved to {output1}")
+    arrays = {}
+    if horizon:
+        with timer.phase("projection"):
+            arrays["aquifer.trajectory"] = stages.aquifer_projection_stage(
+                state, int(horizon), schedules=withdrawal_schedules
+            )
+    
+    # Upload only the shards this step changed
+    with timer.phase("upload"):
+        layout.write(state, WRITES, arrays=arrays, completes="aquifer_step_faasr")
+    print(f"Updated state shards uploaded: {', '.join(WRITES)}"
+          + (f", sidecars: {', '.join(arrays)}" if arrays else ""))
+
+    # Cache this season's aquifer (and projection) under the key of its inputs
+    finish = {"marker": lambda: layout.mark_complete("aquifer_step_faasr")}
+    if key:
+        finish["cache"] = lambda: cache.put(key, "aquifer", layout)
+    timer.concurrently("Epilogue", finish)
+    timer.report()
 
 if __name__ == "__main__":
     aquifer_step_faasr(output1="payload")
@@ -1,6 +1,14 @@
 # behavior_step_faasr.py
 import json
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pychamp_faasr import consumat, deps, neighbors, phases
+from pychamp_faasr.store import DataStore
+
+# Data store folder caching neighbor tables across seasons
+NEIGHBORS_FOLDER = "pychamp-workflow/neighbors"
 
 def behavior_step_faasr():
     """
@@ -8,20 +16,18 @@ def behavior_step_faasr():
     Downloads state, makes decision, uploads updated state.
     """
     print("[behavior_step_faasr] Starting behavior step...")
+    store = DataStore.from_globals(globals())
+    timer = phases.Phases("behavior_step_faasr", store)
     
     # Download state from cloud storage
     print("[behavior_step_faasr] Downloading state from cloud...")
-    faasr_get_file(
-        server_name="S3",
-        remote_folder="pychamp-workflow",
-        remote_file="state.json",
-        local_folder="",
-        local_file="state.json"
-    )
+    with timer.phase("download"):
+        store.get("pychamp-workflow", "state.json", "state.json")
     
     # Load state
-    with open("state.json", "r") as f:
-        state = json.load(f)
+    with timer.phase("decode"):
+        with open("state.json", "r") as f:
+            state = json.load(f)
     
     print("[behavior_step_faasr] State loaded successfully")
     
@@ -40,102 +46,120 @@ def behavior_step_faasr():
     soil_moisture = field["soil_moisture"]
     aquifer_storage = aquifer["init"]["st"]
     
-    print(f"[behavior_step_faasr] Current satisfaction: {current_satisfaction:.2f}")
-    print(f"[behavior_step_faasr] Current uncertainty: {current_uncertainty:.2f}")
-    print(f"[behavior_step_faasr] Soil moisture: {soil_moisture:.2f}")
-    print(f"[behavior_step_faasr] Aquifer storage: {aquifer_storage:.2f} m³")
-    
-    # Simulate decision-making based on CONSUMAT framework
-    # Determine CONSUMAT state
-    if current_satisfaction > satisfaction_threshold:
-        if current_uncertainty <= uncertainty_threshold:
-            consumat_state = "repetition"
-        else:
-            consumat_state = "imitation"
+    # Array-valued behavior/field/aquifer values describe many farmers:
+    # decide for all of them at once with the vectorized CONSUMAT rules
+    inputs = (current_satisfaction, current_uncertainty, satisfaction_threshold,
+              uncertainty_threshold, soil_moisture, aquifer_storage)
+    if any(isinstance(v, list) for v in inputs):
+        phases.install_and_import(
+            timer,
+            lambda: deps.install_dependencies(globals().get("faasr_get_file"), modules=("numpy",)),
+            ("numpy",),
+        )
+        with timer.phase("neighbors"):
+            table = load_neighbors(store, state)
+        with timer.phase("step"):
+            state["decision"] = decide_batch(*inputs, neighbors=table)
     else:
-        if current_uncertainty <= uncertainty_threshold:
-            consumat_state = "deliberation"
-        else:
-            consumat_state = "social_comparison"
+        print(f"[behavior_step_faasr] Current satisfaction: {current_satisfaction:.2f}")
+        print(f"[behavior_step_faasr] Current uncertainty: {current_uncertainty:.2f}")
+        print(f"[behavior_step_faasr] Soil moisture: {soil_moisture:.2f}")
+        print(f"[behavior_step_faasr] Aquifer storage: {aquifer_storage:.2f} m³")
+        with timer.phase("step"):
+            state["decision"] = decide(*inputs)
+
+    # Save updated state to local file
+    with open("state.json", "w") as f:
+        json.dump(state, f, indent=2)
     
-    print(f"[behavior_step_faasr] CONSUMAT state: {consumat_state}")
+    print("[behavior_step_faasr] State updated locally")
     
-    # Make irrigation decision based on state
-    if consumat_state == "repetition":
-        # High satisfaction, low uncertainty - repeat last action
-        irrigation_action = "irrigate"
-        irrigation_amount = 30.0  # Default amount
-        
-    elif consumat_state == "imitation":
-        # High satisfaction, high uncertainty - continue but be cautious
-        irrigation_action = "irrigate"
-        irrigation_amount = 25.0  # Slightly reduced
-        
-    elif consumat_state == "deliberation":
-        # Low satisfaction, low uncertainty - optimize carefully
-        if soil_moisture < 0.3:
-            irrigation_action = "irrigate"
-            irrigation_amount = 35.0  # Increase to improve conditions
-        elif aquifer_storage < 15.0:
-            irrigation_action = "irrigate"
-            irrigation_amount = 20.0  # Conserve water
-        else:
-            irrigation_action = "irrigate"
-            irrigation_amount = 30.0  # Normal amount
-            
-    else:  # social_comparison
-        # Low satisfaction, high uncertainty - be very conservative
-        if aquifer_storage < 10.0:
-            irrigation_action = "no_irrigation"
-            irrigation_amount = 0.0
-        else:
-            irrigation_action = "irrigate"
-            irrigation_amount = 15.0  # Minimal irrigation
+    # Upload updated state back to cloud storage
+    with timer.phase("upload"):
+        store.put("state.json", "pychamp-workflow", "state.json")
     
-    # Consider water availability - don't irrigate if storage is critical
-    if aquifer_storage < 5.0:
+    print("[behavior_step_faasr] State uploaded to cloud")
+    print("[behavior_step_faasr] Behavior step complete!")
+    timer.report()
+
+
+def decide(satisfaction, uncertainty, satisfaction_threshold, uncertainty_threshold,
+           soil_moisture, aquifer_storage):
+    """Decision of one farmer, based on the CONSUMAT framework"""
+    consumat_state, irrigation_action, irrigation_amount = consumat.decide(
+        satisfaction, uncertainty, satisfaction_threshold, uncertainty_threshold,
+        soil_moisture, aquifer_storage
+    )
+    print(f"[behavior_step_faasr] CONSUMAT state: {consumat_state}")
+    if aquifer_storage < consumat.CRITICAL_STORAGE:
         print("[behavior_step_faasr] WARNING: Critical water shortage!")
-        irrigation_action = "no_irrigation"
-        irrigation_amount = 0.0
-    
-    # Consider soil moisture - reduce if already high
-    if soil_moisture > 0.8:
+    if soil_moisture > consumat.WET_SOIL:
         print("[behavior_step_faasr] Soil moisture high, reducing irrigation")
-        irrigation_amount = irrigation_amount * 0.5
-    
+
     # Create decision object
     decision = {
         "action": irrigation_action,
         "amount": irrigation_amount,
-        "satisfaction": current_satisfaction,
-        "uncertainty": current_uncertainty,
+        "satisfaction": satisfaction,
+        "uncertainty": uncertainty,
         "consumat_state": consumat_state,
         "reasoning": f"State: {consumat_state}, Storage: {aquifer_storage:.1f}m³, Soil: {soil_moisture:.2f}"
     }
-    
-    # Update state with decision
-    state["decision"] = decision
-    
+
     print(f"[behavior_step_faasr] Decision made:")
     print(f"  - Action: {irrigation_action}")
     print(f"  - Amount: {irrigation_amount:.1f} mm")
     print(f"  - CONSUMAT state: {consumat_state}")
     print(f"  - Reasoning: {decision['reasoning']}")
-    
-    # Save updated state to local file
-    with open("state.json", "w") as f:
-        json.dump(state, f, indent=2)
-    
-    print("[behavior_step_faasr] State updated locally")
-    
-    # Upload updated state back to cloud storage
-    faasr_put_file(
-        server_name="S3",
-        local_folder="",
-        local_file="state.json",
-        remote_folder="pychamp-workflow",
-        remote_file="state.json"
+    return decision
+
+
+def load_neighbors(store, state, k=8):
+    """
+    Neighbor table of the farmers, if the state locates them: field "x"/"y"
+    coordinate lists, or a behavior "network" of edge lists ("src", "dst",
+    optional "weight"). Built once and cached in ``store``, the step's data
+    store, so its transfers count in the step's metrics.
+    """
+    field, behavior = state["field"], state["behavior"]
+    k = behavior.get("neighbors_k", k)
+    if "network" in behavior:
+        edges = dict(behavior["network"], n=len(behavior["satisfaction"]))
+        return neighbors.cached(store, NEIGHBORS_FOLDER, k, edges=edges)
+    if "x" in field and "y" in field:
+        points = list(zip(field["x"], field["y"]))
+        return neighbors.cached(store, NEIGHBORS_FOLDER, k, points=points)
+    return None
+
+
+def decide_batch(satisfaction, uncertainty, satisfaction_threshold, uncertainty_threshold,
+                 soil_moisture, aquifer_storage, neighbors=None):
+    """
+    Decisions of many farmers at once; the decision object holds lists.
+    With a neighbor table, imitation and social comparison look at each
+    farmer's neighbors.
+    """
+    import numpy as np
+
+    state_index, irrigate, amount = consumat.decide_batch(
+        satisfaction, uncertainty, satisfaction_threshold, uncertainty_threshold,
+        soil_moisture, aquifer_storage
     )
-    
-    print("[behavior_step_faasr] State uploaded to cloud")
-    print("[behavior_step_faasr] Behavior step complete!")
\ No newline at end of file
+    if neighbors is not None:
+        irrigate, amount = consumat.social_adjustment(state_index, irrigate, amount, satisfaction,
+                                                      neighbors)
+        print(f"[behavior_step_faasr] Neighbors: top {neighbors.k} by {neighbors.method}")
+    states = consumat.state_names(state_index)
+    names, counts = np.unique(states, return_counts=True)
+    print(f"[behavior_step_faasr] Farmers: {states.size}, CONSUMAT states: "
+          + ", ".join(f"{n}={c}" for n, c in zip(names, counts)))
+    print(f"[behavior_step_faasr] Irrigating: {int(irrigate.sum())}/{irrigate.size}, "
+          f"total amount: {amount.sum():.1f} mm")
+
+    return {
+        "action": np.where(irrigate, consumat.IRRIGATE, consumat.NO_IRRIGATION).tolist(),
+        "amount": amount.tolist(),
+        "satisfaction": satisfaction,
+        "uncertainty": uncertainty,
+        "consumat_state": states.tolist(),
+    }
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Validate and time the vectorized aquifer kernel against Aquifer.step
+
+Draws random parameters for n aquifers, steps them through T seasons once
+with one PyCHAMP ``Aquifer`` object per aquifer and once with
+``kernels.aquifer_kernel``, checks that saturated thickness and water level
+change agree, and reports both run times. Both the water balance (with
+inflow) and the KGS-WBM (without) forms are checked. Needs the PyCHAMP stack.
+
+    python benchmarks/aquifer_kernel_benchmark.py --aquifers 5000 --seasons 10
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from pychamp_faasr import kernels, stages  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Validate and benchmark the aquifer kernel")
+    parser.add_argument("--aquifers", type=int, default=2000, help="Number of aquifers")
+    parser.add_argument("--seasons", type=int, default=10, help="Seasons per aquifer")
+    parser.add_argument("--rtol", type=float, default=1e-12, help="Relative tolerance")
+    return parser.parse_args()
+
+
+def make_inputs(n, seasons):
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    return {
+        "aq_a": rng.uniform(0.05, 0.2, n),
+        "aq_b": rng.uniform(-1.0, 1.0, n),
+        "area": rng.uniform(50.0, 200.0, n),
+        "sy": rng.uniform(0.1, 0.3, n),
+        "st": rng.uniform(10.0, 50.0, n),
+        "withdrawal": rng.uniform(0.0, 10.0, (n, seasons)),
+        "inflow": rng.uniform(0.0, 5.0, (n, seasons)),
+    }
+
+
+def run_objects(inputs, with_inflow):
+    import numpy as np
+    from py_champ.components.aquifer import Aquifer
+
+    model = stages.new_model()
+    n, seasons = inputs["withdrawal"].shape
+    st = np.empty((n, seasons))
+    dwl = np.empty((n, seasons))
+    for i in range(n):
+        aquifer = Aquifer(f"aq{i}", model, {
+            "aq_a": inputs["aq_a"][i], "aq_b": inputs["aq_b"][i],
+            "area": inputs["area"][i], "sy": inputs["sy"][i],
+            "init": {"st": inputs["st"][i], "dwl": 0.0},
+        })
+        for t in range(seasons):
+            inflow = inputs["inflow"][i, t] if with_inflow else None
+            dwl[i, t] = aquifer.step(withdrawal=inputs["withdrawal"][i, t], inflow=inflow)
+            st[i, t] = aquifer.st
+    return st, dwl
+
+
+def run_kernel(inputs, with_inflow):
+    return kernels.aquifer_kernel(
+        inputs["st"], inputs["withdrawal"], inputs["inflow"] if with_inflow else None,
+        aq_a=inputs["aq_a"], aq_b=inputs["aq_b"], area=inputs["area"], sy=inputs["sy"],
+    )
+
+
+def main():
+    import numpy as np
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_arguments()
+    inputs = make_inputs(args.aquifers, args.seasons)
+
+    for with_inflow in (True, False):
+        label = "water balance" if with_inflow else "KGS-WBM"
+        t0 = time.perf_counter()
+        expected = run_objects(inputs, with_inflow)
+        t_objects = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        actual = run_kernel(inputs, with_inflow)
+        t_kernel = time.perf_counter() - t0
+
+        for name, a, e in zip(("st", "dwl"), actual, expected):
+            np.testing.assert_allclose(a, e, rtol=args.rtol, atol=0, err_msg=f"{label}: {name}")
+        logger.info(
+            f"{label}: {args.aquifers} aquifers x {args.seasons} seasons match; "
+            f"Aquifer.step {t_objects:.3f}s, kernel {t_kernel * 1e3:.2f}ms "
+            f"({t_objects / t_kernel:.0f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Speedup of the closed-form aquifer projection over stepping season by season
+
+Projects A aquifers under K random withdrawal schedules for T seasons twice:
+looping ``st += dwl`` one season at a time (vectorized over aquifers, as
+``aquifer_kernel`` steps them) and with ``kernels.aquifer_projection``.
+Checks that the trajectories agree and reports both run times, for the
+KGS-WBM regression (no inflow) and the water balance.
+
+    python benchmarks/aquifer_projection_benchmark.py --aquifers 1000 --schedules 50 --seasons 100
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from pychamp_faasr import kernels  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the aquifer projection")
+    parser.add_argument("--aquifers", type=int, default=1000, help="Number of aquifers")
+    parser.add_argument("--schedules", type=int, default=50, help="Withdrawal schedules")
+    parser.add_argument("--seasons", type=int, default=100, help="Projection horizon")
+    parser.add_argument("--atol", type=float, default=1e-9, help="Absolute tolerance (m)")
+    return parser.parse_args()
+
+
+def make_inputs(args):
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    a = args.aquifers
+    return {
+        "st": rng.uniform(20.0, 40.0, a),
+        "aq_a": rng.uniform(0.05, 0.2, a),
+        "aq_b": rng.uniform(0.0, 1.0, a),
+        "area": rng.uniform(50.0, 150.0, a),
+        "sy": rng.uniform(0.1, 0.3, a),
+        "withdrawal": rng.uniform(0.0, 10.0, (args.schedules, args.seasons)),
+        "inflow": rng.uniform(0.0, 5.0, (args.schedules, args.seasons)),
+    }
+
+
+def run_loop(p, inflow):
+    import numpy as np
+
+    n_k, n_t = p["withdrawal"].shape
+    trajectory = np.empty((p["st"].size, n_k, n_t))
+    st = np.repeat(p["st"][:, None], n_k, axis=1)
+    t0 = time.perf_counter()
+    for t in range(n_t):
+        w = p["withdrawal"][:, t][None, :]
+        if inflow:
+            st = st + (p["inflow"][:, t][None, :] - w) / (p["area"] * p["sy"])[:, None]
+        else:
+            st = st + (p["aq_b"][:, None] - p["aq_a"][:, None] * w)
+        trajectory[:, :, t] = st
+    return trajectory, time.perf_counter() - t0
+
+
+def run_projection(p, inflow):
+    t0 = time.perf_counter()
+    trajectory = kernels.aquifer_projection(
+        p["st"], p["withdrawal"], p["inflow"] if inflow else None,
+        aq_a=p["aq_a"], aq_b=p["aq_b"], area=p["area"], sy=p["sy"],
+    )
+    return trajectory, time.perf_counter() - t0
+
+
+def main():
+    import numpy as np
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_arguments()
+    p = make_inputs(args)
+    logger.info(f"{args.aquifers} aquifers x {args.schedules} schedules x {args.seasons} seasons")
+    for inflow, name in ((False, "KGS-WBM"), (True, "water balance")):
+        expected, t_loop = run_loop(p, inflow)
+        actual, t_projection = run_projection(p, inflow)
+        np.testing.assert_allclose(actual, expected, rtol=0, atol=args.atol, err_msg=name)
+        logger.info(f"{name:>13}: loop {t_loop:.3f}s, projection {t_projection:.3f}s "
+                    f"({t_loop / t_projection:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Payload size and encode/decode time of the state codecs
+
+Builds a pychamp-workflow style state whose field component carries
+per-field arrays, for 1, 1k and 100k fields, and reports for every codec the
+encoded size and the best-of-N encode and decode times. The legacy
+``json.dump(indent=2)`` encoding is included as the baseline.
+
+    python benchmarks/codec_benchmark.py --repeat 5
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from pychamp_faasr import codec  # noqa: E402
+
+SPECS = [
+    "json",
+    "json+gzip",
+    "json+zstd",
+    "msgpack",
+    "msgpack+zstd",
+    "npz",
+    "npz+gzip",
+    "npz+zstd",
+]
+FIELD_COUNTS = [1, 1_000, 100_000]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the state codecs")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repetitions")
+    parser.add_argument(
+        "--fields", type=int, nargs="+", default=FIELD_COUNTS, help="Field counts"
+    )
+    return parser.parse_args()
+
+
+def make_state(n_fields):
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    with open(os.path.join(REPO_ROOT, "payload"), "rb") as f:
+        state = codec.loads(f.read())["state"]
+
+    state["components"]["field"].update({
+        "yield": rng.uniform(0, 50, n_fields).tolist(),
+        "avg_yield_rate": rng.uniform(0, 1, n_fields).tolist(),
+        "irrigation_volume": rng.uniform(0, 20, n_fields).tolist(),
+        "pumping_rate": rng.uniform(0, 2, n_fields).tolist(),
+    })
+    return {"state": state}
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    args = parse_arguments()
+
+    print(f"{'fields':>8} {'codec':<14} {'bytes':>12} {'encode ms':>10} {'decode ms':>10}")
+    for n in args.fields:
+        obj = make_state(n)
+
+        legacy = json.dumps(obj, indent=2).encode()
+        enc = best_of(lambda: json.dumps(obj, indent=2), args.repeat)
+        dec = best_of(lambda: json.loads(legacy), args.repeat)
+        print(f"{n:>8} {'legacy-json':<14} {len(legacy):>12,} {enc * 1e3:>10.2f} {dec * 1e3:>10.2f}")
+
+        for spec in SPECS:
+            try:
+                data = codec.dumps(obj, spec)
+            except ImportError as e:
+                print(f"{n:>8} {spec:<14} skipped: {e}")
+                continue
+            enc = best_of(lambda: codec.dumps(obj, spec), args.repeat)
+            dec = best_of(lambda: codec.loads(data), args.repeat)
+            print(f"{n:>8} {spec:<14} {len(data):>12,} {enc * 1e3:>10.2f} {dec * 1e3:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Equivalence and speed of the vectorized CONSUMAT rules
+
+Property check: for many random populations, ``consumat.decide_batch`` must
+return, for every farmer, exactly what the scalar ``consumat.decide`` tree
+returns: same state, same action, bit-identical amount. Inputs mix uniform
+draws with the rule boundaries themselves (thresholds, storage limits, soil
+moisture limits) and NaN, where ``<`` / ``>`` / ``<=`` edge cases live. Then
+reports the batched and looped throughput.
+
+    python benchmarks/consumat_equivalence.py --rounds 200 --farmers 1000
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from pychamp_faasr import consumat  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+STORAGE_EDGES = [consumat.CRITICAL_STORAGE, consumat.LOW_STORAGE, consumat.CONSERVE_STORAGE]
+SOIL_EDGES = [consumat.DRY_SOIL, consumat.WET_SOIL]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Check decide_batch against decide")
+    parser.add_argument("--rounds", type=int, default=100, help="Random populations")
+    parser.add_argument("--farmers", type=int, default=1000, help="Farmers per population")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--speed-farmers", type=int, default=100_000,
+                        help="Population size of the timing run")
+    return parser.parse_args()
+
+
+def draw(rng, n, low, high, edges):
+    """Uniform values, with ~30% replaced by boundary values (and some NaN)"""
+    import numpy as np
+
+    values = rng.uniform(low, high, n)
+    special = np.array(edges + [np.nextafter(e, -np.inf) for e in edges]
+                       + [np.nextafter(e, np.inf) for e in edges] + [np.nan])
+    pick = rng.random(n) < 0.3
+    values[pick] = rng.choice(special, pick.sum())
+    return values
+
+
+def population(rng, n):
+    satisfaction_threshold = draw(rng, n, 0.0, 1.0, [0.5])
+    uncertainty_threshold = draw(rng, n, 0.0, 1.0, [0.5])
+    # Some farmers sit exactly on their own thresholds
+    satisfaction = draw(rng, n, 0.0, 1.0, [0.5])
+    uncertainty = draw(rng, n, 0.0, 1.0, [0.5])
+    on_edge = rng.random(n) < 0.1
+    satisfaction[on_edge] = satisfaction_threshold[on_edge]
+    uncertainty[on_edge] = uncertainty_threshold[on_edge]
+    return (satisfaction, uncertainty, satisfaction_threshold, uncertainty_threshold,
+            draw(rng, n, 0.0, 1.0, SOIL_EDGES), draw(rng, n, 0.0, 30.0, STORAGE_EDGES))
+
+
+def check(inputs):
+    state, irrigate, amount = consumat.decide_batch(*inputs)
+    for i, args in enumerate(zip(*(a.tolist() for a in inputs))):
+        expected = consumat.decide(*args)
+        actual = (consumat.STATES[state[i]],
+                  consumat.IRRIGATE if irrigate[i] else consumat.NO_IRRIGATION,
+                  float(amount[i]))
+        if actual != expected:
+            raise AssertionError(f"Farmer {i} with inputs {args}: batch {actual} != scalar {expected}")
+
+
+def main():
+    import numpy as np
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_arguments()
+    rng = np.random.default_rng(args.seed)
+
+    for _ in range(args.rounds):
+        check(population(rng, args.farmers))
+    logger.info(f"decide_batch matches decide for {args.rounds} x {args.farmers} farmers")
+
+    inputs = population(rng, args.speed_farmers)
+    t0 = time.perf_counter()
+    consumat.decide_batch(*inputs)
+    t_batch = time.perf_counter() - t0
+    scalar_args = list(zip(*(a.tolist() for a in inputs)))
+    t0 = time.perf_counter()
+    for a in scalar_args:
+        consumat.decide(*a)
+    t_loop = time.perf_counter() - t0
+    logger.info(f"{args.speed_farmers} farmers: loop {t_loop:.3f}s, batch {t_batch * 1e3:.2f}ms "
+                f"({t_loop / t_batch:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
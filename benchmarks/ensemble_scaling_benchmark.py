@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Per-core scaling of the process-pool ensemble executor
+
+Runs the same Latin hypercube ensemble through ``ensemble.run_shard`` with
+1, 2, 4, ... worker processes and reports scenarios/sec, speedup over one
+worker and parallel efficiency. Needs the PyCHAMP stack installed.
+
+    python benchmarks/ensemble_scaling_benchmark.py --scenarios 400 --workers 1 2 4
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from pychamp_faasr import ensemble  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def default_workers():
+    counts, n = [], 1
+    while n < (os.cpu_count() or 1):
+        counts.append(n)
+        n *= 2
+    return counts + [os.cpu_count() or 1]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark ensemble throughput per core")
+    parser.add_argument("--scenarios", type=int, default=200, help="Scenarios per run")
+    parser.add_argument("--seasons", type=int, default=1, help="Seasons per scenario")
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=default_workers(),
+        help="Worker counts to measure (default: 1, 2, 4, ... up to the CPU count)",
+    )
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Scenarios per pool task (default: automatic)")
+    return parser.parse_args()
+
+
+def make_spec(n_scenarios, n_seasons):
+    return {
+        "method": "lhs",
+        "samples": n_scenarios,
+        "seed": 1,
+        "n_seasons": n_seasons,
+        "parameters": {
+            "aquifer.aq_a": [0.05, 0.2],
+            "aquifer.sy": [0.1, 0.3],
+            "finance.crop_price.corn": [3.0, 7.0],
+        },
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_arguments()
+    spec = make_spec(args.scenarios, args.seasons)
+
+    logger.info(f"{args.scenarios} scenario(s) x {args.seasons} season(s), "
+                f"{os.cpu_count()} CPU(s)")
+    logger.info(f"{'workers':>8} {'seconds':>9} {'scen/s':>9} {'speedup':>8} {'efficiency':>10}")
+    base = None
+    for workers in args.workers:
+        # Pool start-up (worker imports) is part of the measured time
+        t0 = time.perf_counter()
+        table = ensemble.run_shard(spec, 1, 1, workers=workers, chunksize=args.chunksize)
+        elapsed = time.perf_counter() - t0
+        if table["failed"].any():
+            logger.warning(f"{int(table['failed'].sum())} scenario(s) failed")
+        rate = args.scenarios / elapsed
+        base = base or rate
+        logger.info(f"{workers:>8} {elapsed:>9.2f} {rate:>9.1f} "
+                    f"{rate / base:>8.2f} {rate / base / workers:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Speedup of the batched field kernel over looping Field.step
+
+Builds N fields with random irrigation depths, crop choices, techs and
+field areas, runs one season through one PyCHAMP ``Field`` per field and
+through ``kernels.field_kernel``, checks that yields, average yield ratios,
+irrigation volumes and pumping rates agree, and reports both run times.
+Needs the PyCHAMP stack.
+
+    python benchmarks/field_kernel_benchmark.py --fields 10000
+"""
+
+import argparse
+import copy
+import logging
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from pychamp_faasr import kernels, stages  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the batched field kernel")
+    parser.add_argument("--fields", type=int, default=10_000, help="Number of fields")
+    parser.add_argument("--rtol", type=float, default=1e-10, help="Relative tolerance")
+    return parser.parse_args()
+
+
+def make_inputs(n):
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    n_s, n_c = stages.AREA_SPLIT, len(stages.CROP_OPTIONS)
+    settings = stages.DEFAULT_SETTINGS["field"]
+    _, _, tech_options = kernels.field_tables(settings, stages.CROP_OPTIONS)
+
+    # One crop per section
+    i_crop = np.zeros((n, n_s, n_c))
+    crop = rng.integers(0, n_c, (n, n_s))
+    i_crop[np.arange(n)[:, None], np.arange(n_s)[None, :], crop] = 1
+    return {
+        "irr_depth": rng.uniform(0.0, 40.0, (n, n_s, n_c)),
+        "i_crop": i_crop,
+        "te": rng.integers(0, len(tech_options), n),
+        "tech_options": tech_options,
+        "field_area": rng.uniform(20.0, 200.0, n),
+    }
+
+
+def run_objects(inputs):
+    import numpy as np
+
+    model = stages.new_model()
+    n = len(inputs["te"])
+    fields = []
+    for i in range(n):
+        settings = copy.deepcopy(stages.DEFAULT_SETTINGS["field"])
+        settings["field_area"] = inputs["field_area"][i]
+        fields.append(stages.new_field(model, settings, f"f{i}"))
+
+    out = {k: np.empty(n) for k in ("y", "avg_y_y", "irr_vol", "pumping_rate")}
+    t0 = time.perf_counter()
+    for i, field in enumerate(fields):
+        y, avg_y_y, irr_vol = field.step(
+            inputs["irr_depth"][i][..., None], inputs["i_crop"][i][..., None],
+            inputs["tech_options"][inputs["te"][i]], stages.PREC_AW,
+        )
+        out["y"][i] = np.sum(y)
+        out["avg_y_y"][i] = avg_y_y
+        out["irr_vol"][i] = irr_vol
+        out["pumping_rate"][i] = field.pumping_rate
+    return out, time.perf_counter() - t0
+
+
+def run_kernel(inputs):
+    settings = stages.DEFAULT_SETTINGS["field"]
+    curves, tech_coefs, _ = kernels.field_tables(
+        settings, stages.CROP_OPTIONS, inputs["tech_options"]
+    )
+    t0 = time.perf_counter()
+    result = kernels.field_kernel(
+        inputs["irr_depth"], inputs["i_crop"], inputs["te"],
+        [stages.PREC_AW[c] for c in stages.CROP_OPTIONS],
+        curves, tech_coefs, inputs["field_area"],
+    )
+    elapsed = time.perf_counter() - t0
+    result["y"] = result["y"].sum(axis=(1, 2))
+    return result, elapsed
+
+
+def main():
+    import numpy as np
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_arguments()
+    inputs = make_inputs(args.fields)
+
+    expected, t_objects = run_objects(inputs)
+    actual, t_kernel = run_kernel(inputs)
+    for name in expected:
+        np.testing.assert_allclose(actual[name], expected[name], rtol=args.rtol,
+                                   err_msg=f"field kernel: {name}")
+
+    logger.info(f"{args.fields} fields match Field.step "
+                f"(yield, avg_y_y, irrigation volume, pumping rate)")
+    logger.info(f"Field.step loop: {t_objects:.3f}s ({args.fields / t_objects:,.0f} fields/s)")
+    logger.info(f"field_kernel:    {t_kernel:.4f}s ({args.fields / t_kernel:,.0f} fields/s)")
+    logger.info(f"Speedup: {t_objects / t_kernel:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
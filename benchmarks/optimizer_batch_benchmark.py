@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Per-agent solve time of the irrigation MILPs by batch size
+
+Solves the same N farmers' plans (random storage, field area and crop
+prices) with one farmer per HiGHS call and with block-diagonal batches of
+increasing size, checks that every batch size finds the same optimal
+profits, and reports solver calls and time per agent.
+
+    python benchmarks/optimizer_batch_benchmark.py --farmers 1024 --batch-sizes 1 16 64 256 1024
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from pychamp_faasr import optimizer, stages  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark batched irrigation MILPs")
+    parser.add_argument("--farmers", type=int, default=1024, help="Number of farmers")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 64, 256, 1024],
+                        help="Farmers per solver call")
+    parser.add_argument("--lp", action="store_true", help="Solve the LP relaxation instead")
+    return parser.parse_args()
+
+
+def make_inputs(n):
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    base = [stages.DEFAULT_SETTINGS["finance"]["crop_price"][c] for c in stages.CROP_OPTIONS]
+    return {
+        "storage": rng.uniform(0.0, 40.0, n),
+        "field_area": rng.uniform(20.0, 200.0, n),
+        "crop_price": np.asarray(base) * rng.uniform(0.7, 1.3, (n, len(base))),
+    }
+
+
+def main():
+    import numpy as np
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_arguments()
+    inputs = make_inputs(args.farmers)
+
+    reference = None
+    for batch_size in args.batch_sizes:
+        result = optimizer.solve(**inputs, integer=not args.lp, batch_size=batch_size)
+        if reference is None:
+            reference = result["profit"]
+        np.testing.assert_allclose(result["profit"], reference, rtol=1e-6,
+                                   err_msg=f"batch size {batch_size}")
+        logger.info(f"batch {batch_size:>5}: {result['n_calls']:>5} calls, "
+                    f"{result['solve_time']:.3f}s, "
+                    f"{result['solve_time_per_agent'] * 1e3:.3f} ms/agent")
+    logger.info(f"{args.farmers} farmers: every batch size finds the same optimal profits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Solve-time reduction of the optimizer's solution cache
+
+Runs M ensemble members for S seasons over the same N farmers. Members
+differ in their crop prices only every few members (as when an ensemble
+varies parameters the optimizer does not see), and storage declines a
+little each season. Solves every season of every member cold (no cache),
+then with one ``SolutionCache`` shared by all of them, and reports the memo
+hit rate, the number of problems solved and the total solve times. Warm
+starts take effect only with highspy installed.
+
+    python benchmarks/optimizer_cache_benchmark.py --farmers 500 --members 8 --seasons 5
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from pychamp_faasr import optimizer, stages  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the optimizer solution cache")
+    parser.add_argument("--farmers", type=int, default=500, help="Farmers per member")
+    parser.add_argument("--members", type=int, default=8, help="Ensemble members")
+    parser.add_argument("--seasons", type=int, default=5, help="Seasons per member")
+    parser.add_argument("--price-groups", type=int, default=2,
+                        help="Distinct crop price sets among the members")
+    return parser.parse_args()
+
+
+def runs(args):
+    """(member, season, inputs) of every solve"""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    storage = rng.uniform(5.0, 40.0, args.farmers)
+    field_area = rng.uniform(20.0, 200.0, args.farmers)
+    base = np.array([stages.DEFAULT_SETTINGS["finance"]["crop_price"][c]
+                     for c in stages.CROP_OPTIONS])
+    prices = [base * rng.uniform(0.8, 1.2, base.shape) for _ in range(args.price_groups)]
+    for member in range(args.members):
+        for season in range(args.seasons):
+            yield member, season, {
+                "storage": storage - 0.2 * season,
+                "field_area": field_area,
+                "crop_price": prices[member % args.price_groups],
+            }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_arguments()
+
+    cold_time = cold_solved = 0
+    for _, _, inputs in runs(args):
+        result = optimizer.solve(**inputs)
+        cold_time += result["solve_time"]
+        cold_solved += result["n_solved"]
+
+    cache = optimizer.SolutionCache()
+    cached_time = cached_solved = warm = 0
+    for _, _, inputs in runs(args):
+        result = optimizer.solve(**inputs, cache=cache)
+        cached_time += result["solve_time"]
+        cached_solved += result["n_solved"]
+        warm += result["n_warm"]
+
+    total = args.members * args.seasons * args.farmers
+    logger.info(f"{args.members} members x {args.seasons} seasons x {args.farmers} farmers "
+                f"= {total} farmer problems")
+    logger.info(f"cold:   {cold_solved} solved, {cold_time:.2f}s")
+    logger.info(f"cached: {cached_solved} solved ({warm} warm-started), {cached_time:.2f}s, "
+                f"memo hit rate {cache.hit_rate:.1%}")
+    logger.info(f"Solve-time reduction: {1 - cached_time / cold_time:.1%}"
+                + ("" if optimizer.warm_start_available() else " (highspy not installed: no warm starts)"))
+
+
+if __name__ == "__main__":
+    main()
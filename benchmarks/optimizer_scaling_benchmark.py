@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Scaling of the parallel irrigation optimizer from 1 to N workers
+
+Solves the same N distinct farmer problems (random storage, field area and
+crop prices) with 1, 2, 4, ... workers up to the CPU count, checks that
+every run returns the same plans, and reports wall time, speedup and
+parallel efficiency. The busy time (solver seconds summed over workers)
+against the wall time shows how evenly the chunks kept workers loaded.
+
+    python benchmarks/optimizer_scaling_benchmark.py --farmers 10000
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from pychamp_faasr import optimizer, stages  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark parallel irrigation optimization")
+    parser.add_argument("--farmers", type=int, default=10_000, help="Number of farmers")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1,
+                        help="Largest worker count")
+    parser.add_argument("--batch-size", type=int, default=optimizer.BATCH_SIZE,
+                        help="Largest chunk of farmers per solver call")
+    return parser.parse_args()
+
+
+def worker_counts(max_workers):
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+    return counts
+
+
+def main():
+    import numpy as np
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_arguments()
+    rng = np.random.default_rng(0)
+    base = np.array([stages.DEFAULT_SETTINGS["finance"]["crop_price"][c] for c in stages.CROP_OPTIONS])
+    inputs = {
+        "storage": rng.uniform(0.0, 40.0, args.farmers),
+        "field_area": rng.uniform(20.0, 200.0, args.farmers),
+        "crop_price": base * rng.uniform(0.7, 1.3, (args.farmers, len(base))),
+    }
+
+    reference = None
+    for workers in worker_counts(args.max_workers):
+        result = optimizer.solve(**inputs, workers=workers, batch_size=args.batch_size)
+        if reference is None:
+            reference = result
+        np.testing.assert_array_equal(result["sections"], reference["sections"],
+                                      err_msg=f"{workers} workers")
+        speedup = reference["solve_time"] / result["solve_time"]
+        logger.info(f"{workers:>3} workers: {result['solve_time']:7.2f}s wall, "
+                    f"{result['solver_seconds']:7.2f}s busy, {result['n_calls']:>4} chunks, "
+                    f"speedup {speedup:5.2f}x, efficiency {speedup / workers:.0%}")
+    logger.info(f"{args.farmers} farmers: every worker count returns the same plans")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Critical path of a step's prelude, sequential versus overlapped
+
+Writes a sharded state to a local data store that sleeps ``--latency``
+seconds per transfer (a stand-in for S3 round trips), then times what a
+step does before computing: download the shards, install the stack (a
+subprocess sleeping ``--install-seconds``, standing in for pip) and import
+it. Once one after the other, as the steps used to, and once with
+pychamp_faasr.phases overlapping the download with the install and imports.
+
+    python benchmarks/prelude_benchmark.py --latency 0.3 --install-seconds 2
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from pychamp_faasr import phases, tables  # noqa: E402
+from pychamp_faasr.state import ShardedState  # noqa: E402
+from pychamp_faasr.store import DataStore  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the overlapped step prelude")
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds per transfer")
+    parser.add_argument("--install-seconds", type=float, default=2.0,
+                        help="Simulated dependency install time")
+    parser.add_argument("--rows", type=int, default=10_000, help="Rows per component shard")
+    return parser.parse_args()
+
+
+class SlowStore(DataStore):
+    """Local data store with a fixed latency per transfer"""
+
+    def __init__(self, latency, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    def get(self, remote_folder, remote_file, local_file):
+        time.sleep(self.latency)
+        return super().get(remote_folder, remote_file, local_file)
+
+    def put(self, local_file, remote_folder, remote_file):
+        time.sleep(self.latency)
+        return super().put(local_file, remote_folder, remote_file)
+
+
+def make_state(rows):
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    components = {
+        name: tables.from_records(name, [{"st": float(v)} for v in rng.uniform(0, 40, rows)])
+        for name in ("aquifer", "well", "field", "finance")
+    }
+    return {"settings": {"rows": rows}, "components": components}
+
+
+def install(seconds):
+    subprocess.check_call([sys.executable, "-c", f"import time; time.sleep({seconds})"])
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_arguments()
+    root = tempfile.mkdtemp(prefix="prelude-benchmark-")
+    os.chdir(root)
+
+    store = SlowStore(0.0, local_root=os.path.join(root, "store"))
+    ShardedState(store, "bench", state_codec="json").write(make_state(args.rows), force=True)
+    store.latency = args.latency
+
+    timer = phases.Phases()
+    layout = ShardedState(store, "bench", state_codec="json")
+    start = time.perf_counter()
+    with timer.phase("download"):
+        layout.fetch()
+    phases.install_and_import(timer, lambda: install(args.install_seconds), ("numpy",))
+    sequential = time.perf_counter() - start
+    logger.info("Sequential: " + ", ".join(f"{k} {v:.2f}s" for k, v in timer.seconds.items()))
+
+    timer = phases.Phases()
+    layout = ShardedState(store, "bench", state_codec="json")
+    start = time.perf_counter()
+    timer.concurrently("Prelude", {
+        "download": lambda: phases.prefetch(layout, layout.read_manifest()["shards"]),
+        "stack": lambda: phases.install_and_import(
+            timer, lambda: install(args.install_seconds), ("numpy",)
+        ),
+    })
+    overlapped = time.perf_counter() - start
+    logger.info("Overlapped: " + ", ".join(f"{k} {v:.2f}s" for k, v in timer.seconds.items()))
+
+    logger.info(f"Prelude critical path: {sequential:.2f}s sequential, {overlapped:.2f}s "
+                f"overlapped ({sequential - overlapped:.2f}s saved)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Reconstructing components against restoring a snapshot
+
+For 1 and 10k agents, builds one Aquifer, Well, Field and Finance per agent
+in a single model the way the steps rebuild them (``Field`` with its
+truncated-normal parameters), then pickles them as a component snapshot,
+and reports the reconstruction time, the snapshot size and the restore
+(unpickle) time. Needs the PyCHAMP stack.
+
+    python benchmarks/snapshot_benchmark.py --agents 1 10000
+"""
+
+import argparse
+import copy
+import logging
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from pychamp_faasr import snapshot, stages  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark component snapshots")
+    parser.add_argument("--agents", type=int, nargs="+", default=[1, 10_000],
+                        help="Agent counts to benchmark")
+    parser.add_argument("--path", default="snapshot_benchmark.snapshot",
+                        help="Scratch snapshot file")
+    return parser.parse_args()
+
+
+def reconstruct(n, settings):
+    from py_champ.components.aquifer import Aquifer
+    from py_champ.components.finance import Finance
+    from py_champ.components.well import Well
+
+    model = stages.new_model()
+    objects = {"model": model, "aquifer": [], "well": [], "field": [], "finance": []}
+    for i in range(n):
+        agent_settings = copy.deepcopy(settings)
+        objects["aquifer"].append(Aquifer(f"aq{i}", model, agent_settings["aquifer"]))
+        objects["well"].append(Well(f"w{i}", model, agent_settings["well"]))
+        objects["field"].append(stages.new_field(model, agent_settings["field"], f"f{i}"))
+        objects["finance"].append(Finance(f"fin{i}", model, agent_settings["finance"]))
+    return objects
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_arguments()
+    settings = stages.DEFAULT_SETTINGS
+
+    for n in args.agents:
+        t0 = time.perf_counter()
+        objects = reconstruct(n, settings)
+        t_build = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        size = snapshot.dump(objects, args.path, settings)
+        t_dump = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        restored = snapshot.load(args.path, settings)
+        t_restore = time.perf_counter() - t0
+        assert len(restored["field"]) == n
+
+        logger.info(f"{n:>6} agents: reconstruct {t_build:.3f}s, restore {t_restore:.3f}s "
+                    f"({t_build / t_restore:.1f}x), snapshot {size / 1e6:.2f} MB "
+                    f"written in {t_dump:.3f}s")
+    os.remove(args.path)
+
+
+if __name__ == "__main__":
+    main()
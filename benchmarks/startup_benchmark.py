@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Time-to-first-line-of-simulation for the generic and the baked PyCHAMP image
+
+Each run starts a fresh container, performs the same dependency step the
+actions perform (pychamp_faasr.deps.install_dependencies), imports mesa and
+PyCHAMP, builds the first component and prints a marker line. The time from
+`docker run` to that marker is reported. Images are pulled up front so pull
+time is not counted.
+
+    python benchmarks/startup_benchmark.py --baked-image <image>:<sha> --runs 5
+    python benchmarks/startup_benchmark.py --baked-image <image>:<sha> --wheelhouse /path/to/wheels
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(levelname)s: %(message)s",
+    stream=sys.stdout,
+    force=True,
+)
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARKER = "PYCHAMP-FIRST-LINE"
+
+FIRST_LINE_SNIPPET = f"""
+import sys
+sys.path.insert(0, "/bench")
+from pychamp_faasr.deps import install_dependencies
+install_dependencies()
+from mesa import Model
+from mesa.time import RandomActivation
+from py_champ.components.aquifer import Aquifer
+model = Model()
+model.schedule = RandomActivation(model)
+Aquifer("aq1", model, {{"aq_a": 0.1, "aq_b": 10.0, "area": 100.0, "sy": 0.2,
+                        "init": {{"st": 30.0, "dwl": 0.0}}}})
+print("{MARKER}", flush=True)
+"""
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Compare PyCHAMP startup time on the generic and baked images"
+    )
+    parser.add_argument(
+        "--generic-image", default="ghcr.io/faasr/github-actions-python:latest"
+    )
+    parser.add_argument(
+        "--baked-image",
+        required=True,
+        help="Pinned tag of the image built by containers/pychamp/build.sh",
+    )
+    parser.add_argument("--runs", type=int, default=3, help="Runs per image")
+    parser.add_argument(
+        "--wheelhouse",
+        default="",
+        help="Unpacked wheelhouse directory to mount into the generic image "
+        "(otherwise it installs online)",
+    )
+    return parser.parse_args()
+
+
+def time_to_first_line(image, wheelhouse=""):
+    cmd = ["docker", "run", "--rm", "-v", f"{REPO_ROOT}:/bench:ro"]
+    if wheelhouse:
+        cmd += ["-v", f"{os.path.abspath(wheelhouse)}:/tmp/pychamp-wheelhouse:ro"]
+    cmd += [image, "python3", "-c", FIRST_LINE_SNIPPET]
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    elapsed = None
+    for line in proc.stdout:
+        if line.strip() == MARKER:
+            elapsed = time.perf_counter() - start
+    proc.wait()
+    if proc.returncode != 0 or elapsed is None:
+        logger.error(f"Run on {image} failed (exit code {proc.returncode})")
+        sys.exit(1)
+    return elapsed
+
+
+def main():
+    args = parse_arguments()
+
+    images = {"generic": args.generic_image, "baked": args.baked_image}
+    for image in images.values():
+        subprocess.check_call(["docker", "pull", "-q", image])
+
+    results = {}
+    for label, image in images.items():
+        wheelhouse = args.wheelhouse if label == "generic" else ""
+        times = [time_to_first_line(image, wheelhouse) for _ in range(args.runs)]
+        results[label] = times
+        logger.info(
+            f"{label:8s} {image}: median {statistics.median(times):.2f}s, "
+            f"min {min(times):.2f}s over {len(times)} runs"
+        )
+
+    speedup = statistics.median(results["generic"]) / statistics.median(results["baked"])
+    logger.info(f"Baked image reaches the first simulation line {speedup:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
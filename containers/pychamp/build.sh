@@ -0,0 +1,43 @@
+#!/usr/bin/env bash
+# Build (and optionally push) the PyCHAMP action image.
+#
+#   containers/pychamp/build.sh [--ref <pychamp branch|tag|sha>] [--push]
+#
+# The PyCHAMP ref is resolved to a commit SHA so the image is reproducible;
+# the image is tagged with the short SHA only, never :latest, so workflows
+# always name the exact stack they run on.
+set -euo pipefail
+
+IMAGE="${IMAGE:-ghcr.io/nirali112/pychamp-github-actions-python}"
+REF="main"
+PUSH=0
+
+while [[ $# -gt 0 ]]; do
+    case "$1" in
+        --ref) REF="$2"; shift 2 ;;
+        --push) PUSH=1; shift ;;
+        *) echo "Unknown argument: $1" >&2; exit 1 ;;
+    esac
+done
+
+if [[ "$REF" =~ ^[0-9a-f]{40}$ ]]; then
+    COMMIT="$REF"
+else
+    COMMIT="$(git ls-remote https://github.com/philip928lin/PyCHAMP.git "$REF" | cut -f1 | head -n1)"
+fi
+if [[ -z "$COMMIT" ]]; then
+    echo "Could not resolve PyCHAMP ref '$REF'" >&2
+    exit 1
+fi
+
+HERE="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+echo "Building $IMAGE with PyCHAMP $COMMIT"
+
+docker build \
+    --build-arg PYCHAMP_COMMIT="$COMMIT" \
+    -t "$IMAGE:${COMMIT:0:12}" \
+    "$HERE"
+
+if [[ "$PUSH" == 1 ]]; then
+    docker push "$IMAGE:${COMMIT:0:12}"
+fi
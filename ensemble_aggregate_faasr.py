@@ -0,0 +1,48 @@
+"""
+FaaSr Step: Ensemble Aggregate
+Fan-in: merges every shard's part into one columnar result table
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pychamp_faasr import deps, ensemble
+from pychamp_faasr.state import run_folder
+from pychamp_faasr.store import DataStore
+
+def install_dependencies():
+    """Install required packages"""
+    return deps.install_dependencies(globals().get("faasr_get_file"), modules=("numpy",))
+
+def ensemble_aggregate_faasr(output1="results.npz", table_format="npz"):
+    """Merge the shard parts, ordered by scenario, and upload the table"""
+    install_dependencies()
+
+    store = DataStore.from_globals(globals())
+    folder = f"{run_folder(store.invocation_id)}/{ensemble.ENSEMBLE_FOLDER}"
+    store.get(folder, ensemble.SPEC_FILE, ensemble.SPEC_FILE)
+    n_shards = ensemble.load_spec(ensemble.SPEC_FILE)["n_shards"]
+
+    parts = [f"part-{rank}.npz" for rank in range(1, n_shards + 1)]
+    missing = [p for p in parts if not store.exists(folder, p)]
+    if missing:
+        raise FileNotFoundError(f"Missing shard results under {folder}: {missing}")
+    tables = []
+    for part in parts:
+        store.get(folder, part, part)
+        tables.append(ensemble.read_table(part))
+    table = ensemble.concat_tables(tables)
+
+    n = len(table["scenario"])
+    busy = table["seconds"].sum()
+    print(f"Merged {n} scenario(s) from {n_shards} shard(s), "
+          f"{int(table['failed'].sum())} failed")
+    print(f"Scenario time: {busy:.2f}s total, {busy / n_shards:.2f}s per shard on average")
+
+    size = ensemble.write_table(table, output1, table_format)
+    store.put(output1, folder, output1)
+    print(f"Result table ({size} bytes, {len(table)} columns) uploaded to {folder}/{output1}")
+
+if __name__ == "__main__":
+    ensemble_aggregate_faasr()
@@ -0,0 +1,43 @@
+"""
+FaaSr Step: Ensemble Plan
+Validates an ensemble spec and stores it for the shard actions
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pychamp_faasr import ensemble
+from pychamp_faasr.state import run_folder
+from pychamp_faasr.store import DataStore
+
+def ensemble_plan_faasr(spec=None, spec_file=None, n_shards=1):
+    """
+    Expand the ensemble spec (given inline, or as a data store key in
+    spec_file) and publish it with the shard count for shard/aggregate
+    """
+    store = DataStore.from_globals(globals())
+    if spec_file:
+        folder, _, name = spec_file.rpartition("/")
+        store.get(folder, name, "ensemble-spec")
+        spec = ensemble.load_spec("ensemble-spec")
+    if not spec:
+        raise ValueError("An ensemble spec (spec or spec_file) is required")
+
+    # Sampling is pure Python: no dependency install needed here
+    scenarios = ensemble.expand(spec)
+    paths = ensemble.parameter_paths(scenarios)
+    print(f"Ensemble: {len(scenarios)} scenario(s) via {spec.get('method', 'grid')}, "
+          f"{n_shards} shard(s) of ~{len(scenarios) // n_shards}")
+    print(f"Varied settings: {paths}")
+
+    folder = f"{run_folder(store.invocation_id)}/{ensemble.ENSEMBLE_FOLDER}"
+    ensemble.dump_spec(spec, n_shards, ensemble.SPEC_FILE)
+    store.put(ensemble.SPEC_FILE, folder, ensemble.SPEC_FILE)
+    print(f"Spec uploaded to {folder}/{ensemble.SPEC_FILE}")
+
+if __name__ == "__main__":
+    ensemble_plan_faasr(spec={
+        "method": "grid",
+        "parameters": {"aquifer.aq_a": [0.05, 0.1], "finance.crop_price.corn": [4.0, 5.0]},
+    })
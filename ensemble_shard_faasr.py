@@ -0,0 +1,50 @@
+"""
+FaaSr Step: Ensemble Shard
+Runs one shard's slice of the ensemble; invoked as shard(N)
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pychamp_faasr import deps, ensemble
+from pychamp_faasr.state import run_folder
+from pychamp_faasr.store import DataStore
+
+def install_dependencies():
+    """Install required packages in FaaSr container"""
+    return deps.install_dependencies(globals().get("faasr_get_file"))
+
+def ensemble_shard_faasr(rank=None, workers=0, chunksize=None):
+    """
+    Run this action's scenarios and upload them as one table part. workers
+    sets the process pool size (0: one per CPU, 1: run in this process).
+    """
+    install_dependencies()
+
+    store = DataStore.from_globals(globals())
+    folder = f"{run_folder(store.invocation_id)}/{ensemble.ENSEMBLE_FOLDER}"
+    store.get(folder, ensemble.SPEC_FILE, ensemble.SPEC_FILE)
+    spec = ensemble.load_spec(ensemble.SPEC_FILE)
+
+    rank, n_shards = ensemble.faasr_shard(globals(), rank, spec["n_shards"])
+    if n_shards != spec["n_shards"]:
+        raise ValueError(
+            f"Invoked as shard({n_shards}) but the plan expects {spec['n_shards']} shards"
+        )
+
+    t0 = time.perf_counter()
+    table = ensemble.run_shard(spec, rank, n_shards, workers=workers, chunksize=chunksize)
+    elapsed = time.perf_counter() - t0
+    n = len(table["scenario"])
+    print(f"Shard {rank}/{n_shards}: {n} scenario(s) in {elapsed:.2f}s "
+          f"({n / elapsed if elapsed else 0:.1f}/s on {workers or os.cpu_count()} worker(s)), "
+          f"{int(table['failed'].sum())} failed")
+
+    part = f"part-{rank}.npz"
+    ensemble.write_table(table, part)
+    store.put(part, folder, part)
+
+if __name__ == "__main__":
+    ensemble_shard_faasr(rank=1)
@@ -3,161 +3,113 @@ FaaSr Step: Finance Calculation
 Calculates costs, revenue, and profit
 """
 
+import os
 import sys
-import json
-import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pychamp_faasr import codec, deps, ensemble, memo, phases, snapshot, stages, tables
+from pychamp_faasr.state import ShardedState, run_folder
+from pychamp_faasr.store import DataStore
+
+# State shards this step downloads and uploads (see pychamp_faasr.state)
+READS = ("field", "well", "finance", "settings")
+WRITES = ("finance",)
 
 def install_dependencies():
     """Install required packages in FaaSr container"""
-    print("Installing dependencies...")
-    subprocess.check_call([
-        sys.executable, "-m", "pip", "install", "-q",
-        "numpy", "pandas", "mesa==2.1.1"
-    ])
-    subprocess.check_call([
-        sys.executable, "-m", "pip", "install", "-q",
-        "git+https://github.com/philip928lin/PyCHAMP.git"
-    ])
-    print("Dependencies installed")
+    return deps.install_dependencies(globals().get("faasr_get_file"))
 
-def finance_step_faasr(output1="payload"):
-    """Calculate finance and profit"""
-    
-    # Download from S3
+def finance_step_faasr(output1="payload", state_codec=codec.DEFAULT_CODEC,
+                       price_scenarios=None, snapshots=True, result_cache=True):
+    """
+    Calculate finance and profit. price_scenarios, an ensemble-style spec
+    over crop_price.<crop> and energy_price, also settles the season under
+    every price scenario. With snapshots, well and finance come from init's
+    component snapshot. With result_cache, a step already run on the same
+    shards and code reuses that run's output (see pychamp_faasr.memo); not
+    with price_scenarios, whose table is written outside the state.
+    """
+    layout = ShardedState(DataStore.from_globals(globals()), state_codec=state_codec)
+    timer = phases.Phases("finance_step_faasr", layout.store)
+    sidecars = [f"field.{k}" for k in stages.FIELD_ARRAYS]
+    key = None
+    if result_cache and not price_scenarios:
+        with timer.phase("lookup"):
+            cache, key, hit = memo.lookup("finance", layout, READS, arrays=sidecars,
+                                          sources=[__file__], completes="finance_step_faasr")
+        if hit:
+            print(f"Updated state shards restored from step cache: {', '.join(WRITES)}")
+            layout.mark_complete("finance_step_faasr")
+            timer.report("cache_hit")
+            return
+
+    # Prefetch the field, well, finance and settings shards, the field
+    # step's yield and crop sidecars (memory-mapped later, never decoded)
+    # and the component snapshot
+    fetched = timer.concurrently("Prelude", {
+        "download": lambda: phases.prefetch(layout, READS, sidecars, snapshots=snapshots),
+        "stack": lambda: phases.install_and_import(timer, install_dependencies),
+    })["download"]
     try:
-        faasr_get_file(
-            server_name="S3",
-            remote_folder="pychamp-workflow",
-            remote_file=output1,
-            local_folder="",
-            local_file=output1
-        )
-        print("Downloaded payload from S3")
-    except NameError:
-        print("Running locally")
+        with timer.phase("decode"):
+            state = layout.read(READS)
+        print(f"Downloaded state shards: {', '.join(READS)}")
     except Exception as e:
-        print(f"Download error: {e}")
-    
-    # Read file
-    try:
-        with open(output1, "r") as f:
-            faasr_data = json.load(f)
-    except FileNotFoundError:
-        print("No payload file")
+        print(f"Could not download state: {e}")
         return
     
-    install_dependencies()
-    
-    # Import after installation
-    import numpy as np
-    from mesa import Model
-    from mesa.time import RandomActivation
-    from py_champ.components.aquifer import Aquifer
-    from py_champ.components.well import Well
-    from py_champ.components.field import Field
-    from py_champ.components.finance import Finance
-    
     print("\n" + "=" * 60)
     print("Calculating Finance")
     print("=" * 60)
     
-    # Get state
-    state = faasr_data.get("state", {})
     if not state or "settings" not in state:
         print(" No valid state")
         return
     
     print(f"Previous step: {state.get('workflow_step')}")
     
-    # Recreate model
-    model = Model()
-    model.schedule = RandomActivation(model)
-    model.current_step = state.get("model_step", 0)
-    model.crop_options = ["corn", "soy", "wheat"]
-    model.area_split = 4
-    
-    # Recreate components with current state
-    # Field
-    field_settings = state["settings"]["field"]
-    field = Field("f1", model, field_settings,
-                  truncated_normal_pars={
-                      "corn": [0.5, 0.1, 0, 1],
-                      "soy": [0.5, 0.1, 0, 1],
-                      "wheat": [0.5, 0.1, 0, 1]
-                  })
-    
-    # Restore field state from simulation
-    field_state = state["components"]["field"]
-    field.crops = field_state.get("crops", ["corn"])
-    field.te = field_state.get("tech", "sprinkler")
-    field.pumping_rate = field_state.get("pumping_rate", 0)
-    field.irr_vol_per_field = field_state.get("irrigation_volume", 0)
-    
-    # Create yield array (simplified - normally from field simulation)
-    n_s = model.area_split
-    n_c = len(model.crop_options)
-    field.y = np.ones((n_s, n_c, 1)) * field_state.get("yield", 0) / n_s
-    field.pre_te = field.te
-    field.i_crop = np.zeros((n_s, n_c, 1))
-    field.i_crop[:, 0, 0] = 1  # corn
-    field.pre_i_crop = field.i_crop.copy()
-    
-    # Well
-    well_settings = state["settings"]["well"]
-    well_settings["init"]["st"] = state["components"]["well"]["st"]
-    well = Well("w1", model, well_settings)
-    
-    # Simulate well energy consumption (simplified)
-    well.e = field.pumping_rate * 0.001  # Convert to PJ (simplified)
-    
-    # Finance
-    finance_settings = state["settings"]["finance"]
-    finance = Finance("fin1", model, finance_settings)
-    
-    print(f"\nFinance inputs:")
-    print(f"  Field yield: {field_state.get('yield', 0):.2f} (1e4 bu)")
-    print(f"  Irrigation volume: {field.irr_vol_per_field:.2f} m-ha")
-    print(f"  Well energy: {well.e:.4f} PJ")
-    
-    # Run finance step
-    profit = finance.step(fields={"f1": field}, wells={"w1": well})
-    
-    print(f"\nFinance results:")
-    print(f"  Revenue: ${finance.rev:.2f} (1e4$)")
-    print(f"  Energy cost: ${finance.cost_e:.2f} (1e4$)")
-    print(f"  Tech cost: ${finance.cost_tech:.2f} (1e4$)")
-    print(f"  Profit: ${profit:.2f} (1e4$)")
-    
-    # Update state
-    model.current_step += 1
-    state["workflow_step"] = "finance_calculation"
-    state["model_step"] = model.current_step
-    state["components"]["finance"].update({
-        "profit": float(profit),
-        "revenue": float(finance.rev),
-        "energy_cost": float(finance.cost_e),
-        "tech_cost": float(finance.cost_tech)
-    })
-    
-    print(" FINANCE STEP COMPLETED")
-    
-    # Save
-    faasr_data["state"] = state
-    
-    with open(output1, "w") as f:
-        json.dump(faasr_data, f, indent=2)
-    
-    try:
-        faasr_put_file(
-            server_name="S3",
-            local_folder="",
-            local_file=output1,
-            remote_folder="pychamp-workflow",
-            remote_file=output1
+    # Several fields (array-valued field settings): settle them all at once
+    # with the vectorized kernel. Otherwise recreate well and finance from
+    # state, with the field step's yield and crop arrays memory-mapped from
+    # their sidecars, then settle the season
+    with timer.phase("construct"):
+        arrays = layout.read_arrays(sidecars) if layout.has_arrays(sidecars) else None
+    if tables.n_rows(state["components"]["field"]) > 1:
+        with timer.phase("step"):
+            inputs = stages.finance_batch_stage(state, arrays)
+    else:
+        with timer.phase("construct"):
+            objects = snapshot.restore(layout.store, layout.folder, state["settings"],
+                                       fetched) if snapshots else None
+            sim = stages.restore_finance(state, arrays, objects)
+        with timer.phase("step"):
+            stages.finance_stage(sim)
+        inputs = None
+
+    # Market risk: the same season under every price scenario, as one table
+    if price_scenarios:
+        with timer.phase("scenarios"):
+            if inputs is None:
+                table = stages.finance_scenarios_stage(sim, price_scenarios)
+            else:
+                table = stages.price_risk_stage(state, inputs, price_scenarios)
+            ensemble.write_table(table, "finance_scenarios.npz")
+    
+    # Upload only the shards this step changed, next to the scenario table
+    uploads = {"upload": lambda: layout.write(state, WRITES, completes="finance_step_faasr")}
+    if price_scenarios:
+        uploads["scenarios"] = lambda: layout.store.put(
+            "finance_scenarios.npz", run_folder(layout.invocation_id), "finance_scenarios.npz"
         )
-        print("Updated payload uploaded to S3")
-    except NameError:
-        print("Running locally - saved to file")
+    timer.concurrently("Upload", uploads)
+    print(f"Updated state shards uploaded: {', '.join(WRITES)}")
+
+    # A season settled without price scenarios is cached (key is None otherwise)
+    finish = {"marker": lambda: layout.mark_complete("finance_step_faasr")}
+    if key:
+        finish["cache"] = lambda: cache.put(key, "finance", layout)
+    timer.concurrently("Epilogue", finish)
+    timer.report()
 
 if __name__ == "__main__":
     finance_step_faasr()
\ No newline at end of file
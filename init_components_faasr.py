@@ -1,218 +1,68 @@
+import os
 import sys
-import json
-import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pychamp_faasr import codec, deps, ensemble, phases, snapshot, stages
+from pychamp_faasr.state import SHARDS, ShardedState, prune_runs
+from pychamp_faasr.store import DataStore
 
 def install_dependencies():
     """Install required packages in FaaSr container"""
-    print("Installing dependencies...")
-    subprocess.check_call([
-        sys.executable, "-m", "pip", "install", "-q",
-        "numpy", "pandas", "mesa==2.1.1"
-    ])
-    subprocess.check_call([
-        sys.executable, "-m", "pip", "install", "-q",
-        "git+https://github.com/philip928lin/PyCHAMP.git"
-    ])
-    print("Dependencies installed")
-
-def init_components_faasr(output1="payload"):
-    """Initialize PyChAMP components - FaaSr entry point"""
-    
-    # Read FaaSr input (if exists from previous workflow)
-    try:
-        with open("faasr_data.json", "r") as f:
-            faasr_data = json.load(f)
-    except FileNotFoundError:
-        faasr_data = {}  # First run, no previous data
-    
-    install_dependencies()
-    
-    # Import after installation
-    from mesa import Model
-    from mesa.time import RandomActivation
-    from py_champ.components.aquifer import Aquifer
-    from py_champ.components.well import Well
-    from py_champ.components.finance import Finance
-    from py_champ.components.field import Field
+    return deps.install_dependencies(globals().get("faasr_get_file"))
 
-    # 1. Create Mesa model
-    print("\n1. Creating model...")
-    model = Model()
-    model.schedule = RandomActivation(model)
-    model.current_step = 0
-    model.crop_options = ["corn", "soy", "wheat"]
-    model.area_split = 4
-    print(f"Model created")
-    
-    # 2. Initialize Aquifer
-    print("\n2. Initializing Aquifer...")
-    aquifer_settings = {
-        "aq_a": 0.1,
-        "aq_b": 10.0,
-        "area": 100.0,
-        "sy": 0.2,
-        "init": {"st": 30.0, "dwl": 0.0}
-    }
-    aquifer = Aquifer("aq1", model, aquifer_settings)
-    model.schedule.add(aquifer)
-    print(f"Aquifer initialized: st={aquifer.st}m")
-    
-    # 3. Initialize Well
-    print("\n3. Initializing Well...")
-    well_settings = {
-        "r": 0.2032,
-        "k": 15.0,
-        "sy": 0.2,
-        "rho": 1000.0,
-        "g": 9.81,
-        "eff_pump": 0.75,
-        "eff_well": 0.85,
-        "aquifer_id": "aq1",
-        "pumping_capacity": 100.0,
-        "init": {
-            "st": 30.0,
-            "l_wt": 5.0,
-            "pumping_days": 90
-        }
-    }
-    well = Well("w1", model, well_settings)
-    model.schedule.add(well)
-    print(f"Well initialized: connected to {well.aquifer_id}")
-    
-    # 4. Initialize Finance
-    print("\n4. Initializing Finance...")
-    finance_settings = {
-        "energy_price": 0.12,
-        "crop_price": {
-            "corn": 5.0,
-            "soy": 10.0,
-            "wheat": 3.0
-        },
-        "crop_cost": {
-            "corn": 400.0,
-            "soy": 300.0,
-            "wheat": 250.0
-        },
-        "irr_tech_operational_cost": {
-            "gravity": 50.0,
-            "sprinkler": 100.0,
-            "drip": 150.0
-        },
-        "irr_tech_change_cost": {
-            "gravity": 1000.0,
-            "sprinkler": 2000.0,
-            "drip": 3000.0
-        },
-        "crop_change_cost": 200.0,
-        "init": {"savings": 10000.0}
-    }
-    finance = Finance("fin1", model, finance_settings)
-    model.schedule.add(finance)
-    print(f"Finance initialized: energy_price=${finance.energy_price}/kWh")
-    
-    # 5. Initialize Field
-    print("\n5. Initializing Field...")
-    field_settings = {
-        "field_area": 100.0,
-        "water_yield_curves": {
-            "corn": [10.0, 600.0, 0.5, 1.0, 0.3, 0.2],
-            "soy": [4.0, 400.0, 0.6, 1.2, 0.25, 0.15],
-            "wheat": [5.0, 350.0, 0.55, 1.1, 0.28, 0.18]
-        },
-        "tech_pumping_rate_coefs": {
-            "gravity": [1.0, 0.5, 10.0],
-            "sprinkler": [0.85, 0.6, 15.0],
-            "drip": [0.70, 0.7, 20.0]
-        },
-        "prec_aw_id": "aq1",
-        "init": {
-            "crop": "corn",
-            "tech": "sprinkler",
-            "field_type": "irrigated"
-        }
-    }
-    field = Field("f1", model, field_settings)
-    model.schedule.add(field)
-    print(f"Field initialized: area={field.field_area}ha, crop={field.crops[0]}")
-    
-    # 6. Create state for next workflow step
-    print("\n6. Creating state...")
-    state = {
-        "workflow_step": "init_components",
-        "status": "completed",
-        "model_step": model.current_step,
-        "components": {
-            "aquifer": {
-                "id": aquifer.unique_id,
-                "st": aquifer.st,
-                "dwl": aquifer.dwl,
-                "area": aquifer.area
-            },
-            "well": {
-                "id": well.unique_id,
-                "aquifer_id": well.aquifer_id,
-                "pumping_capacity": well.pumping_capacity,
-                "eff_pump": well.eff_pump,
-                "st": well.st,
-                "pumping_days": well.pumping_days
-            },
-            "finance": {
-                "id": finance.unique_id,
-                "energy_price": finance.energy_price,
-                "crop_price": finance.crop_price,
-                "crop_cost": finance.crop_cost
-            },
-            "field": {
-                "id": field.unique_id,
-                "field_area": field.field_area,
-                "crops": field.crops,
-                "tech": field.te
-            }
-        },
-        "settings": {
-            "aquifer": aquifer_settings,
-            "well": well_settings,
-            "finance": finance_settings,
-            "field": field_settings
-        }
-    }
-    
-    print("ALL COMPONENTS INITIALIZED SUCCESSFULLY")
-    print(f"Components: {list(state['components'].keys())}")
-    
-    # Save state for next FaaSr action
-    faasr_data["state"] = state
+def init_components_faasr(output1="payload", state_codec=codec.DEFAULT_CODEC,
+                          retention_days=0, retention_keep=10, snapshots=True,
+                          settings=None, settings_file=None):
+    """
+    Initialize PyChAMP components - FaaSr entry point. settings overrides
+    the default settings by dotted path, as an ensemble scenario does (e.g.
+    {"field.field_area": [100, 50, 10]}), given inline or as the data store
+    key of a JSON file in settings_file. With snapshots, also upload the
+    initialized component objects for the later steps to restore.
+    """
+    store = DataStore.from_globals(globals())
+    timer = phases.Phases("init_components_faasr", store)
+    layout = ShardedState(store, state_codec=state_codec)
+    if settings_file:
+        with timer.phase("download"):
+            folder, _, name = settings_file.rpartition("/")
+            store.get(folder, name, "init-settings")
+            settings = ensemble.load_spec("init-settings")
+    if settings:
+        print(f"Settings overridden: {', '.join(settings)}")
+    settings = ensemble.apply(stages.DEFAULT_SETTINGS, settings or {})
 
-    # Write to local file first
-    with open("payload", "w") as f:
-        json.dump(faasr_data, f, indent=2)
-    
-    print("State saved to local payload file")
-    
-    # Upload to S3 using FaaSr API
-    faasr_put_file(
-        server_name="S3",
-        local_folder="",
-        local_file="payload",
-        remote_folder="pychamp-workflow",
-        remote_file="payload"
-    )
-    
-    print("Payload uploaded to S3")
+    # Retention: drop the state of old invocations while the stack installs
+    prelude = {"stack": lambda: phases.install_and_import(timer, install_dependencies)}
+    if retention_days:
+        prelude["retention"] = lambda: prune_runs(store, retention_days, retention_keep,
+                                                  protect=(layout.invocation_id,))
+    pruned = timer.concurrently("Prelude", prelude).get("retention")
+    if retention_days:
+        print(f"Pruned {len(pruned)} invocation(s) older than {retention_days} days")
+    
+    # Create the model and components from the settings
+    with timer.phase("construct"):
+        sim = stages.init_components(settings)
+    state = sim.state
+    
+    # Save state for next FaaSr action, one object per component, under this
+    # invocation's folder. init starts the run, so it replaces any earlier
+    # state of the same invocation (e.g. from a retried init).
+    with timer.phase("upload"):
+        layout.write(state, SHARDS, force=True, completes="init_components_faasr")
+    
+    print(f"State shards uploaded to {layout.folder}: {', '.join(SHARDS)}")
 
-    # print(f"DEBUG: State keys: {list(state.keys())}")
-    # print(f"DEBUG: Writing payload with {len(json.dumps(faasr_data))} bytes")
-    
-    # # Write output for next step
-    # with open("output1", "w") as f:
-    #     json.dump(faasr_data, f, indent=2)
-    
-    # print(f"\n State saved to {output1}")
-    
-    # # Return simple success message for FaaSr
-    # # return "SUCCESS"
+    # Later steps restore their components from this snapshot instead of
+    # rebuilding them from the settings
+    finish = {"marker": lambda: layout.mark_complete("init_components_faasr")}
+    # Array-valued settings run the batch stages, which use no objects
+    batched = any(stages.is_array_valued(settings[c]) for c in ("aquifer", "field"))
+    if snapshots and not batched:
+        finish["snapshot"] = lambda: snapshot.save(store, layout.folder, state["settings"])
+    timer.concurrently("Epilogue", finish)
+    timer.report()
 
-# # FaaSr entry point
 if __name__ == "__main__":
-        result = init_components_faasr(output1="payload")
-#         print(f"\nFaaSr step completed: {result}")
+    init_components_faasr(output1="payload")
@@ -1,93 +1,139 @@
 # optimization_step_faasr.py
 import json
 import os
+import sys
 
-def optimization_step_faasr():
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pychamp_faasr import deps, optimizer, phases
+from pychamp_faasr.store import DataStore
+
+def optimization_step_faasr(batch_size=optimizer.BATCH_SIZE, integer=True, cache=True, workers=1):
     """
     Optimize irrigation strategy for next period.
     Update satisfaction and uncertainty based on outcomes.
+
+    Each farmer's crop and irrigation plan is a MILP solved with HiGHS
+    (scipy.optimize.milp), batch_size farmers per solver call. Scalar
+    behavior/field/aquifer values describe one farmer, lists many.
+
+    With cache, solved plans are kept in the data store: problems solved
+    before (this or another run) are not solved again, and each farmer's
+    last plan warm-starts its next solve. workers > 1 (0: one per CPU)
+    solves on a process pool; the plans are merged back into the behavior
+    parameters.
     """
     print("[optimization_step_faasr] Starting optimization step...")
-    
-    # Download state
+    store = DataStore.from_globals(globals())
+    timer = phases.Phases("optimization_step_faasr", store)
+
+    # Download state while numpy and scipy install
     print("[optimization_step_faasr] Downloading state...")
-    faasr_get_file(
-        server_name="S3",
-        remote_folder="pychamp-workflow",
-        remote_file="state.json",
-        local_folder="",
-        local_file="state.json"
-    )
-    
+    timer.concurrently("Prelude", {
+        "download": lambda: store.get("pychamp-workflow", "state.json", "state.json"),
+        "stack": lambda: phases.install_and_import(
+            timer,
+            lambda: deps.install_dependencies(globals().get("faasr_get_file"), modules=("numpy", "scipy", "highspy")),
+            ("numpy", "scipy.optimize"),
+        ),
+    })
+
     # Load state
-    with open("state.json", "r") as f:
-        state = json.load(f)
-    
+    with timer.phase("decode"):
+        with open("state.json", "r") as f:
+            state = json.load(f)
+
+    import numpy as np
+
     behavior = state["behavior"]
     field = state["field"]
     aquifer = state["aquifer"]
     finance = state["finance"]
-    
+    settings = state.get("settings", optimizer.stages.DEFAULT_SETTINGS)
+    single = not any(isinstance(v, list) for v in (
+        behavior["satisfaction"], field["soil_moisture"], aquifer["init"]["st"]
+    ))
+
     # Get current conditions
-    current_soil_moisture = field["soil_moisture"]
-    current_storage = aquifer["init"]["st"]
-    current_profit = finance.get("net_profit", 0.0)
-    
-    print(f"[optimization_step_faasr] Optimizing for next period...")
-    
-    # Calculate optimal irrigation for next period
-    max_irrigation = min(50.0, current_storage * 0.1)  # Don't use more than 10% of storage
-    
+    current_soil_moisture = np.atleast_1d(np.asarray(field["soil_moisture"], dtype=float))
+    current_storage = np.atleast_1d(np.asarray(aquifer["init"]["st"], dtype=float))
+    current_profit = np.atleast_1d(np.asarray(finance.get("net_profit", 0.0), dtype=float))
+    n = max(len(current_soil_moisture), len(current_storage), len(current_profit))
+    current_storage = np.broadcast_to(current_storage, (n,))
+
+    print(f"[optimization_step_faasr] Optimizing for next period ({n} farmers)...")
+
+    # Calculate optimal crop and irrigation plan for next period
+    with timer.phase("cache"):
+        solution_cache = optimizer.SolutionCache.pull(store) if cache else None
+    with timer.phase("step"):
+        plan = optimizer.solve(
+            current_storage, field_area=field.get("field_area"), settings=settings,
+            integer=integer, batch_size=batch_size,
+            cache=solution_cache, agent_ids=behavior.get("agent_ids"), workers=workers,
+        )
+    if solution_cache is not None:
+        with timer.phase("cache"):
+            solution_cache.push(store)
+    optimal_irrigation = plan["irr_depth"] * 10.0  # cm -> mm
+
     # Consider soil moisture - if already high, reduce irrigation
-    if current_soil_moisture > 0.8:
-        optimal_irrigation = max(0, max_irrigation * 0.5)
-    elif current_soil_moisture < 0.3:
-        optimal_irrigation = max_irrigation
-    else:
-        optimal_irrigation = max_irrigation * 0.7
-    
+    optimal_irrigation = np.where(current_soil_moisture > 0.8, optimal_irrigation * 0.5, optimal_irrigation)
+
     # Economic adjustment - if profit is low, be more conservative
-    if current_profit < 0:
-        optimal_irrigation *= 0.5  # Reduce irrigation if losing money
-    
-    # Update behavior parameters based on optimization results
-    behavior["optimal_irrigation"] = optimal_irrigation
-    behavior["last_profit"] = current_profit
-    behavior["last_soil_moisture"] = current_soil_moisture
-    behavior["last_storage"] = current_storage
-    
+    optimal_irrigation = np.where(current_profit < 0, optimal_irrigation * 0.5, optimal_irrigation)
+
     # Update satisfaction based on economic performance
-    if current_profit > 10.0:
-        behavior["satisfaction"] = min(1.0, behavior["satisfaction"] + 0.1)
-    elif current_profit < 0:
-        behavior["satisfaction"] = max(0.0, behavior["satisfaction"] - 0.1)
-    
+    satisfaction = np.asarray(behavior["satisfaction"], dtype=float)
+    satisfaction = np.where(current_profit > 10.0, np.minimum(1.0, satisfaction + 0.1), satisfaction)
+    satisfaction = np.where(current_profit < 0, np.maximum(0.0, satisfaction - 0.1), satisfaction)
+
     # Update uncertainty based on water availability
-    if current_storage < 10.0:  # Low storage
-        behavior["uncertainty"] = min(1.0, behavior["uncertainty"] + 0.2)
-    elif current_storage > 50.0:  # High storage
-        behavior["uncertainty"] = max(0.0, behavior["uncertainty"] - 0.1)
-    
+    uncertainty = np.asarray(behavior["uncertainty"], dtype=float)
+    uncertainty = np.where(current_storage < 10.0, np.minimum(1.0, uncertainty + 0.2), uncertainty)  # Low storage
+    uncertainty = np.where(current_storage > 50.0, np.maximum(0.0, uncertainty - 0.1), uncertainty)  # High storage
+
+    # Update behavior parameters based on optimization results
+    def value(array):
+        array = np.broadcast_to(array, (n,))
+        return float(array[0]) if single else array.tolist()
+
+    behavior["optimal_irrigation"] = value(optimal_irrigation)
+    behavior["expected_profit"] = value(plan["profit"])
+    behavior["crop_share"] = dict(zip(
+        optimizer.stages.CROP_OPTIONS,
+        (value(share) for share in plan["crop_share"].T)
+    ))
+    if single and integer:
+        behavior["irrigation_plan"] = optimizer.section_plan(plan["sections"][0], plan["levels"])
+    behavior["last_profit"] = value(current_profit)
+    behavior["last_soil_moisture"] = value(current_soil_moisture)
+    behavior["last_storage"] = value(current_storage)
+    behavior["satisfaction"] = value(satisfaction)
+    behavior["uncertainty"] = value(uncertainty)
+
     # Update state
     state["behavior"] = behavior
-    
+
     print(f"[optimization_step_faasr] Optimization results:")
-    print(f"  - Optimal irrigation: {optimal_irrigation:.1f} mm")
-    print(f"  - Current satisfaction: {behavior['satisfaction']:.2f}")
-    print(f"  - Current uncertainty: {behavior['uncertainty']:.2f}")
-    print(f"  - Available storage: {current_storage:.2f} m³")
-    print(f"  - Current profit: ${current_profit:.2f}")
-    
+    print(f"  - Optimal irrigation: {optimal_irrigation.mean():.1f} mm (mean)")
+    print(f"  - Current satisfaction: {np.mean(satisfaction):.2f} (mean)")
+    print(f"  - Current uncertainty: {np.mean(uncertainty):.2f} (mean)")
+    print(f"  - Available storage: {current_storage.mean():.2f} m (mean)")
+    print(f"  - Current profit: ${current_profit.mean():.2f} (mean)")
+    print(f"  - Solver: {plan['n_calls']} HiGHS call(s) on {plan['workers']} worker(s), "
+          f"{plan['solve_time']:.3f}s ({plan['solver_seconds']:.3f}s busy), "
+          f"{plan['solve_time_per_agent'] * 1e3:.2f} ms/agent")
+    print(f"  - Problems: {plan['n_problems']} distinct, {plan['n_solved']} solved "
+          f"({plan['n_warm']} warm-started)")
+    if solution_cache is not None:
+        print(f"  - Solution cache: {solution_cache.hits} hits, {solution_cache.misses} misses "
+              f"(hit rate {solution_cache.hit_rate:.1%})")
+
     # Save and upload
-    with open("state.json", "w") as f:
-        json.dump(state, f, indent=2)
-    
-    faasr_put_file(
-        server_name="S3",
-        local_folder="",
-        local_file="state.json",
-        remote_folder="pychamp-workflow",
-        remote_file="state.json"
-    )
-    
-    print("[optimization_step_faasr] Optimization step complete!")
\ No newline at end of file
+    with timer.phase("upload"):
+        with open("state.json", "w") as f:
+            json.dump(state, f, indent=2)
+        store.put("state.json", "pychamp-workflow", "state.json")
+
+    print("[optimization_step_faasr] Optimization step complete!")
+    timer.report()
@@ -0,0 +1,60 @@
+"""
+FaaSr Step: Fused PyCHAMP Pipeline
+Runs init, aquifer, field, finance and results in a single action, handing
+the live Mesa model and PyCHAMP components from stage to stage. With
+n_seasons > 1, aquifer/field/finance are stepped once per season in memory.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pychamp_faasr import codec, deps, stages, tables
+from pychamp_faasr.state import SHARDS, ShardedState, prune_runs, run_folder
+from pychamp_faasr.store import DataStore
+
+def install_dependencies():
+    """Install required packages in FaaSr container"""
+    return deps.install_dependencies(globals().get("faasr_get_file"))
+
+def pychamp_pipeline_faasr(output1="payload", state_codec=codec.DEFAULT_CODEC,
+                           retention_days=0, retention_keep=10, n_seasons=1):
+    """Run the whole pychamp-workflow chain in one process"""
+    install_dependencies()
+
+    # init -> aquifer -> field -> finance (x n_seasons) -> results, on the
+    # same objects
+    sim = stages.init_components()
+    history = None
+    if n_seasons > 1:
+        history = stages.run_seasons(sim, n_seasons)
+    else:
+        stages.aquifer_stage(sim)
+        stages.field_stage(sim)
+        stages.finance_stage(sim)
+    stages.results_stage(sim.state)
+
+    # Only the end state is written: as state shards, so the per-step tools
+    # can read it, and as a payload in the original single-object format
+    store = DataStore.from_globals(globals())
+    layout = ShardedState(store, state_codec=state_codec)
+    layout.write(sim.state, SHARDS, force=True, arrays=stages.field_arrays(sim.field))
+
+    components = sim.state["components"]
+    legacy = dict(sim.state, components={k: tables.legacy(v) for k, v in components.items()})
+    codec.dump_file({"state": legacy}, output1, state_codec)
+    store.put(output1, run_folder(layout.invocation_id), output1)
+
+    # Per-season history, one array per quantity
+    if history is not None:
+        codec.dump_file(history, "history", state_codec)
+        store.put("history", run_folder(layout.invocation_id), "history")
+    print(f"\nFinal state uploaded to {run_folder(layout.invocation_id)}")
+
+    if retention_days:
+        pruned = prune_runs(store, retention_days, retention_keep,
+                            protect=(layout.invocation_id,))
+        print(f"Pruned {len(pruned)} invocation(s) older than {retention_days} days")
+
+if __name__ == "__main__":
+    pychamp_pipeline_faasr()
@@ -0,0 +1,6 @@
+"""
+Shared helpers for the pychamp-workflow FaaSr steps.
+
+The ``*_step_faasr.py`` files in the repository root are the FaaSr entry
+points; this package holds the code they have in common.
+"""
@@ -0,0 +1,230 @@
+"""
+State codecs for the PyCHAMP payload
+
+A codec is named by a spec string ``"<format>[+<compression>]"``:
+
+- formats: ``json`` (indentation-free), ``msgpack``, ``npz`` (NumPy archive,
+  arrays and long all-int or all-float lists stored as raw arrays, the rest,
+  mixed int/float lists included, as a JSON skeleton)
+- compression: ``gzip`` or ``zstd``
+
+Reading never needs the spec: compression and format are detected from the
+leading bytes, so a step can read whatever its predecessor wrote. numpy,
+msgpack and zstandard are imported lazily, since steps may read the payload
+before dependencies are installed.
+"""
+
+import gzip
+import io
+import json
+
+FORMATS = ("json", "msgpack", "npz")
+COMPRESSIONS = ("gzip", "zstd")
+DEFAULT_CODEC = "json"
+
+# Numeric lists at least this long are stored as arrays by the npz format
+NPZ_MIN_LIST_LEN = 64
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_ZIP_MAGIC = b"PK\x03\x04"
+_MSGPACK_NDARRAY = 1
+_NPZ_SKELETON = "__skeleton__"
+
+
+def parse_spec(spec):
+    """Split a codec spec into (format, compression or None)"""
+    fmt, _, compression = (spec or DEFAULT_CODEC).lower().partition("+")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown state format '{fmt}' (expected one of {FORMATS})")
+    if compression and compression not in COMPRESSIONS:
+        raise ValueError(
+            f"Unknown state compression '{compression}' (expected one of {COMPRESSIONS})"
+        )
+    return fmt, compression or None
+
+
+def dumps(obj, spec=DEFAULT_CODEC):
+    """Encode ``obj`` with the codec named by ``spec``"""
+    fmt, compression = parse_spec(spec)
+    data = _ENCODERS[fmt](obj)
+    if compression == "gzip":
+        data = gzip.compress(data, compresslevel=6, mtime=0)
+    elif compression == "zstd":
+        data = _zstd().ZstdCompressor(level=3).compress(data)
+    return data
+
+
+def loads(data):
+    """Decode bytes written by ``dumps``, detecting the codec"""
+    data = _decompress(data)
+    return _DECODERS[_detect_format(data)](data)
+
+
+def detect(data):
+    """Return the spec of the codec ``data`` was written with"""
+    compression = None
+    if data[:2] == _GZIP_MAGIC:
+        compression = "gzip"
+    elif data[:4] == _ZSTD_MAGIC:
+        compression = "zstd"
+    fmt = _detect_format(_decompress(data))
+    return f"{fmt}+{compression}" if compression else fmt
+
+
+def dump_file(obj, path, spec=DEFAULT_CODEC):
+    """Encode ``obj`` to ``path`` and return the number of bytes written"""
+    data = dumps(obj, spec)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+def load_file(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def _decompress(data):
+    if data[:2] == _GZIP_MAGIC:
+        return gzip.decompress(data)
+    if data[:4] == _ZSTD_MAGIC:
+        return _zstd().ZstdDecompressor().decompress(data)
+    return data
+
+
+def _detect_format(data):
+    if data[:4] == _ZIP_MAGIC:
+        return "npz"
+    if data.lstrip()[:1] in (b"{", b"["):
+        return "json"
+    return "msgpack"
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd state compression requires the 'zstandard' package")
+    return zstandard
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise ImportError("The msgpack state format requires the 'msgpack' package")
+    return msgpack
+
+
+def to_builtin(obj):
+    """json/msgpack fallback for numpy scalars and arrays"""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+# json
+
+
+def _encode_json(obj):
+    return json.dumps(obj, separators=(",", ":"), default=to_builtin).encode()
+
+
+def _decode_json(data):
+    return json.loads(data)
+
+
+# msgpack
+
+
+def _encode_msgpack(obj):
+    msgpack = _msgpack()
+
+    def default(o):
+        if type(o).__name__ == "ndarray":
+            header = json.dumps({"dtype": o.dtype.str, "shape": o.shape}).encode()
+            body = o.tobytes(order="C")
+            return msgpack.ExtType(
+                _MSGPACK_NDARRAY, len(header).to_bytes(4, "little") + header + body
+            )
+        return to_builtin(o)
+
+    return msgpack.packb(obj, default=default, use_bin_type=True)
+
+
+def _decode_msgpack(data):
+    msgpack = _msgpack()
+
+    def ext_hook(code, payload):
+        if code != _MSGPACK_NDARRAY:
+            return msgpack.ExtType(code, payload)
+        import numpy as np
+
+        n = int.from_bytes(payload[:4], "little")
+        header = json.loads(payload[4:4 + n])
+        return np.frombuffer(payload[4 + n:], dtype=header["dtype"]).reshape(
+            header["shape"]
+        )
+
+    return msgpack.unpackb(data, ext_hook=ext_hook, raw=False, strict_map_key=False)
+
+
+# npz
+
+
+def _is_numeric_list(value):
+    """A long list of all ints or all floats; mixed lists stay JSON so ints come back as ints"""
+    return (
+        isinstance(value, list)
+        and len(value) >= NPZ_MIN_LIST_LEN
+        and type(value[0]) in (int, float)
+        and all(type(v) is type(value[0]) for v in value)
+    )
+
+
+def _encode_npz(obj):
+    import numpy as np
+
+    arrays = {}
+
+    def extract(value):
+        if isinstance(value, dict):
+            return {k: extract(v) for k, v in value.items()}
+        if type(value).__name__ == "ndarray" or _is_numeric_list(value):
+            key = f"a{len(arrays)}"
+            arrays[key] = np.asarray(value)
+            return {"__ndarray__": key, "list": isinstance(value, list)}
+        if isinstance(value, list):
+            return [extract(v) for v in value]
+        return value
+
+    skeleton = _encode_json(extract(obj))
+    arrays[_NPZ_SKELETON] = np.frombuffer(skeleton, dtype=np.uint8)
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+    return buf.getvalue()
+
+
+def _decode_npz(data):
+    import numpy as np
+
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        arrays = {k: npz[k] for k in npz.files}
+    skeleton = json.loads(arrays.pop(_NPZ_SKELETON).tobytes())
+
+    def restore(value):
+        if isinstance(value, dict):
+            if "__ndarray__" in value:
+                array = arrays[value["__ndarray__"]]
+                return array.tolist() if value.get("list") else array
+            return {k: restore(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [restore(v) for v in value]
+        return value
+
+    return restore(skeleton)
+
+
+_ENCODERS = {"json": _encode_json, "msgpack": _encode_msgpack, "npz": _encode_npz}
+_DECODERS = {"json": _decode_json, "msgpack": _decode_msgpack, "npz": _decode_npz}
@@ -0,0 +1,159 @@
+"""
+CONSUMAT irrigation decisions for the behavior step
+
+``decide`` is the per-farmer decision tree; ``decide_batch`` applies the
+same rules to arrays of farmers with NumPy masks and returns the same
+results element for element (``tests/test_consumat.py`` checks this on
+generated and boundary inputs; ``benchmarks/consumat_equivalence.py``
+times both).
+"""
+
+STATES = ("repetition", "imitation", "deliberation", "social_comparison")
+IRRIGATE = "irrigate"
+NO_IRRIGATION = "no_irrigation"
+
+# Storage (m) and soil moisture limits of the decision rules
+CRITICAL_STORAGE = 5.0
+LOW_STORAGE = 10.0
+CONSERVE_STORAGE = 15.0
+DRY_SOIL = 0.3
+WET_SOIL = 0.8
+
+
+def consumat_state(satisfaction, uncertainty, satisfaction_threshold, uncertainty_threshold):
+    if satisfaction > satisfaction_threshold:
+        if uncertainty <= uncertainty_threshold:
+            return "repetition"
+        return "imitation"
+    if uncertainty <= uncertainty_threshold:
+        return "deliberation"
+    return "social_comparison"
+
+
+def decide(satisfaction, uncertainty, satisfaction_threshold, uncertainty_threshold,
+           soil_moisture, aquifer_storage):
+    """Return (consumat_state, irrigation_action, irrigation_amount) of one farmer"""
+    state = consumat_state(satisfaction, uncertainty,
+                           satisfaction_threshold, uncertainty_threshold)
+
+    # Make irrigation decision based on state
+    if state == "repetition":
+        # High satisfaction, low uncertainty - repeat last action
+        action, amount = IRRIGATE, 30.0
+    elif state == "imitation":
+        # High satisfaction, high uncertainty - continue but be cautious
+        action, amount = IRRIGATE, 25.0
+    elif state == "deliberation":
+        # Low satisfaction, low uncertainty - optimize carefully
+        if soil_moisture < DRY_SOIL:
+            action, amount = IRRIGATE, 35.0  # Increase to improve conditions
+        elif aquifer_storage < CONSERVE_STORAGE:
+            action, amount = IRRIGATE, 20.0  # Conserve water
+        else:
+            action, amount = IRRIGATE, 30.0
+    else:  # social_comparison
+        # Low satisfaction, high uncertainty - be very conservative
+        if aquifer_storage < LOW_STORAGE:
+            action, amount = NO_IRRIGATION, 0.0
+        else:
+            action, amount = IRRIGATE, 15.0
+
+    # Consider water availability - don't irrigate if storage is critical
+    if aquifer_storage < CRITICAL_STORAGE:
+        action, amount = NO_IRRIGATION, 0.0
+
+    # Consider soil moisture - reduce if already high
+    if soil_moisture > WET_SOIL:
+        amount = amount * 0.5
+
+    return state, action, amount
+
+
+def decide_batch(satisfaction, uncertainty, satisfaction_threshold, uncertainty_threshold,
+                 soil_moisture, aquifer_storage):
+    """
+    ``decide`` for arrays of farmers (arguments broadcast together)
+
+    Returns (state_index, irrigate, irrigation_amount): the index of each
+    farmer's state in ``STATES``, whether it irrigates, and the amount.
+    """
+    import numpy as np
+
+    satisfaction, uncertainty, satisfaction_threshold, uncertainty_threshold, \
+        soil_moisture, aquifer_storage = np.broadcast_arrays(*(
+            np.asarray(a, dtype=float) for a in (
+                satisfaction, uncertainty, satisfaction_threshold,
+                uncertainty_threshold, soil_moisture, aquifer_storage,
+            )
+        ))
+
+    satisfied = satisfaction > satisfaction_threshold
+    certain = uncertainty <= uncertainty_threshold
+    state = np.where(satisfied, np.where(certain, 0, 1), np.where(certain, 2, 3))
+
+    deliberation = state == 2
+    social = state == 3
+    amount = np.select(
+        [
+            state == 0,
+            state == 1,
+            deliberation & (soil_moisture < DRY_SOIL),
+            deliberation & (aquifer_storage < CONSERVE_STORAGE),
+            deliberation,
+            social & (aquifer_storage < LOW_STORAGE),
+        ],
+        [30.0, 25.0, 35.0, 20.0, 30.0, 0.0],
+        default=15.0,
+    )
+    irrigate = ~(social & (aquifer_storage < LOW_STORAGE))
+
+    critical = aquifer_storage < CRITICAL_STORAGE
+    irrigate &= ~critical
+    amount = np.where(critical, 0.0, amount)
+    amount = np.where(soil_moisture > WET_SOIL, amount * 0.5, amount)
+    return state, irrigate, amount
+
+
+def state_names(state_index):
+    import numpy as np
+
+    return np.asarray(STATES)[state_index]
+
+
+def social_adjustment(state_index, irrigate, amount, satisfaction, neighbors):
+    """
+    Neighbor-informed decisions of imitating and socially comparing farmers
+
+    With ``neighbors`` (a ``pychamp_faasr.neighbors.Neighbors`` table), an
+    imitating farmer copies the decision (whether to irrigate, and the
+    amount) of its most satisfied neighbor if that neighbor is more
+    satisfied than itself, and a socially comparing farmer takes the mean
+    amount of the neighbors at least as satisfied as itself. Neighbors'
+    decisions are those of ``decide_batch``; farmers that do not irrigate
+    keep 0. Returns the new (irrigate, amount) arrays, the inputs themselves
+    when the table has no neighbors (k == 0).
+    """
+    import numpy as np
+
+    if neighbors.k == 0:
+        return irrigate, amount
+
+    satisfaction = np.broadcast_to(np.asarray(satisfaction, dtype=float), amount.shape)
+    neighbor_satisfaction = neighbors.gather(satisfaction, fill=-np.inf)
+    neighbor_amount = neighbors.gather(amount, fill=0.0)
+    neighbor_irrigate = neighbors.gather(irrigate, fill=0.0) > 0
+
+    best = np.argmax(neighbor_satisfaction, axis=1)[:, None]
+    best_satisfaction = np.take_along_axis(neighbor_satisfaction, best, axis=1)[:, 0]
+    best_amount = np.take_along_axis(neighbor_amount, best, axis=1)[:, 0]
+    best_irrigate = np.take_along_axis(neighbor_irrigate, best, axis=1)[:, 0]
+    imitate = (state_index == 1) & irrigate & (best_satisfaction > satisfaction)
+
+    peers = neighbor_satisfaction >= satisfaction[:, None]
+    n_peers = peers.sum(axis=1)
+    peer_amount = np.where(peers, neighbor_amount, 0.0).sum(axis=1) / np.maximum(n_peers, 1)
+    compare = (state_index == 3) & irrigate & (n_peers > 0)
+
+    amount = np.where(imitate, best_amount, amount)
+    irrigate = np.where(imitate, best_irrigate, irrigate)
+    return irrigate, np.where(compare, peer_amount, amount)
@@ -0,0 +1,148 @@
+"""
+Dependency installation for the PyCHAMP steps
+
+Every step needs numpy, pandas, mesa and PyCHAMP (the optimization step
+also SciPy), and the generic FaaSr Python container ships none of them.
+Instead of running pip against PyPI and GitHub at every action start, ``scripts/build_wheelhouse.py`` builds
+pinned wheels once and uploads them to the data store as a single archive.
+``install_dependencies`` then only installs what is not already importable,
+fetching the archive once per container and installing offline from it.
+If the wheelhouse is unavailable it falls back to the online install.
+
+The baked image in ``containers/pychamp`` preinstalls the stack and sets
+``PYCHAMP_PREINSTALLED``; steps running there skip installation once they
+have checked that every module is importable, and install whatever a stale
+or wrong image lacks as above.
+"""
+
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import time
+
+BASE_PACKAGES = ["numpy", "pandas", "scipy", "highspy", "mesa==2.1.1", "msgpack", "zstandard"]
+PYCHAMP_REPO = "https://github.com/philip928lin/PyCHAMP.git"
+
+# Import name -> requirement, for the online fallback
+PYCHAMP_STACK = {
+    "numpy": "numpy",
+    "pandas": "pandas",
+    "scipy": "scipy",
+    "highspy": "highspy",
+    "mesa": "mesa==2.1.1",
+    "msgpack": "msgpack",
+    "zstandard": "zstandard",
+    "py_champ": f"git+{PYCHAMP_REPO}",
+}
+
+WHEELHOUSE_FOLDER = "pychamp-workflow/wheelhouse"
+WHEELHOUSE_FILE = "pychamp-wheelhouse.tar.gz"
+WHEELHOUSE_DIR = "/tmp/pychamp-wheelhouse"
+WHEELHOUSE_MANIFEST = "manifest.json"
+WHEELHOUSE_REQUIREMENTS = "requirements.txt"
+
+PREINSTALLED_ENV = "PYCHAMP_PREINSTALLED"
+
+
+def stack_preinstalled():
+    """True when running in an image that bakes in the PyCHAMP stack"""
+    return os.environ.get(PREINSTALLED_ENV, "") not in ("", "0", "false")
+
+
+def missing_modules(modules):
+    """Return the modules in ``modules`` that cannot be imported"""
+    return [m for m in modules if importlib.util.find_spec(m) is None]
+
+
+def fetch_wheelhouse(faasr_get_file, server_name="S3"):
+    """
+    Download and unpack the wheelhouse archive into WHEELHOUSE_DIR
+
+    The archive is only fetched once per container; later calls reuse the
+    unpacked directory. Returns the wheelhouse manifest.
+    """
+    manifest_path = os.path.join(WHEELHOUSE_DIR, WHEELHOUSE_MANIFEST)
+    if not os.path.exists(manifest_path):
+        os.makedirs(WHEELHOUSE_DIR, exist_ok=True)
+        faasr_get_file(
+            server_name=server_name,
+            remote_folder=WHEELHOUSE_FOLDER,
+            remote_file=WHEELHOUSE_FILE,
+            local_folder=WHEELHOUSE_DIR,
+            local_file=WHEELHOUSE_FILE,
+        )
+        archive = os.path.join(WHEELHOUSE_DIR, WHEELHOUSE_FILE)
+        with tarfile.open(archive, "r:gz") as tar:
+            tar.extractall(WHEELHOUSE_DIR)
+        os.remove(archive)
+
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def install_from_wheelhouse(faasr_get_file, server_name="S3"):
+    """Install the pinned stack offline from the wheelhouse"""
+    manifest = fetch_wheelhouse(faasr_get_file, server_name)
+    subprocess.check_call([
+        sys.executable, "-m", "pip", "install", "-q",
+        "--no-index", "--find-links", WHEELHOUSE_DIR,
+        "-r", os.path.join(WHEELHOUSE_DIR, WHEELHOUSE_REQUIREMENTS)
+    ])
+    print(f"Installed from wheelhouse (PyCHAMP {manifest.get('pychamp_commit', 'unknown')[:12]})")
+
+
+def install_online(modules):
+    """Install ``modules`` from PyPI/GitHub, as the steps originally did"""
+    base = [PYCHAMP_STACK[m] for m in modules if m != "py_champ"]
+    if base:
+        subprocess.check_call([
+            sys.executable, "-m", "pip", "install", "-q", *base
+        ])
+    if "py_champ" in modules:
+        subprocess.check_call([
+            sys.executable, "-m", "pip", "install", "-q",
+            PYCHAMP_STACK["py_champ"]
+        ])
+
+
+def install_dependencies(faasr_get_file=None, modules=tuple(PYCHAMP_STACK), server_name="S3"):
+    """
+    Make ``modules`` importable and return the time spent, in seconds
+
+    Modules that are already importable are skipped and the rest are
+    installed from the wheelhouse when it can be fetched with
+    ``faasr_get_file`` or is already unpacked, else (or if that fails) online.
+    An image with the stack preinstalled that lacks a module is reported.
+    """
+    start = time.perf_counter()
+    missing = missing_modules(modules)
+    if stack_preinstalled():
+        if not missing:
+            print(f"Using preinstalled PyCHAMP stack ({os.environ.get('PYCHAMP_COMMIT', 'unknown')[:12]})")
+            return time.perf_counter() - start
+        print(f"{PREINSTALLED_ENV} is set but {', '.join(missing)} cannot be imported - "
+              "the image is stale or wrong; installing them")
+    have_wheelhouse = os.path.exists(os.path.join(WHEELHOUSE_DIR, WHEELHOUSE_MANIFEST))
+
+    if not missing:
+        print("Dependencies already importable - skipping install")
+    else:
+        print(f"Installing dependencies: {', '.join(missing)}")
+        installed = False
+        if faasr_get_file is not None or have_wheelhouse:
+            try:
+                install_from_wheelhouse(faasr_get_file, server_name)
+                installed = True
+            except Exception as e:
+                print(f"Wheelhouse install failed ({e}) - falling back to online install")
+        if not installed:
+            install_online(missing)
+        importlib.invalidate_caches()
+        print("Dependencies installed")
+
+    elapsed = time.perf_counter() - start
+    print(f"Install took {elapsed:.2f}s")
+    return elapsed
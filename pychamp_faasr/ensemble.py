@@ -0,0 +1,273 @@
+"""
+Ensemble (parameter sweep) runs of the PyCHAMP chain
+
+An ensemble spec lists the settings to vary, by dotted path into the
+settings dict (``aquifer.aq_a``, ``finance.crop_price.corn``,
+``field.water_yield_curves.corn.0``), and how to sample them:
+
+    {"method": "grid", "parameters": {"aquifer.aq_a": [0.05, 0.1, 0.2], ...}}
+    {"method": "lhs", "samples": 1000, "seed": 1,
+     "parameters": {"aquifer.sy": [0.1, 0.3], ...}}          # [low, high]
+    {"method": "list", "scenarios": [{"aquifer.aq_b": 8.0}, ...]}
+
+plus optional ``n_seasons``. Expansion is deterministic, so every shard
+expands the spec itself and runs its contiguous slice of the scenarios.
+Results are kept as a columnar table: a dict of equal-length NumPy arrays,
+one per parameter and per result quantity. Sampling is pure Python, so the
+spec can be expanded before dependencies are installed. A shard can spread
+its scenarios over a process pool to use every core of the runner.
+"""
+
+import contextlib
+import copy
+import io
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import stages
+
+METHODS = ("grid", "lhs", "list")
+ENSEMBLE_FOLDER = "ensemble"
+SPEC_FILE = "spec"
+RESULT_COLUMNS = (
+    "st", "dwl_change_total", "yield", "irrigation_volume",
+    "profit", "total_profit",
+)
+# Chunks per pool worker: enough to balance uneven scenarios, few enough
+# that task dispatch stays negligible next to a scenario run
+CHUNKS_PER_WORKER = 4
+
+
+def expand(spec):
+    """Return the list of scenarios of ``spec``, each a {path: value} dict"""
+    method = spec.get("method", "grid")
+    parameters = spec.get("parameters", {})
+    if method == "grid":
+        paths = list(parameters)
+        return [dict(zip(paths, values))
+                for values in itertools.product(*(parameters[p] for p in paths))]
+    if method == "lhs":
+        return latin_hypercube(parameters, int(spec["samples"]), spec.get("seed", 0))
+    if method == "list":
+        return [dict(s) for s in spec.get("scenarios", [])]
+    raise ValueError(f"Unknown ensemble method '{method}' (expected one of {METHODS})")
+
+
+def latin_hypercube(ranges, samples, seed=0):
+    """``samples`` scenarios with one draw per stratum of each [low, high] range"""
+    rng = random.Random(seed)
+    columns = {}
+    for path, (low, high) in ranges.items():
+        strata = list(range(samples))
+        rng.shuffle(strata)
+        columns[path] = [low + (k + rng.random()) / samples * (high - low) for k in strata]
+    return [{path: columns[path][i] for path in ranges} for i in range(samples)]
+
+
+def partition(n_scenarios, n_shards, rank):
+    """Scenario index range of shard ``rank`` (1-based), sizes differing by at most one"""
+    if not 1 <= rank <= n_shards:
+        raise ValueError(f"Shard rank {rank} outside 1..{n_shards}")
+    base, extra = divmod(n_scenarios, n_shards)
+    start = (rank - 1) * base + min(rank - 1, extra)
+    return range(start, start + base + (1 if rank <= extra else 0))
+
+
+def faasr_shard(namespace, rank=None, n_shards=None):
+    """
+    (rank, n_shards) of this action: from ``faasr_rank()`` when the action
+    was invoked as ``shard(N)``, else the given values, else (1, 1)
+    """
+    faasr_rank = namespace.get("faasr_rank")
+    info = faasr_rank() if faasr_rank is not None and rank is None else None
+    if info:
+        info = {k.lower().replace("_", ""): v for k, v in dict(info).items()}
+        return int(info["rank"]), int(info["maxrank"])
+    return int(rank or 1), int(n_shards or 1)
+
+
+def _walk(settings, path):
+    keys = path.split(".")
+    node = settings
+    for key in keys[:-1]:
+        node = node[int(key)] if isinstance(node, list) else node[key]
+    last = int(keys[-1]) if isinstance(node, list) else keys[-1]
+    return node, last
+
+
+def apply(settings, scenario):
+    """Return a copy of ``settings`` with the scenario's values set"""
+    settings = copy.deepcopy(settings)
+    for path, value in scenario.items():
+        node, key = _walk(settings, path)
+        node[key] = value
+    return settings
+
+
+def parameter_paths(scenarios):
+    """All paths varied by any scenario, in first-seen order"""
+    return list(dict.fromkeys(path for s in scenarios for path in s))
+
+
+def run_scenario(settings, n_seasons=1):
+    """Run init and ``n_seasons`` of aquifer/field/finance quietly; return a result row"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim = stages.init_components(settings)
+        history = stages.run_seasons(sim, n_seasons)
+    return {
+        "st": history["st"][-1],
+        "dwl_change_total": history["dwl_change"].sum(),
+        "yield": history["yield"][-1],
+        "irrigation_volume": history["irrigation_volume"][-1],
+        "profit": history["profit"][-1],
+        "total_profit": history["profit"].sum(),
+    }
+
+
+def run_shard(spec, rank, n_shards, base_settings=None, workers=1, chunksize=None):
+    """
+    Run shard ``rank``'s slice of the ensemble; return its table
+
+    With ``workers`` > 1 (0: one per CPU) the slice is split into chunks run
+    on a process pool. Each worker imports Mesa/PyCHAMP and expands the spec
+    once, in its initializer; chunks (by default ``CHUNKS_PER_WORKER`` per
+    worker) keep the per-task overhead small while still balancing load.
+    """
+    scenarios = expand(spec)
+    indices = partition(len(scenarios), n_shards, rank)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(indices) < 2:
+        table = _run_indices(scenarios, spec, indices, base_settings)
+    else:
+        workers = min(workers, len(indices))
+        chunksize = chunksize or max(1, -(-len(indices) // (workers * CHUNKS_PER_WORKER)))
+        chunks = [indices[i:i + chunksize] for i in range(0, len(indices), chunksize)]
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(spec, base_settings)) as pool:
+            table = concat_tables(list(pool.map(_run_worker_chunk, chunks)))
+
+    import numpy as np
+
+    table["shard"] = np.full(len(indices), rank, dtype=np.int64)
+    return table
+
+
+def _setting(settings, path, default):
+    """The value at ``path`` in ``settings``, or ``default`` if there is none"""
+    try:
+        node, key = _walk(settings, path)
+        return node[key]
+    except (KeyError, IndexError, TypeError, ValueError):
+        return default
+
+
+def _column_dtype(scenarios, path):
+    """float if every scenario value of ``path`` is a number, else str"""
+    numeric = all(isinstance(s[path], (int, float)) for s in scenarios if path in s)
+    return float if numeric else str
+
+
+def _run_indices(scenarios, spec, indices, base_settings=None):
+    """
+    Table of ``scenarios[i]`` for i in ``indices``. A scenario that raises,
+    in its settings or its run, is recorded with NaN results and ``failed``
+    set, so one bad sample does not lose the rest of the shard. Parameter
+    columns hold each scenario's value, or the base setting's where it
+    leaves the path unset; they are float, or str if any scenario gives the
+    path a non-number (a crop or tech name, say).
+    """
+    import numpy as np
+
+    paths = parameter_paths(scenarios)
+    dtypes = {p: _column_dtype(scenarios, p) for p in paths}
+    base_settings = base_settings or stages.DEFAULT_SETTINGS
+    n_seasons = int(spec.get("n_seasons", 1))
+
+    table = {"scenario": np.array(indices, dtype=np.int64)}
+    values = {p: [np.nan if dtypes[p] is float else ""] * len(indices) for p in paths}
+    table.update({c: np.full(len(indices), np.nan) for c in RESULT_COLUMNS})
+    table["failed"] = np.zeros(len(indices), dtype=bool)
+    table["seconds"] = np.zeros(len(indices))
+
+    for row, i in enumerate(indices):
+        t0 = time.perf_counter()
+        for p in paths:
+            values[p][row] = scenarios[i].get(p, _setting(base_settings, p, values[p][row]))
+        try:
+            result = run_scenario(apply(base_settings, scenarios[i]), n_seasons)
+        except Exception as e:
+            print(f"Scenario {i} failed: {e}")
+            table["failed"][row] = True
+        else:
+            for c in RESULT_COLUMNS:
+                table[c][row] = result[c]
+        table["seconds"][row] = time.perf_counter() - t0
+    for p in paths:
+        table[p] = np.array(values[p], dtype=dtypes[p])
+    return table
+
+
+# Per-process state of a pool worker, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(spec, base_settings):
+    import mesa  # noqa: F401
+    import numpy  # noqa: F401
+    from py_champ.components import aquifer, field, finance, well  # noqa: F401
+
+    _worker.update(spec=spec, base_settings=base_settings, scenarios=expand(spec))
+
+
+def _run_worker_chunk(indices):
+    return _run_indices(_worker["scenarios"], _worker["spec"], indices,
+                        _worker["base_settings"])
+
+
+def concat_tables(tables):
+    """Stack tables with the same columns, ordered by scenario index"""
+    import numpy as np
+
+    columns = list(tables[0])
+    merged = {c: np.concatenate([t[c] for t in tables]) for c in columns}
+    order = np.argsort(merged["scenario"], kind="stable")
+    return {c: merged[c][order] for c in columns}
+
+
+def write_table(table, path, table_format="npz"):
+    """Write a table as an .npz of columns or as CSV; return bytes written"""
+    import numpy as np
+
+    if table_format == "npz":
+        with open(path, "wb") as f:
+            np.savez(f, **table)
+    elif table_format == "csv":
+        columns = list(table)
+        with open(path, "w") as f:
+            f.write(",".join(columns) + "\n")
+            for row in zip(*(table[c].tolist() for c in columns)):
+                f.write(",".join(str(v) for v in row) + "\n")
+    else:
+        raise ValueError(f"Unknown table format '{table_format}' (expected npz or csv)")
+    return os.path.getsize(path)
+
+
+def read_table(path):
+    import numpy as np
+
+    with np.load(path, allow_pickle=False) as npz:
+        return {k: npz[k] for k in npz.files}
+
+
+def dump_spec(spec, n_shards, path):
+    with open(path, "w") as f:
+        json.dump(dict(spec, n_shards=n_shards), f, indent=2)
+
+
+def load_spec(path):
+    with open(path, "r") as f:
+        return json.load(f)
@@ -0,0 +1,211 @@
+"""
+Vectorized NumPy versions of PyCHAMP component updates
+
+Each kernel applies the update of one PyCHAMP component's ``step`` to whole
+arrays of agents (and seasons) in one call, instead of one Python object per
+agent per season, following the component arithmetic as documented on each
+kernel. ``tests/test_kernels.py`` checks every output against hand-computed
+values and scalar loops, and the aquifer and field kernels against
+``Aquifer.step`` and ``Field.step`` where PyCHAMP is installed; the scripts
+in ``benchmarks/`` repeat that comparison at scale.
+"""
+
+
+def as_column(value, n):
+    """Broadcast a scalar or per-agent sequence to a float array of shape (n,)"""
+    import numpy as np
+
+    return np.broadcast_to(np.asarray(value, dtype=float), (n,)).copy()
+
+
+# aquifer
+
+
+def aquifer_kernel(st, withdrawal, inflow=None, aq_a=None, aq_b=None, area=None, sy=None):
+    """
+    Step ``n`` aquifers through ``T`` seasons, as ``Aquifer.step`` does
+
+    ``withdrawal`` and ``inflow`` (m-ha) have shape (n, T) or broadcast to
+    it; ``st`` and the parameters are scalars or shape (n,). With an inflow
+    the water level change is the water balance
+    ``(inflow - withdrawal) / (area * sy)``; without one (``inflow`` None,
+    or NaN for an aquifer) it is the KGS-WBM regression
+    ``aq_b - aq_a * withdrawal``.
+
+    Returns ``(st, dwl)``, both (n, T): saturated thickness after and water
+    level change during each season.
+    """
+    import numpy as np
+
+    withdrawal = np.atleast_2d(np.asarray(withdrawal, dtype=float))
+    st = np.asarray(st, dtype=float)
+    n = max(st.size, withdrawal.shape[0])
+    withdrawal = np.broadcast_to(withdrawal, (n, withdrawal.shape[1]))
+
+    def column(value):
+        return as_column(value, n)[:, None]
+
+    if inflow is None:
+        dwl = column(aq_b) - column(aq_a) * withdrawal
+    else:
+        inflow = np.broadcast_to(np.atleast_2d(np.asarray(inflow, dtype=float)), withdrawal.shape)
+        dwl = (inflow - withdrawal) / (column(area) * column(sy))
+        if aq_a is not None and aq_b is not None:
+            no_inflow = np.isnan(inflow)
+            dwl = np.where(no_inflow, column(aq_b) - column(aq_a) * withdrawal, dwl)
+    # Accumulating from st itself adds in the same order as st += dwl
+    st = np.cumsum(np.concatenate([column(st), dwl], axis=1), axis=1)[:, 1:]
+    return st, dwl
+
+
+def aquifer_projection(st, withdrawal, inflow=None, aq_a=None, aq_b=None, area=None, sy=None,
+                       dtype=float):
+    """
+    Saturated thickness trajectories of ``A`` aquifers under ``K``
+    withdrawal schedules of ``T`` seasons, all at once
+
+    ``withdrawal`` and ``inflow`` (m-ha) are (T,) or (K, T) schedules;
+    ``st`` and the parameters are scalars or (A,). The recurrence
+    ``st += dwl`` of ``aquifer_kernel`` has the closed form
+
+    - ``st[t] = st0 + (t + 1) * aq_b - aq_a * W[t]`` (KGS-WBM, no inflow),
+    - ``st[t] = st0 + (I[t] - W[t]) / (area * sy)`` (water balance),
+
+    with ``W`` and ``I`` the cumulative withdrawal and inflow of each
+    schedule, so only the (K, T) schedules are accumulated and the (A, K, T)
+    result is one broadcast. Seasons with a NaN inflow use the regression,
+    as in ``aquifer_kernel``. Matches stepping season by season up to
+    floating-point rounding. Returns the (A, K, T) trajectory in ``dtype``.
+    """
+    import numpy as np
+
+    withdrawal = np.atleast_2d(np.asarray(withdrawal, dtype=float))
+    st = np.atleast_1d(np.asarray(st, dtype=float))
+    n = max(st.size, *(np.size(p) for p in (aq_a, aq_b, area, sy) if p is not None))
+
+    def column(value):
+        return as_column(value, n)[:, None, None]
+
+    if inflow is None:
+        seasons = np.arange(1, withdrawal.shape[1] + 1)
+        trajectory = (column(st) + seasons * column(aq_b)
+                      - column(aq_a) * np.cumsum(withdrawal, axis=1)[None])
+        return trajectory.astype(dtype, copy=False)
+
+    inflow = np.broadcast_to(np.atleast_2d(np.asarray(inflow, dtype=float)), withdrawal.shape)
+    if not np.isnan(inflow).any():
+        net = np.cumsum(inflow - withdrawal, axis=1)[None]
+        trajectory = column(st) + net / (column(area) * column(sy))
+        return trajectory.astype(dtype, copy=False)
+
+    no_inflow = np.isnan(inflow)[None]
+    dwl = np.where(no_inflow, column(aq_b) - column(aq_a) * withdrawal[None],
+                   (np.where(no_inflow, 0.0, inflow[None]) - withdrawal[None])
+                   / (column(area) * column(sy)))
+    return (column(st) + np.cumsum(dwl, axis=2)).astype(dtype, copy=False)
+
+
+# field
+
+
+def field_tables(field_settings, crop_options, tech_options=None):
+    """
+    Array forms of a field's settings: water yield curves (n_crops, 6),
+    ordered as ``crop_options``, and pumping rate coefficients (n_techs, 3)
+    with the tech names giving their row order
+    """
+    import numpy as np
+
+    curves = np.array([field_settings["water_yield_curves"][c] for c in crop_options], dtype=float)
+    coefs = field_settings["tech_pumping_rate_coefs"]
+    tech_options = list(tech_options or coefs)
+    return curves, np.array([coefs[t] for t in tech_options], dtype=float), tech_options
+
+
+def field_kernel(irr_depth, i_crop, te, prec_aw, curves, tech_coefs, field_area):
+    """
+    One season of ``N`` fields, each split into ``S`` sections with ``C``
+    crop options, in one broadcasted pass
+
+    - ``irr_depth``, ``i_crop``: (N, S, C), irrigation depth (cm) and 0/1
+      crop indicators, as passed to ``Field.step`` (without its trailing
+      axis of length 1)
+    - ``te``: (N,) row of each field's tech in ``tech_coefs``
+    - ``prec_aw``: (C,) or (N, C) available precipitation (cm)
+    - ``curves``: (C, 6) or (N, C, 6) water yield curves
+      ``[ymax, wmax, a, b, c, min_y_ratio]``
+    - ``tech_coefs``: (n_techs, 3) pumping rate coefficients ``[a, b, l_pr]``
+    - ``field_area``: scalar or (N,) ha
+
+    Per section and crop, water supply w = irr_depth + prec_aw gives the
+    yield ratio ``y_y = clip(a w'^2 + b w' + c, min_y_ratio, 1)`` with
+    w' = w / wmax, and the yield ``y = y_y * ymax * section area * 1e-4``
+    (1e4 bu). The irrigation volume is ``sum(irr_depth * section area) *
+    0.01`` (m-ha) and the pumping rate ``a * irr_vol / l_pr + b``
+    (m-ha/day), as in ``Field.step``.
+
+    Returns a dict of ``y``, ``y_y`` (N, S, C) and ``avg_y_y``, ``irr_vol``,
+    ``pumping_rate`` (N,).
+    """
+    import numpy as np
+
+    irr_depth = np.asarray(irr_depth, dtype=float)
+    i_crop = np.asarray(i_crop, dtype=float)
+    n, n_s, _ = i_crop.shape
+    curves = np.asarray(curves, dtype=float)
+    if curves.ndim == 2:
+        curves = curves[None]
+    ymax, wmax, a, b, c, min_y_ratio = np.moveaxis(curves, -1, 0)[:, :, None, :]
+    section_area = as_column(field_area, n)[:, None, None] / n_s
+
+    irr_depth = irr_depth * i_crop
+    w_ = (irr_depth + np.asarray(prec_aw, dtype=float).reshape(-1, 1, i_crop.shape[2])) / wmax
+    y_y = np.clip(a * w_ ** 2 + b * w_ + c, min_y_ratio, 1) * i_crop
+    y = y_y * ymax * section_area * 1e-4
+
+    irr_vol = (irr_depth * section_area).sum(axis=(1, 2)) * 0.01
+    q_a, q_b, l_pr = np.asarray(tech_coefs, dtype=float)[np.asarray(te)].T
+    return {
+        "y": y,
+        "y_y": y_y,
+        "avg_y_y": y_y.sum(axis=(1, 2)) / n_s,
+        "irr_vol": irr_vol,
+        "pumping_rate": q_a * irr_vol / l_pr + q_b,
+    }
+
+
+# finance
+
+
+def finance_kernel(y, energy, crop_price, energy_price, tech_cost=0.0):
+    """
+    Revenue, energy cost, tech cost and profit of ``F`` fields under ``S``
+    price scenarios, for the full scenario x field cross product
+
+    - ``y``: (F, C) yield per field and crop (1e4 bu), i.e. ``Field.y``
+      summed over sections
+    - ``energy``: (F,) energy used by each field's well (PJ)
+    - ``crop_price``: (C,) or (S, C); ``energy_price``: scalar or (S,)
+    - ``tech_cost``: scalar, (F,) or (S, F) price-independent costs (1e4$)
+
+    As in ``Finance.step``, revenue is the yield valued at the crop prices
+    and energy cost the well energy at the energy price. Returns a dict of
+    (S, F) arrays.
+    """
+    import numpy as np
+
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    crop_price = np.atleast_2d(np.asarray(crop_price, dtype=float))
+    energy_price = np.atleast_1d(np.asarray(energy_price, dtype=float))
+    n_s = max(crop_price.shape[0], energy_price.shape[0])
+
+    revenue = np.broadcast_to(crop_price @ y.T, (n_s, y.shape[0]))
+    energy_cost = energy_price[:, None] * np.asarray(energy, dtype=float)[None, :]
+    energy_cost = np.broadcast_to(energy_cost, revenue.shape)
+    tech_cost = np.broadcast_to(np.asarray(tech_cost, dtype=float), revenue.shape)
+    return {
+        "revenue": revenue,
+        "energy_cost": energy_cost,
+        "tech_cost": tech_cost,
+        "profit": revenue - energy_cost - tech_cost,
+    }
@@ -0,0 +1,255 @@
+"""
+Memoized step results
+
+A step's output is a function of the state shards and sidecars it reads,
+its arguments and its code. ``step_key`` hashes exactly those: the raw
+bytes of the consumed shards and sidecars as stored (no decoding, so no
+dependency is needed to compute it), the run metadata of the manifest, the
+arguments, and a code version (the step's and this package's sources, plus
+the PyCHAMP requirement and baked-in commit).
+
+``StepCache`` keeps the output of each key under
+``pychamp-workflow/step-cache/<key>/``: the encoded shards and ``.npy``
+sidecars the step wrote and an entry file with its run metadata. On a hit
+the step commits those files as the next state version
+(``ShardedState.commit``, with the sidecars' dtype and shape from the
+entry) and returns before installing anything.
+
+There is no shared index. Each entry's file is named after its last
+access and size (``entry-<ms>-<bytes>.json``) and is replaced on every
+hit, so eviction finds the least recently used entries beyond
+``max_bytes`` or ``max_entries`` by listing the cache folder alone, and
+concurrent steps only ever write the folders of their own keys. A store
+uploads its files first, then the entry; a ``pending-<ms>`` marker covers
+the upload, so a store that died halfway is swept once the marker is older
+than ``PENDING_SECONDS``. Races remain but stay local to one key: two hits
+on the same entry may lose a hit count or leave two entry files (the
+newest is used), and a step hitting an entry while another step evicts it
+misses and recomputes.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+
+CACHE_FOLDER = "pychamp-workflow/step-cache"
+MAX_BYTES = 1 << 30
+MAX_ENTRIES = 10_000
+# A store's upload marker older than this belongs to a store that died
+PENDING_SECONDS = 3600
+
+_ENTRY = re.compile(r"entry-(\d+)-(\d+)\.json")
+_PENDING = re.compile(r"pending-(\d+)")
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def code_version(*sources):
+    """Digest of the ``sources`` files, this package's modules and the PyCHAMP pin"""
+    from . import deps
+
+    digest = hashlib.sha256()
+    paths = list(sources) + sorted(glob.glob(os.path.join(PACKAGE_DIR, "*.py")))
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    digest.update(deps.PYCHAMP_STACK["py_champ"].encode())
+    digest.update(os.environ.get("PYCHAMP_COMMIT", "").encode())
+    return digest.hexdigest()
+
+
+def step_key(step, layout, reads, arrays=(), args=None, sources=()):
+    """
+    Cache key of running ``step`` on the state of ``layout``: a hash of the
+    raw ``reads`` shards and ``arrays`` sidecars (downloaded once, for the
+    step's later ``read``), the manifest's run metadata, ``args`` and the
+    code version of ``sources``
+    """
+    from . import codec
+
+    files = layout.fetch(reads, arrays)
+    header = {
+        "step": step,
+        "codec": layout.state_codec,
+        "meta": layout.manifest["meta"],
+        "args": args or {},
+        "code": code_version(*sources),
+    }
+    digest = hashlib.sha256(json.dumps(header, sort_keys=True, default=codec.to_builtin).encode())
+    for name, local in files:
+        digest.update(name.encode())
+        with open(local, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def lookup(step, layout, reads, arrays=(), args=None, sources=(), completes=None):
+    """
+    (cache, key, hit) for ``step`` about to run on ``layout``: on a hit the
+    cached output is already committed, with the completion of the function
+    ``completes`` (see ``ShardedState.commit``). ``key`` is None if the
+    state cannot be hashed (e.g. no manifest yet); the step then runs uncached.
+    """
+    cache = StepCache(layout.store)
+    try:
+        key = step_key(step, layout, reads, arrays, args, sources)
+    except Exception as e:
+        print(f"Step cache disabled ({e})")
+        return cache, None, False
+    return cache, key, cache.restore(key, layout, completes)
+
+
+def _entry_file(last_access, size):
+    return f"entry-{int(last_access * 1000)}-{size}.json"
+
+
+def _entry_order(name):
+    """(last access in ms, bytes) of an entry file name"""
+    match = _ENTRY.fullmatch(name)
+    return int(match.group(1)), int(match.group(2))
+
+
+class StepCache:
+    """Step outputs in the data store, keyed by ``step_key``"""
+
+    def __init__(self, store, folder=CACHE_FOLDER, max_bytes=MAX_BYTES, max_entries=MAX_ENTRIES):
+        self.store = store
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+    def _list(self):
+        """{key: [object names]} of every entry folder under the cache folder"""
+        folders = {}
+        for path in self.store.list(f"{self.folder}/"):
+            key, _, name = path[len(self.folder) + 1:].partition("/")
+            if name:
+                folders.setdefault(key, []).append(name)
+        return folders
+
+    def _write_entry(self, folder, entry):
+        from . import codec
+
+        with open("step-cache-entry.json", "w") as f:
+            json.dump(entry, f, indent=2, default=codec.to_builtin)
+        name = _entry_file(entry["last_access"], entry["bytes"])
+        self.store.put("step-cache-entry.json", folder, name)
+        return name
+
+    def restore(self, key, layout, completes=None):
+        """
+        On a hit, commit the cached output of ``key`` as the next state
+        version of ``layout`` (completing ``completes``) and return True;
+        else return False
+        """
+        folder = f"{self.folder}/{key}"
+        names = [path.rsplit("/", 1)[1] for path in self.store.list(f"{folder}/")]
+        entries = sorted((n for n in names if _ENTRY.fullmatch(n)), key=_entry_order)
+        entry = None
+        if entries:
+            try:
+                self.store.get(folder, entries[-1], "step-cache-entry.json")
+                with open("step-cache-entry.json", "r") as f:
+                    entry = json.load(f)
+                files = {}
+                for name in entry["shards"]:
+                    files[name] = f"step-cache-{name}"
+                    self.store.get(folder, name, files[name])
+                array_files = {}
+                for name in entry["arrays"]:
+                    array_files[name] = f"step-cache-{name}.npy"
+                    self.store.get(folder, f"{name}.npy", array_files[name])
+                layout.commit(files, array_files, entry["meta"],
+                              array_info=entry.get("array_info"), completes=completes)
+            except Exception as e:
+                # Dropping the entry file leaves the folder for evict to sweep
+                print(f"Step cache entry {key[:12]} unusable ({e})")
+                self._delete(folder, entries)
+                entry = None
+
+        if entry is None:
+            print(f"Step cache miss {key[:12]}")
+            return False
+        entry["hits"] = entry.get("hits", 0) + 1
+        entry["last_access"] = time.time()
+        current = self._write_entry(folder, entry)
+        self._delete(folder, [n for n in entries if n != current])
+        print(f"Step cache hit {key[:12]} ({entry['hits']} hits on this entry)")
+        return True
+
+    def put(self, key, step, layout):
+        """Store the files of ``layout``'s last write as the output of ``key``"""
+        written = layout.written
+        folder = f"{self.folder}/{key}"
+        now = time.time()
+        pending = f"pending-{int(now * 1000)}"
+        with open("step-cache-pending", "w"):
+            pass
+        self.store.put("step-cache-pending", folder, pending)
+
+        size = 0
+        for name, local in written["shards"].items():
+            size += self.store.put(local, folder, name)
+        for name, local in written["arrays"].items():
+            size += self.store.put(local, folder, f"{name}.npy")
+        self._write_entry(folder, {
+            "step": step,
+            "shards": sorted(written["shards"]),
+            "arrays": sorted(written["arrays"]),
+            # dtype and shape of the sidecars, so a hit commits them without NumPy
+            "array_info": {
+                name: {k: layout.manifest["arrays"][name][k] for k in ("dtype", "shape")}
+                for name in written["arrays"]
+            },
+            "meta": written["meta"],
+            "bytes": size,
+            "hits": 0,
+            "created_at": now,
+            "last_access": now,
+        })
+        self._delete(folder, [pending])
+
+        evicted = self.evict()
+        print(f"Step cache stored {key[:12]} ({size} bytes"
+              + (f", evicted {evicted}" if evicted else "") + ")")
+
+    def evict(self, now=None):
+        """
+        Delete the least recently used entries beyond the limits, and the
+        folders of dead stores, as found by listing the cache folder; return
+        how many entries were deleted
+        """
+        now = time.time() if now is None else now
+        live, dead = [], []
+        for key, names in self._list().items():
+            entries = sorted((n for n in names if _ENTRY.fullmatch(n)), key=_entry_order)
+            pending = [int(m.group(1)) for m in map(_PENDING.fullmatch, names) if m]
+            if entries:
+                last_access, size = _entry_order(entries[-1])
+                live.append((last_access, size, key, names))
+            elif not pending or now * 1000 - max(pending) > PENDING_SECONDS * 1000:
+                dead.append((key, names))
+
+        total = sum(size for _, size, _, _ in live)
+        count = len(live)
+        for last_access, size, key, names in sorted(live):
+            if total <= self.max_bytes and count <= self.max_entries:
+                break
+            dead.append((key, names))
+            total -= size
+            count -= 1
+        for key, names in dead:
+            self._delete(f"{self.folder}/{key}", names)
+        return len(live) - count
+
+    def _delete(self, folder, names):
+        for name in names:
+            try:
+                self.store.delete(folder, name)
+            except Exception as e:
+                print(f"Could not delete {folder}/{name}: {e}")
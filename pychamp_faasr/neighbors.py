@@ -0,0 +1,214 @@
+"""
+Neighbor index for agent-to-agent comparisons
+
+Imitation and social comparison look at each farmer's nearest neighbors.
+Comparing every pair of N agents is O(N^2); instead a neighbor table is
+built once per run and cached in the data store:
+
+- from field coordinates: the ``k`` nearest other agents, through
+  ``scipy.spatial.cKDTree`` when SciPy is installed, else a uniform grid
+  (exact, searching outward ring by ring);
+- from an explicit network (edge lists): a CSR adjacency, keeping each
+  agent's ``k`` strongest (highest-weight) links.
+
+A table is two (N, k) arrays: ``indices`` (-1 where an agent has fewer than
+k neighbors) and ``distances`` (for networks, the link weights). ``gather``
+then reads any per-agent outcome for all agents' neighbors in one indexing
+operation.
+"""
+
+import hashlib
+
+NEIGHBORS_FILE_PREFIX = "neighbors-"
+
+
+class Neighbors:
+    """Top-k neighbor table of N agents"""
+
+    def __init__(self, indices, distances, method):
+        self.indices = indices
+        self.distances = distances
+        self.method = method
+
+    @property
+    def k(self):
+        return self.indices.shape[1]
+
+    def gather(self, values, fill=float("nan")):
+        """(N, k) array of ``values`` (one per agent) at each agent's neighbors"""
+        import numpy as np
+
+        values = np.asarray(values)
+        out = values[np.maximum(self.indices, 0)].astype(float)
+        out[self.indices < 0] = fill
+        return out
+
+    def save(self, path):
+        import numpy as np
+
+        with open(path, "wb") as f:
+            np.savez(f, indices=self.indices, distances=self.distances,
+                     method=np.array(self.method))
+
+    @classmethod
+    def load(cls, path):
+        import numpy as np
+
+        with np.load(path, allow_pickle=False) as npz:
+            return cls(npz["indices"], npz["distances"], str(npz["method"]))
+
+
+# coordinates
+
+
+def from_points(points, k, method=None):
+    """
+    The ``k`` nearest other agents of each point (N, 2). ``method`` is
+    "kdtree" or "grid"; by default the k-d tree if SciPy is available.
+    """
+    import numpy as np
+
+    points = np.asarray(points, dtype=float)
+    k = min(k, len(points) - 1)
+    if method is None:
+        try:
+            import scipy.spatial  # noqa: F401
+            method = "kdtree"
+        except ImportError:
+            method = "grid"
+    if k < 1:
+        return Neighbors(np.empty((len(points), 0), dtype=np.int64),
+                         np.empty((len(points), 0)), method)
+    if method == "kdtree":
+        from scipy.spatial import cKDTree
+
+        distances, indices = cKDTree(points).query(points, k=k + 1)
+        # Drop each point itself; with duplicate points it may not come first
+        self_hit = indices == np.arange(len(points))[:, None]
+        keep = ~self_hit
+        keep[self_hit.sum(axis=1) == 0, -1] = False
+        indices = indices[keep].reshape(len(points), k)
+        distances = distances[keep].reshape(len(points), k)
+        return Neighbors(indices.astype(np.int64), distances, method)
+    if method == "grid":
+        return Neighbors(*_grid_knn(points, k), method)
+    raise ValueError(f"Unknown neighbor method '{method}' (expected kdtree or grid)")
+
+
+def _grid_knn(points, k):
+    import numpy as np
+
+    n = len(points)
+    low = points.min(axis=0)
+    span = np.maximum(points.max(axis=0) - low, 1e-12)
+    # About k points per cell on average, over the area or, for points on a
+    # line (one span near zero), over the length
+    cell = max(float(np.sqrt(span.prod() * (k + 1) / n)), float(span.max()) * (k + 1) / n)
+    keys = np.floor((points - low) / cell).astype(np.int64)
+    nx, ny = keys.max(axis=0) + 1
+    order = np.lexsort((keys[:, 1], keys[:, 0]))
+    cells, starts, counts = np.unique(keys[order], axis=0, return_index=True, return_counts=True)
+    members = {tuple(c): order[s:s + m] for c, s, m in zip(cells.tolist(), starts, counts)}
+
+    def gather_ring(cx, cy, r):
+        # Clipped to the grid: a ring covering it holds every point, n > k
+        found = [members.get((x, y))
+                 for x in range(max(cx - r, 0), min(cx + r, nx - 1) + 1)
+                 for y in range(max(cy - r, 0), min(cy + r, ny - 1) + 1)]
+        return np.concatenate([f for f in found if f is not None])
+
+    indices = np.empty((n, k), dtype=np.int64)
+    distances = np.empty((n, k))
+    for (cx, cy), own in members.items():
+        r = 1
+        candidates = gather_ring(cx, cy, r)
+        while len(candidates) < k + 1:
+            r += 1
+            candidates = gather_ring(cx, cy, r)
+        # Every point within the k-th candidate distance lies within this
+        # many rings, so the search is exact
+        d = np.sqrt(((points[own, None, :] - points[None, candidates, :]) ** 2).sum(-1))
+        radius = np.sort(d, axis=1)[:, k].max()
+        r_exact = int(np.ceil(radius / cell)) + 1
+        if r_exact > r:
+            candidates = gather_ring(cx, cy, r_exact)
+            d = np.sqrt(((points[own, None, :] - points[None, candidates, :]) ** 2).sum(-1))
+        d[candidates[None, :] == own[:, None]] = np.inf
+        nearest = np.argsort(d, axis=1, kind="stable")[:, :k]
+        indices[own] = candidates[nearest]
+        distances[own] = np.take_along_axis(d, nearest, axis=1)
+    return indices, distances
+
+
+# networks
+
+
+def from_edges(n, src, dst, k, weight=None, symmetric=True):
+    """
+    The ``k`` highest-weight links of each of ``n`` agents in a network
+    given as edge lists, via a CSR adjacency
+    """
+    import numpy as np
+
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    weight = np.ones(len(src)) if weight is None else np.asarray(weight, dtype=float)
+    if symmetric:
+        src, dst, weight = np.r_[src, dst], np.r_[dst, src], np.r_[weight, weight]
+
+    # CSR: row = source agent, sorted by descending weight within a row
+    order = np.lexsort((-weight, src))
+    src, dst, weight = src[order], dst[order], weight[order]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(indptr, src + 1, 1)
+    indptr = np.cumsum(indptr)
+
+    rank = np.arange(len(src)) - indptr[src]
+    top = rank < k
+    indices = np.full((n, k), -1, dtype=np.int64)
+    weights = np.zeros((n, k))
+    indices[src[top], rank[top]] = dst[top]
+    weights[src[top], rank[top]] = weight[top]
+    return Neighbors(indices, weights, "csr")
+
+
+# caching
+
+
+def cache_key(k, method, *arrays):
+    """Content hash of the index inputs"""
+    import numpy as np
+
+    digest = hashlib.sha256(f"{k}:{method}".encode())
+    for array in arrays:
+        if array is not None:
+            digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def cached(store, folder, k, points=None, edges=None, method=None):
+    """
+    Neighbor table for ``points`` (N, 2), or for ``edges`` = {"n", "src",
+    "dst"[, "weight"]}: loaded from ``folder`` in the data store if it was
+    built for the same inputs before, else built and uploaded there
+    """
+    import numpy as np
+
+    if edges is not None:
+        arrays = [np.asarray(edges[key]) for key in ("src", "dst") if key in edges]
+        key = cache_key(k, "csr", np.array(edges["n"]), *arrays,
+                        np.asarray(edges["weight"]) if "weight" in edges else None)
+    else:
+        key = cache_key(k, method or "auto", np.asarray(points, dtype=float))
+    name = f"{NEIGHBORS_FILE_PREFIX}{key}.npz"
+
+    if store.exists(folder, name):
+        store.get(folder, name, name)
+        return Neighbors.load(name)
+    if edges is not None:
+        neighbors = from_edges(edges["n"], edges["src"], edges["dst"], k, edges.get("weight"))
+    else:
+        neighbors = from_points(points, k, method)
+    neighbors.save(name)
+    store.put(name, folder, name)
+    return neighbors
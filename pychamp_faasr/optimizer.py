@@ -0,0 +1,539 @@
+"""
+Batched irrigation and crop allocation with an open solver
+
+Replaces the proprietary (Gurobi) decision model with mixed-integer linear
+programs solved by HiGHS through ``scipy.optimize.milp``.
+
+Each farmer's field is split into ``S`` sections (``stages.AREA_SPLIT``).
+Every section gets one option: a crop and an irrigation depth from a grid of
+``levels`` (cm). The variable ``n[c, l]`` counts the sections with crop
+``c`` at depth level ``l``, so a farmer has ``C * L`` integer variables and
+two constraints:
+
+- ``sum(n) == S``: every section is planted;
+- ``sum(n * depth * section_area) * 0.01 <= water_limit``: the season's
+  irrigation volume (m-ha) stays within the farmer's water limit.
+
+The objective is the season profit as ``Finance.step`` / ``finance_kernel``
+count it (1e4$): revenue from the field kernel's yield at each (crop, depth)
+minus the energy cost of pumping the water (the tech cost does not depend on
+the plan). The yield curve is evaluated exactly at the grid points, whatever
+its shape. In the LP relaxation (``integer=False``) ``n`` is a continuous
+area share.
+
+Farmers do not interact, so ``solve`` stacks up to ``batch_size`` of their
+problems into one block-diagonal program per solver call. Farmers with the
+same inputs share one problem. A ``SolutionCache`` adds a memo of solved
+problems keyed by quantized inputs, so ensemble members and repeated seasons
+solve each problem once, and each agent's last plan, from which its next
+solve is warm-started (with highspy installed).
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import kernels, stages
+
+MAX_DEPTH = 50.0  # cm
+N_LEVELS = 11
+BATCH_SIZE = 256
+CHUNKS_PER_WORKER = 4
+
+# Share of the aquifer's drainable storage one farmer may pump in a season
+STORAGE_SHARE = 0.1
+
+# Input resolution of the solution cache: storage (m), field area (ha),
+# crop prices and energy price
+QUANTA = {"storage": 1e-3, "field_area": 1e-3, "crop_price": 1e-4, "energy_price": 1e-6}
+MEMO_SIZE = 100_000
+CACHE_FOLDER = "pychamp-workflow/optimizer"
+CACHE_FILE = "solution-cache.npz"
+
+
+def depth_levels(max_depth=MAX_DEPTH, n_levels=N_LEVELS):
+    import numpy as np
+
+    return np.linspace(0.0, max_depth, n_levels)
+
+
+def yield_table(levels, field_settings=None, crop_options=None, prec_aw=None):
+    """
+    (L, C) yield per hectare (1e4 bu/ha) of each crop irrigated at each
+    depth level, from ``kernels.field_kernel``
+    """
+    import numpy as np
+
+    field_settings = field_settings or stages.DEFAULT_SETTINGS["field"]
+    crop_options = crop_options or stages.CROP_OPTIONS
+    prec_aw = prec_aw or stages.PREC_AW
+    curves, tech_coefs, _ = kernels.field_tables(field_settings, crop_options)
+
+    n_l, n_c = len(levels), len(crop_options)
+    result = kernels.field_kernel(
+        np.broadcast_to(np.asarray(levels, dtype=float)[:, None, None], (n_l, 1, n_c)),
+        np.ones((n_l, 1, n_c)), np.zeros(n_l, dtype=int),
+        [prec_aw[c] for c in crop_options], curves, tech_coefs, 1.0,
+    )
+    return result["y"][:, 0, :]
+
+
+def pumping_energy(well_settings=None):
+    """
+    Energy (PJ) to lift one m-ha of water from the well,
+    ``rho * g * l_wt * 1e4 m3 / (eff_pump * eff_well)``
+    """
+    well = well_settings or stages.DEFAULT_SETTINGS["well"]
+    joules = well["rho"] * well["g"] * well["init"]["l_wt"] * 1e4
+    return joules / (well["eff_pump"] * well["eff_well"]) * 1e-15
+
+
+def water_limit(storage, aquifer_settings=None, well_settings=None, share=STORAGE_SHARE):
+    """
+    Season water limit (m-ha) of farmers pumping from aquifers with
+    saturated thickness ``storage`` (m): ``share`` of the drainable storage
+    ``st * area * sy``, capped by the well's pumping capacity
+    """
+    import numpy as np
+
+    aquifer = aquifer_settings or stages.DEFAULT_SETTINGS["aquifer"]
+    well = well_settings or stages.DEFAULT_SETTINGS["well"]
+    drainable = np.maximum(np.asarray(storage, dtype=float), 0.0) * aquifer["area"] * aquifer["sy"]
+    return np.minimum(share * drainable, well["pumping_capacity"])
+
+
+def profit_coefficients(y_table, levels, field_area, crop_price,
+                        energy_price, energy_per_volume, n_sections):
+    """
+    (N, C, L) profit (1e4$) of one section of each farmer's field planted
+    with crop c and irrigated at level l, and (N, C, L) its irrigation volume
+    (m-ha)
+    """
+    import numpy as np
+
+    section_area = np.asarray(field_area, dtype=float).reshape(-1, 1, 1) / n_sections
+    crop_price = np.atleast_2d(np.asarray(crop_price, dtype=float))[:, :, None]
+    energy_price = np.asarray(energy_price, dtype=float).reshape(-1, 1, 1)
+
+    volume = section_area * np.asarray(levels, dtype=float)[None, None, :] * 0.01
+    volume = np.broadcast_to(volume, (section_area.shape[0], y_table.shape[1], len(levels)))
+    revenue = section_area * y_table.T[None] * crop_price
+    return revenue - volume * energy_per_volume * energy_price, volume
+
+
+def _block_matrix(volume):
+    """(2B, B*C*L) constraint matrix: planted sections, then water, per farmer"""
+    import numpy as np
+    from scipy.sparse import csr_matrix, vstack
+
+    b = volume.shape[0]
+    v = volume[0].size
+    rows = np.repeat(np.arange(b), v)
+    cols = np.arange(b * v)
+    planted = csr_matrix((np.ones(b * v), (rows, cols)), shape=(b, b * v))
+    water = csr_matrix((volume.reshape(-1), (rows, cols)), shape=(b, b * v))
+    return vstack([planted, water])
+
+
+def _solve_highs(cost, matrix, row_lower, row_upper, n_sections, integer, start, time_limit):
+    """Solve with highspy, passing ``start`` as the initial (MIP) solution"""
+    import highspy
+    import numpy as np
+
+    matrix = matrix.tocsc()
+    lp = highspy.HighsLp()
+    lp.num_col_, lp.num_row_ = matrix.shape[1], matrix.shape[0]
+    lp.col_cost_ = cost
+    lp.col_lower_ = np.zeros(lp.num_col_)
+    lp.col_upper_ = np.full(lp.num_col_, float(n_sections))
+    lp.row_lower_, lp.row_upper_ = row_lower, row_upper
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = matrix.indptr
+    lp.a_matrix_.index_ = matrix.indices
+    lp.a_matrix_.value_ = matrix.data
+    if integer:
+        lp.integrality_ = [highspy.HighsVarType.kInteger] * lp.num_col_
+
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", False)
+    if time_limit is not None:
+        h.setOptionValue("time_limit", float(time_limit))
+    h.passModel(lp)
+    solution = highspy.HighsSolution()
+    solution.col_value = list(start)
+    h.setSolution(solution)
+    h.run()
+    if h.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+        raise RuntimeError(f"Irrigation program failed: {h.modelStatusToString(h.getModelStatus())}")
+    return np.asarray(h.getSolution().col_value)
+
+
+def warm_start_available():
+    """True if highspy, which takes initial solutions, is installed"""
+    return importlib.util.find_spec("highspy") is not None
+
+
+def solve_block(profit, volume, limit, n_sections, integer=True, time_limit=None, start=None):
+    """
+    One block-diagonal program for ``B`` farmers' (B, C, L) problems;
+    returns the (B, C, L) section counts
+
+    With ``start`` (B, C, L), e.g. last season's plans, and highspy
+    installed, HiGHS starts from that solution; otherwise (and without
+    highspy) it is solved cold through ``scipy.optimize.milp``.
+    """
+    import numpy as np
+
+    b, n_c, n_l = profit.shape
+    matrix = _block_matrix(volume)
+    row_lower = np.r_[np.full(b, float(n_sections)), np.full(b, -np.inf)]
+    row_upper = np.r_[np.full(b, float(n_sections)), np.asarray(limit, dtype=float)]
+
+    x = None
+    if start is not None:
+        try:
+            x = _solve_highs(-profit.reshape(-1), matrix, row_lower, row_upper,
+                             n_sections, integer, np.asarray(start, dtype=float).reshape(-1),
+                             time_limit)
+        except ImportError:
+            pass
+    if x is None:
+        from scipy.optimize import Bounds, LinearConstraint, milp
+
+        options = {} if time_limit is None else {"time_limit": time_limit}
+        result = milp(
+            c=-profit.reshape(-1),
+            constraints=[LinearConstraint(matrix, row_lower, row_upper)],
+            integrality=np.full(b * n_c * n_l, 1 if integer else 0),
+            bounds=Bounds(0, n_sections),
+            options=options,
+        )
+        if result.x is None:
+            raise RuntimeError(f"Irrigation program failed: {result.message}")
+        x = result.x
+    x = x.reshape(b, n_c, n_l)
+    return np.round(x) if integer else x
+
+
+# scheduling
+
+
+def binding_limit(volume, limit, n_sections):
+    """Whether each problem's water limit is below full irrigation of every section"""
+    full = volume.max(axis=(1, 2)) * n_sections
+    return (limit > 0) & (limit < full)
+
+
+def guided_chunks(indices, workers, batch_size=BATCH_SIZE):
+    """
+    Split ``indices`` into chunks for ``workers``: each takes
+    1 / (``CHUNKS_PER_WORKER`` * workers) of what is left (at most
+    ``batch_size``), so chunks shrink towards the end and no worker is left
+    with a long last chunk while the others idle
+    """
+    chunks = []
+    begin = 0
+    while begin < len(indices):
+        left = len(indices) - begin
+        size = min(batch_size, max(1, -(-left // (CHUNKS_PER_WORKER * workers))))
+        chunks.append(indices[begin:begin + size])
+        begin += size
+    return chunks
+
+
+def _init_worker():
+    import numpy  # noqa: F401
+    import scipy.optimize  # noqa: F401
+    import scipy.sparse  # noqa: F401
+
+
+def _solve_chunk(profit, volume, limit, n_sections, integer, time_limit, start):
+    t0 = time.perf_counter()
+    sections = solve_block(profit, volume, limit, n_sections, integer, time_limit, start)
+    return sections, time.perf_counter() - t0
+
+
+# caching
+
+
+class SolutionCache:
+    """
+    Solved plans, kept between seasons and shared by ensemble members
+
+    ``memo`` maps a problem key (``problem_keys``) to its (C, L) section
+    counts; ``previous`` maps an agent id to its last plan, the warm start
+    of its next solve. Both are least recently used first and hold at most
+    ``max_size`` entries. ``hits`` / ``misses`` count memo lookups. Only
+    plans are kept, no solver basis: HiGHS's MIP solver starts from an
+    initial solution, not a basis.
+    """
+
+    def __init__(self, memo=None, previous=None, max_size=MEMO_SIZE):
+        self.memo = OrderedDict(memo or {})
+        self.previous = OrderedDict(previous or {})
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._evict()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key):
+        sections = self.memo.get(key)
+        if sections is None:
+            self.misses += 1
+            return None
+        self.memo.move_to_end(key)
+        self.hits += 1
+        return sections
+
+    def put(self, key, sections):
+        self.memo[key] = sections
+        self.memo.move_to_end(key)
+        self._evict()
+
+    def remember(self, agent, sections):
+        """Record ``agent``'s last plan"""
+        self.previous[agent] = sections
+        self.previous.move_to_end(agent)
+        self._evict()
+
+    def update(self, other):
+        """Add ``other``'s entries that this cache does not have, as least recently used"""
+        for own, theirs in ((self.memo, other.memo), (self.previous, other.previous)):
+            new = [key for key in theirs if key not in own]
+            for key in reversed(new):
+                own[key] = theirs[key]
+                own.move_to_end(key, last=False)
+        self._evict()
+
+    def _evict(self):
+        for entries in (self.memo, self.previous):
+            while len(entries) > self.max_size:
+                entries.popitem(last=False)
+
+    def save(self, path):
+        import numpy as np
+
+        def stack(entries):
+            # Plans of another problem shape (older settings) are dropped
+            shapes = [np.shape(v) for v in entries.values()]
+            shape = shapes[-1] if shapes else (0, 0)
+            kept = {k: v for k, v in entries.items() if np.shape(v) == shape}
+            return (np.array(list(kept), dtype=str),
+                    np.array(list(kept.values()), dtype=float).reshape((len(kept),) + shape))
+
+        memo_keys, memo_sections = stack(self.memo)
+        agents, previous_sections = stack(self.previous)
+        with open(path, "wb") as f:
+            np.savez(f, memo_keys=memo_keys, memo_sections=memo_sections,
+                     agents=agents, previous_sections=previous_sections)
+
+    @classmethod
+    def load(cls, path, max_size=MEMO_SIZE):
+        import numpy as np
+
+        with np.load(path, allow_pickle=False) as npz:
+            return cls(dict(zip(npz["memo_keys"].tolist(), npz["memo_sections"])),
+                       dict(zip(npz["agents"].tolist(), npz["previous_sections"])),
+                       max_size)
+
+    @classmethod
+    def pull(cls, store, folder=CACHE_FOLDER, max_size=MEMO_SIZE):
+        """The cache in the data store, or an empty one"""
+        if not store.exists(folder, CACHE_FILE):
+            return cls(max_size=max_size)
+        store.get(folder, CACHE_FILE, CACHE_FILE)
+        return cls.load(CACHE_FILE, max_size)
+
+    def push(self, store, folder=CACHE_FOLDER):
+        """
+        Upload to the data store, first merging entries another member
+        uploaded since ``pull``
+        """
+        if store.exists(folder, CACHE_FILE):
+            store.get(folder, CACHE_FILE, CACHE_FILE)
+            self.update(SolutionCache.load(CACHE_FILE, self.max_size))
+        self.save(CACHE_FILE)
+        store.put(CACHE_FILE, folder, CACHE_FILE)
+
+
+def structure_digest(settings, levels, integer):
+    """Hash of everything that shapes a problem besides the per-farmer inputs"""
+    import numpy as np
+
+    parts = [settings["field"], settings["well"], settings["aquifer"], stages.CROP_OPTIONS,
+             stages.AREA_SPLIT, np.asarray(levels, dtype=float).tolist(), bool(integer)]
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def problem_keys(grid, digest):
+    """One key per row of quantized farmer inputs ``grid`` (int64)"""
+    return [hashlib.blake2b(row.tobytes(), digest_size=12, key=digest[:64].encode()).hexdigest()
+            for row in grid]
+
+
+def solve(storage, field_area=None, crop_price=None, energy_price=None,
+          settings=None, levels=None, integer=True, batch_size=BATCH_SIZE, time_limit=None,
+          cache=None, agent_ids=None, workers=1):
+    """
+    Optimal crop and irrigation plans of ``N`` farmers
+
+    ``storage`` (N,) is each farmer's aquifer saturated thickness (m);
+    ``field_area`` (N,), ``crop_price`` ((C,) or (N, C)) and
+    ``energy_price`` ((N,) or scalar) default to the settings. Farmers with
+    identical inputs share one solve.
+
+    With a ``SolutionCache``, inputs are first snapped to the ``QUANTA``
+    grid, so that a memo hit is the exact solution of the snapped problem.
+    Only problems missing from the memo are solved, each warm-started from
+    the previous plan of one of its ``agent_ids`` (default: row numbers).
+
+    With ``workers`` > 1 (0: one per CPU) the problems are solved on a
+    process pool (``guided_chunks``).
+
+    Returns a dict with the (N, C, L) section counts ``sections``, the depth
+    ``levels``, per-farmer ``irr_depth`` (mean over the field, cm),
+    ``irr_vol`` (m-ha), ``profit`` (1e4$) and ``crop_share`` (N, C), and the
+    solver statistics: ``solve_time`` (s, wall time of all solver calls),
+    ``solve_time_per_agent``, ``solver_seconds`` (summed over workers),
+    ``workers``, ``n_calls``, ``n_problems`` (distinct), and
+    ``n_solved`` / ``n_warm`` (solved, of which warm-started).
+    """
+    import numpy as np
+
+    settings = settings or stages.DEFAULT_SETTINGS
+    finance = settings["finance"]
+    crops = stages.CROP_OPTIONS
+    n_s = stages.AREA_SPLIT
+
+    storage = np.atleast_1d(np.asarray(storage, dtype=float))
+    n = storage.shape[0]
+    levels = depth_levels() if levels is None else np.asarray(levels, dtype=float)
+    field_area = kernels.as_column(
+        settings["field"]["field_area"] if field_area is None else field_area, n
+    )
+    crop_price = [finance["crop_price"][c] for c in crops] if crop_price is None else crop_price
+    crop_price = np.broadcast_to(np.atleast_2d(np.asarray(crop_price, dtype=float)), (n, len(crops)))
+    energy_price = kernels.as_column(finance["energy_price"] if energy_price is None else energy_price, n)
+
+    # Distinct problems: one row of inputs per farmer
+    inputs = np.column_stack([storage, field_area, crop_price, energy_price])
+    if cache is not None:
+        quanta = np.r_[QUANTA["storage"], QUANTA["field_area"],
+                       np.full(len(crops), QUANTA["crop_price"]), QUANTA["energy_price"]]
+        grid = np.round(inputs / quanta).astype(np.int64)
+        grid, inverse = np.unique(grid, axis=0, return_inverse=True)
+        inputs = grid * quanta
+    else:
+        inputs, inverse = np.unique(inputs, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    u_storage, u_area, u_energy = inputs[:, 0], inputs[:, 1], inputs[:, -1]
+    u_price = inputs[:, 2:-1]
+
+    profit, volume = profit_coefficients(
+        yield_table(levels, settings["field"], crops), levels, u_area,
+        u_price, u_energy, pumping_energy(settings["well"]), n_s,
+    )
+    limit = water_limit(u_storage, settings["aquifer"], settings["well"])
+    sections = np.empty(profit.shape)
+
+    todo = np.arange(len(inputs))
+    keys = None
+    if cache is not None:
+        keys = problem_keys(grid, structure_digest(settings, levels, integer))
+        cached = [cache.get(key) for key in keys]
+        for i, plan in enumerate(cached):
+            if plan is not None:
+                sections[i] = plan
+        todo = np.array([i for i, plan in enumerate(cached) if plan is None], dtype=np.int64)
+
+    # Warm starts: the previous plan of any agent with the same problem;
+    # all sections unirrigated under the first crop (always feasible) else
+    agent_ids = [str(a) for a in (range(n) if agent_ids is None else agent_ids)]
+    start = None
+    n_warm = 0
+    if cache is not None and cache.previous and warm_start_available():
+        start = np.zeros(profit.shape)
+        start[:, 0, 0] = n_s
+        warm = np.zeros(len(inputs), dtype=bool)
+        for agent, i in zip(agent_ids, inverse):
+            plan = cache.previous.get(agent)
+            if not warm[i] and plan is not None and np.shape(plan) == profit.shape[1:]:
+                start[i], warm[i] = plan, True
+        n_warm = int(warm[todo].sum())
+
+    workers = workers or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    if workers <= 1 or len(todo) < 2:
+        chunks = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+        solver_seconds = 0.0
+        for block in chunks:
+            sections[block], seconds = _solve_chunk(
+                profit[block], volume[block], limit[block], n_s, integer, time_limit,
+                None if start is None else start[block],
+            )
+            solver_seconds += seconds
+    else:
+        # Binding water limits need branching: those problems go first, in
+        # shrinking chunks that idle workers take from the shared queue
+        order = todo[np.argsort(~binding_limit(volume[todo], limit[todo], n_s), kind="stable")]
+        chunks = guided_chunks(order, workers, batch_size)
+        solver_seconds = 0.0
+        with ProcessPoolExecutor(min(workers, len(chunks)), initializer=_init_worker) as pool:
+            futures = {
+                pool.submit(_solve_chunk, profit[block], volume[block], limit[block], n_s,
+                            integer, time_limit, None if start is None else start[block]): block
+                for block in chunks
+            }
+            for future in as_completed(futures):
+                sections[futures[future]], seconds = future.result()
+                solver_seconds += seconds
+    solve_time = time.perf_counter() - t0
+    n_calls = len(chunks)
+
+    if cache is not None:
+        for i in todo:
+            cache.put(keys[i], sections[i].copy())
+        for agent, i in zip(agent_ids, inverse):
+            cache.remember(agent, sections[i])
+
+    irr_vol = (sections * volume).sum(axis=(1, 2))
+    return {
+        "sections": sections[inverse],
+        "levels": levels,
+        "irr_depth": ((sections * levels).sum(axis=(1, 2)) / n_s)[inverse],
+        "irr_vol": irr_vol[inverse],
+        "profit": (sections * profit).sum(axis=(1, 2))[inverse],
+        "crop_share": (sections.sum(axis=2) / n_s)[inverse],
+        "water_limit": limit[inverse],
+        "solve_time": solve_time,
+        "solve_time_per_agent": solve_time / max(n, 1),
+        "solver_seconds": solver_seconds,
+        "workers": workers,
+        "n_calls": n_calls,
+        "n_problems": len(inputs),
+        "n_solved": len(todo),
+        "n_warm": n_warm,
+    }
+
+
+def section_plan(sections, levels, crop_options=None):
+    """
+    One farmer's (C, L) integer section counts as per-section lists of crop
+    names and irrigation depths (cm), ordered by crop then depth
+    """
+    crop_options = crop_options or stages.CROP_OPTIONS
+    crops, depths = [], []
+    for c, counts in enumerate(sections):
+        for level, count in zip(levels, counts):
+            crops += [crop_options[c]] * int(round(count))
+            depths += [float(level)] * int(round(count))
+    return {"crop": crops, "irr_depth": depths}
@@ -0,0 +1,253 @@
+"""
+Step phases: timing, resources and overlap
+
+A step used to download its state, install the stack, import it, compute
+and upload, strictly one after the other. The state download and the
+install are independent, and so are the uploads that end a step: ``Phases``
+runs such tasks on threads (``concurrently``). Threads suit these phases:
+transfers wait on the network, pip runs in a subprocess, and importing
+extension modules mostly waits on the disk.
+
+The steps follow one policy. Decoding a msgpack, npz or compressed shard
+needs the stack, downloading it does not, so each step ``prefetch``es the
+raw shards, sidecars and snapshot it reads while the stack installs and
+imports (``install_and_import``), and decodes once both are done. At the
+end of a step the state is committed first, blocking, since the next
+action reads it as soon as this one returns. The outputs nothing waits on
+(step cache entry, completion marker copy, snapshot) then upload together.
+
+Every phase records its wall time, CPU time (of its thread and of child
+processes such as pip), the process's peak RSS so far, the peak traced
+Python allocation (with ``PYCHAMP_TRACE_MEMORY`` set) and the bytes the
+step's ``DataStore`` moved. Memory and bytes are process-wide, so phases
+that overlap share them. ``report`` prints the timings, with the time each
+overlap took on the critical path against running its tasks back to back,
+and uploads the whole record as JSON to
+``FaaSrLog/<InvocationID>/pychamp-metrics/<step>.json``, next to the FaaSr
+logs. A step that never reaches ``report`` uploads its record at exit with
+status ``incomplete``. ``scripts/aggregate_metrics.py`` turns the records of
+many invocations into per-step percentile tables.
+"""
+
+import atexit
+import contextlib
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+
+# Imported by the stack phase, so steps find them in sys.modules
+HEAVY_IMPORTS = (
+    "numpy",
+    "mesa",
+    "py_champ.components.aquifer",
+    "py_champ.components.well",
+    "py_champ.components.field",
+    "py_champ.components.finance",
+)
+
+LOG_FOLDER = "FaaSrLog"
+METRICS_FOLDER = "pychamp-metrics"
+RECORD_SCHEMA = 1
+TRACE_MEMORY_ENV = "PYCHAMP_TRACE_MEMORY"
+
+
+def metrics_folder(invocation_id):
+    """Data store folder of one invocation's step records, next to its FaaSr logs"""
+    return f"{LOG_FOLDER}/{invocation_id}/{METRICS_FOLDER}"
+
+
+def peak_rss():
+    """Peak resident set size of this process so far, in bytes; None where unsupported"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def children_cpu():
+    """CPU seconds of this process's finished child processes"""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Phases:
+    """
+    Per-phase wall time, CPU time, peak memory and data store bytes of one
+    step, and the overlaps between phases. With ``step`` and ``store``, the
+    record is uploaded to the invocation's metrics folder.
+    """
+
+    def __init__(self, step=None, store=None, trace_memory=None):
+        self.step = step
+        self.store = store
+        self.phases = {}
+        # (label, wall seconds, back-to-back seconds) per concurrently() call
+        self.overlaps = []
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self._start = time.perf_counter()
+        self._cpu = time.process_time() + children_cpu()
+        self._lock = threading.Lock()
+        self.finished = False
+
+        if trace_memory is None:
+            trace_memory = os.environ.get(TRACE_MEMORY_ENV, "") not in ("", "0", "false")
+        self.trace_memory = trace_memory
+        if trace_memory:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        if step and store is not None:
+            atexit.register(self._at_exit)
+
+    @property
+    def seconds(self):
+        return {name: m["wall_seconds"] for name, m in self.phases.items()}
+
+    def _bytes(self):
+        if self.store is None:
+            return 0, 0
+        return self.store.bytes_in, self.store.bytes_out
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if self.trace_memory:
+            import tracemalloc
+
+            tracemalloc.reset_peak()
+        wall, cpu, children = time.perf_counter(), time.thread_time(), children_cpu()
+        bytes_in, bytes_out = self._bytes()
+        try:
+            yield
+        finally:
+            end_in, end_out = self._bytes()
+            sample = {
+                "wall_seconds": time.perf_counter() - wall,
+                "cpu_seconds": time.thread_time() - cpu + children_cpu() - children,
+                "bytes_in": end_in - bytes_in,
+                "bytes_out": end_out - bytes_out,
+            }
+            traced = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+            with self._lock:
+                metrics = self.phases.setdefault(name, {
+                    "wall_seconds": 0.0, "cpu_seconds": 0.0, "bytes_in": 0, "bytes_out": 0,
+                    "peak_rss_bytes": None, "peak_traced_bytes": None,
+                })
+                for key, value in sample.items():
+                    metrics[key] += value
+                metrics["peak_rss_bytes"] = peak_rss()
+                if traced is not None:
+                    metrics["peak_traced_bytes"] = max(metrics["peak_traced_bytes"] or 0, traced)
+
+    def concurrently(self, label, tasks):
+        """
+        Run ``tasks`` ({phase: zero-argument callable}) on threads, each
+        timed as its phase; return {phase: result}, re-raising the first
+        failure once all have finished
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        def timed(name, task):
+            with self.phase(name):
+                return task()
+
+        start = time.perf_counter()
+        before = {name: self.seconds.get(name, 0.0) for name in tasks}
+        with ThreadPoolExecutor(max_workers=max(len(tasks), 1)) as pool:
+            futures = {name: pool.submit(timed, name, task) for name, task in tasks.items()}
+        wall = time.perf_counter() - start
+        seconds = self.seconds
+        serial = sum(seconds[name] - before[name] for name in tasks)
+        self.overlaps.append((label, wall, serial))
+        return {name: future.result() for name, future in futures.items()}
+
+    def record(self, status="ok"):
+        """The step's record: totals, per-phase metrics and overlaps"""
+        bytes_in, bytes_out = self._bytes()
+        return {
+            "schema": RECORD_SCHEMA,
+            "step": self.step,
+            "invocation_id": self.store.invocation_id if self.store is not None else None,
+            "status": status,
+            "started_at": self.started_at,
+            "wall_seconds": time.perf_counter() - self._start,
+            "cpu_seconds": time.process_time() + children_cpu() - self._cpu,
+            "peak_rss_bytes": peak_rss(),
+            "bytes_in": bytes_in,
+            "bytes_out": bytes_out,
+            "python": f"{sys.version_info.major}.{sys.version_info.minor}",
+            "phases": self.phases,
+            "overlaps": [
+                {"label": label, "wall_seconds": wall, "serial_seconds": serial}
+                for label, wall, serial in self.overlaps
+            ],
+        }
+
+    def report(self, status="ok"):
+        """Print the phase timings and overlaps; upload the record if this step has a store"""
+        if self.phases:
+            print("Phase timings: " + ", ".join(
+                f"{name} {seconds:.2f}s" for name, seconds in self.seconds.items()
+            ))
+        for label, wall, serial in self.overlaps:
+            print(f"{label}: {wall:.2f}s on the critical path, {serial:.2f}s back to back "
+                  f"({max(serial - wall, 0.0):.2f}s saved)")
+        self.upload(status)
+
+    def upload(self, status):
+        if self.finished or not self.step or self.store is None:
+            return
+        self.finished = True
+        local = f"metrics-{self.step}.json"
+        with open(local, "w") as f:
+            json.dump(self.record(status), f, indent=2)
+        try:
+            self.store.put(local, metrics_folder(self.store.invocation_id), f"{self.step}.json")
+        except Exception as e:
+            print(f"Could not upload step metrics ({e})")
+
+    def _at_exit(self):
+        self.upload("incomplete")
+
+
+def install_and_import(phases, install, modules=HEAVY_IMPORTS):
+    """Run ``install``, then import ``modules`` (skipping any that are absent), as two phases"""
+    with phases.phase("install"):
+        install()
+    with phases.phase("import"):
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                print(f"Could not preload {name} ({e})")
+
+
+def prefetch(layout, shards, arrays=(), snapshots=False):
+    """
+    Download ``shards``, the ``arrays`` sidecars and, with ``snapshots``,
+    the component snapshot of ``layout`` without decoding them. Best
+    effort: a failed download is retried, and reported, by the step's
+    ``read``. Returns whether the snapshot was downloaded.
+    """
+    from . import snapshot
+
+    try:
+        layout.fetch(shards, arrays)
+    except Exception as e:
+        print(f"State prefetch failed ({e})")
+    if not snapshots:
+        return False
+    try:
+        return snapshot.fetch(layout.store, layout.folder)
+    except Exception as e:
+        print(f"Snapshot prefetch failed ({e})")
+        return False
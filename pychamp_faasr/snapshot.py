@@ -0,0 +1,145 @@
+"""
+Snapshots of initialized PyCHAMP components
+
+Rebuilding the Mesa model and the ``Aquifer``, ``Well``, ``Field`` and
+``Finance`` objects from the settings at every step re-runs their
+constructors (for ``Field``, including the truncated-normal parameter
+setup). ``init`` instead pickles the freshly built objects once
+(``stages.build_components``) and uploads them next to the state shards;
+the steps unpickle them and re-apply the values the state carries.
+
+A snapshot starts with a stamp: the snapshot schema, the PyCHAMP commit and
+Python version that built it, and a hash of the settings. Loading compares
+it with the running environment and the state's settings before unpickling
+the objects; on any mismatch (or a missing or unreadable snapshot)
+``restore`` rebuilds the components and uploads a fresh snapshot.
+
+Snapshots are only read from the workflow's own data store: unpickling runs
+code, so never point a step at a snapshot from an untrusted source.
+"""
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import pickle
+import sys
+
+SNAPSHOT_SCHEMA = 1
+SNAPSHOT_FILE = "components.snapshot"
+
+
+def pychamp_commit():
+    """
+    The PyCHAMP commit in use: from the baked image's environment, the
+    wheelhouse manifest, or pip's record of the git install; else the
+    package version
+    """
+    from . import deps
+
+    if os.environ.get("PYCHAMP_COMMIT"):
+        return os.environ["PYCHAMP_COMMIT"]
+    manifest = os.path.join(deps.WHEELHOUSE_DIR, deps.WHEELHOUSE_MANIFEST)
+    if os.path.exists(manifest):
+        with open(manifest, "r") as f:
+            commit = json.load(f).get("pychamp_commit")
+        if commit:
+            return commit
+
+    from importlib import metadata
+
+    for name in ("py_champ", "py-champ", "pychamp"):
+        try:
+            distribution = metadata.distribution(name)
+        except metadata.PackageNotFoundError:
+            continue
+        direct_url = json.loads(distribution.read_text("direct_url.json") or "{}")
+        return direct_url.get("vcs_info", {}).get("commit_id") or distribution.version
+    return "unknown"
+
+
+def settings_hash(settings):
+    from . import codec
+
+    encoded = json.dumps(settings, sort_keys=True, default=codec.to_builtin).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def stamp(settings):
+    return {
+        "schema": SNAPSHOT_SCHEMA,
+        "pychamp_commit": pychamp_commit(),
+        "python": f"{sys.version_info.major}.{sys.version_info.minor}",
+        "settings_hash": settings_hash(settings),
+    }
+
+
+def dump(objects, path, settings):
+    """Pickle ``objects`` to ``path`` behind the stamp of ``settings``; return bytes written"""
+    with open(path, "wb") as f:
+        pickle.dump(stamp(settings), f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(objects, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return os.path.getsize(path)
+
+
+def load(path, settings):
+    """
+    Objects pickled at ``path`` if its stamp matches ``settings`` and this
+    environment; else None, printing why
+    """
+    expected = stamp(settings)
+    with open(path, "rb") as f:
+        found = pickle.load(f)
+        stale = [k for k in expected if found.get(k) != expected[k]]
+        if stale:
+            print(f"Component snapshot is stale ({', '.join(stale)} changed)")
+            return None
+        return pickle.load(f)
+
+
+def _objects(sim):
+    return {"model": sim.model, "aquifer": sim.aquifer, "well": sim.well,
+            "field": sim.field, "finance": sim.finance}
+
+
+def save(store, folder, settings):
+    """Build the components for ``settings``, pickle and upload them; return the objects"""
+    from . import stages
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        objects = _objects(stages.build_components(settings))
+    size = dump(objects, SNAPSHOT_FILE, settings)
+    store.put(SNAPSHOT_FILE, folder, SNAPSHOT_FILE)
+    print(f"Component snapshot uploaded ({size} bytes)")
+    return objects
+
+
+def fetch(store, folder):
+    """Download the snapshot under ``folder`` to SNAPSHOT_FILE; return whether there is one"""
+    if not store.exists(folder, SNAPSHOT_FILE):
+        return False
+    store.get(folder, SNAPSHOT_FILE, SNAPSHOT_FILE)
+    return True
+
+
+def restore(store, folder, settings, fetched=None):
+    """
+    The snapshot objects (a dict of ``model``, ``aquifer``, ``well``,
+    ``field``, ``finance``) for ``settings``, rebuilt and re-uploaded if the
+    snapshot is missing, stale or unreadable. ``fetched`` is the result of
+    an earlier ``fetch``; by default the snapshot is downloaded here.
+    """
+    if fetched is None:
+        fetched = fetch(store, folder)
+    if fetched:
+        try:
+            objects = load(SNAPSHOT_FILE, settings)
+        except Exception as e:
+            print(f"Could not read component snapshot ({e})")
+            objects = None
+        if objects is not None:
+            print("Restored components from snapshot")
+            return objects
+    print("Rebuilding component snapshot")
+    return save(store, folder, settings)
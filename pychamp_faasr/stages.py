@@ -0,0 +1,967 @@
+"""
+PyCHAMP simulation stages shared by the step actions and the fused runner
+
+Each stage works on live Mesa/PyCHAMP objects and updates the state dict in
+place. Components are struct-of-arrays tables (``pychamp_faasr.tables``);
+the object stages drive the agent in row 0. The per-action steps first rebuild those objects from the state they
+downloaded (``restore_*``); the fused pipeline (``pipeline_faasr.py``) builds
+them once in ``init_components`` and hands the same objects from stage to
+stage. mesa and PyCHAMP are imported inside the functions, since this module
+is imported before dependencies are installed.
+"""
+
+import contextlib
+import copy
+import io
+
+from . import tables
+
+CROP_OPTIONS = ["corn", "soy", "wheat"]
+AREA_SPLIT = 4
+
+AQUIFER_ID = "aq1"
+WELL_ID = "w1"
+FINANCE_ID = "fin1"
+FIELD_ID = "f1"
+
+# Every Field is built with these (see new_field)
+TRUNCATED_NORMAL_PARS = {
+    "corn": [0.5, 0.1, 0, 1],
+    "soy": [0.5, 0.1, 0, 1],
+    "wheat": [0.5, 0.1, 0, 1]
+}
+
+DEFAULT_SETTINGS = {
+    "aquifer": {
+        "aq_a": 0.1,
+        "aq_b": 10.0,
+        "area": 100.0,
+        "sy": 0.2,
+        "init": {"st": 30.0, "dwl": 0.0}
+    },
+    "well": {
+        "r": 0.2032,
+        "k": 15.0,
+        "sy": 0.2,
+        "rho": 1000.0,
+        "g": 9.81,
+        "eff_pump": 0.75,
+        "eff_well": 0.85,
+        "aquifer_id": "aq1",
+        "pumping_capacity": 100.0,
+        "init": {
+            "st": 30.0,
+            "l_wt": 5.0,
+            "pumping_days": 90
+        }
+    },
+    "finance": {
+        "energy_price": 0.12,
+        "crop_price": {
+            "corn": 5.0,
+            "soy": 10.0,
+            "wheat": 3.0
+        },
+        "crop_cost": {
+            "corn": 400.0,
+            "soy": 300.0,
+            "wheat": 250.0
+        },
+        "irr_tech_operational_cost": {
+            "gravity": 50.0,
+            "sprinkler": 100.0,
+            "drip": 150.0
+        },
+        "irr_tech_change_cost": {
+            "gravity": 1000.0,
+            "sprinkler": 2000.0,
+            "drip": 3000.0
+        },
+        "crop_change_cost": 200.0,
+        "init": {"savings": 10000.0}
+    },
+    "field": {
+        "field_area": 100.0,
+        "water_yield_curves": {
+            "corn": [10.0, 600.0, 0.5, 1.0, 0.3, 0.2],
+            "soy": [4.0, 400.0, 0.6, 1.2, 0.25, 0.15],
+            "wheat": [5.0, 350.0, 0.55, 1.1, 0.28, 0.18]
+        },
+        "tech_pumping_rate_coefs": {
+            "gravity": [1.0, 0.5, 10.0],
+            "sprinkler": [0.85, 0.6, 15.0],
+            "drip": [0.70, 0.7, 20.0]
+        },
+        "prec_aw_id": "aq1",
+        "init": {
+            "crop": "corn",
+            "tech": "sprinkler",
+            "field_type": "irrigated"
+        }
+    }
+}
+
+# Simplified stage inputs; in a full model these come from decision making
+WITHDRAWAL = 5.0  # m-ha
+INFLOW = 2.0      # m-ha
+IRR_DEPTH = 10.0  # cm
+TECH = "sprinkler"
+PREC_AW = {"corn": 20.0, "soy": 18.0, "wheat": 15.0}  # cm
+
+
+class Simulation:
+    """The live model and components one process is working on"""
+
+    def __init__(self, model, state, aquifer=None, well=None, field=None, finance=None):
+        self.model = model
+        self.state = state
+        self.aquifer = aquifer
+        self.well = well
+        self.field = field
+        self.finance = finance
+
+
+def new_model(model_step=0):
+    from mesa import Model
+    from mesa.time import RandomActivation
+
+    model = Model()
+    model.schedule = RandomActivation(model)
+    model.current_step = model_step
+    model.crop_options = list(CROP_OPTIONS)
+    model.area_split = AREA_SPLIT
+    return model
+
+
+def new_field(model, settings, unique_id=FIELD_ID):
+    """A Field built the same way by init, snapshots and restore_field"""
+    from py_champ.components.field import Field
+
+    return Field(unique_id, model, settings, truncated_normal_pars=TRUNCATED_NORMAL_PARS)
+
+
+def _advance(sim, workflow_step):
+    sim.model.current_step += 1
+    sim.state["workflow_step"] = workflow_step
+    sim.state["model_step"] = sim.model.current_step
+
+
+# init
+
+
+def init_components(settings=None):
+    """
+    Create the model and all components; return a Simulation. Array-valued
+    aquifer or field settings (see ``is_array_valued``) start as one table
+    row built from their first agent; the batch stages grow the tables to
+    one row per agent.
+    """
+    from py_champ.components.aquifer import Aquifer
+    from py_champ.components.finance import Finance
+    from py_champ.components.well import Well
+
+    settings = copy.deepcopy(settings or DEFAULT_SETTINGS)
+    agent = {name: first_agent(value) for name, value in settings.items()}
+
+    # 1. Create Mesa model
+    print("\n1. Creating model...")
+    model = new_model()
+    print(f"Model created")
+
+    # 2. Initialize Aquifer
+    print("\n2. Initializing Aquifer...")
+    aquifer = Aquifer(AQUIFER_ID, model, agent["aquifer"])
+    model.schedule.add(aquifer)
+    print(f"Aquifer initialized: st={aquifer.st}m")
+
+    # 3. Initialize Well
+    print("\n3. Initializing Well...")
+    well = Well(WELL_ID, model, agent["well"])
+    model.schedule.add(well)
+    print(f"Well initialized: connected to {well.aquifer_id}")
+
+    # 4. Initialize Finance
+    print("\n4. Initializing Finance...")
+    finance = Finance(FINANCE_ID, model, agent["finance"])
+    model.schedule.add(finance)
+    print(f"Finance initialized: energy_price=${finance.energy_price}/kWh")
+
+    # 5. Initialize Field
+    print("\n5. Initializing Field...")
+    field = new_field(model, agent["field"])
+    model.schedule.add(field)
+    print(f"Field initialized: area={field.field_area}ha, crop={field.crops[0]}")
+
+    # 6. Create state for next workflow step
+    print("\n6. Creating state...")
+    components = {
+        "aquifer": tables.from_records("aquifer", [{
+            "id": aquifer.unique_id,
+            "st": aquifer.st,
+            "dwl": aquifer.dwl,
+            "area": aquifer.area
+        }]),
+        "well": tables.from_records("well", [{
+            "id": well.unique_id,
+            "aquifer_id": well.aquifer_id,
+            "pumping_capacity": well.pumping_capacity,
+            "eff_pump": well.eff_pump,
+            "st": well.st,
+            "pumping_days": well.pumping_days
+        }]),
+        "finance": tables.from_records("finance", [{
+            "id": finance.unique_id,
+            "energy_price": finance.energy_price,
+            "crop_price": finance.crop_price,
+            "crop_cost": finance.crop_cost
+        }]),
+        "field": tables.from_records("field", [{
+            "id": field.unique_id,
+            "well_id": well.unique_id,
+            "field_area": field.field_area,
+            "crops": field.crops,
+            "tech": field.te
+        }])
+    }
+    state = {
+        "workflow_step": "init_components",
+        "status": "completed",
+        "model_step": model.current_step,
+        "components": tables.link(components),
+        "settings": settings
+    }
+
+    print("ALL COMPONENTS INITIALIZED SUCCESSFULLY")
+    print(f"Components: {list(state['components'].keys())}")
+    return Simulation(model, state, aquifer, well, field, finance)
+
+
+def build_components(settings):
+    """
+    The model and all components built from ``settings`` as the
+    ``restore_*`` functions build them; what a component snapshot holds
+    (see ``pychamp_faasr.snapshot``)
+    """
+    from py_champ.components.aquifer import Aquifer
+    from py_champ.components.finance import Finance
+    from py_champ.components.well import Well
+
+    settings = copy.deepcopy(settings)
+    model = new_model()
+    aquifer = Aquifer(AQUIFER_ID, model, settings["aquifer"])
+    well = Well(WELL_ID, model, settings["well"])
+    field = new_field(model, settings["field"])
+    finance = Finance(FINANCE_ID, model, settings["finance"])
+    for agent in (aquifer, well, field, finance):
+        model.schedule.add(agent)
+    return Simulation(model, None, aquifer, well, field, finance)
+
+
+def _snapshot_model(objects, state):
+    model = objects["model"]
+    model.current_step = state.get("model_step", 0)
+    return model
+
+
+# aquifer
+
+
+def restore_aquifer(state, objects=None):
+    """
+    Rebuild the model and aquifer from a state holding aquifer + settings,
+    or take them from snapshot ``objects`` and set the state's values
+    """
+    from py_champ.components.aquifer import Aquifer
+
+    aquifer_state = tables.row(state["components"]["aquifer"])
+    if objects:
+        model = _snapshot_model(objects, state)
+        aquifer = objects["aquifer"]
+        aquifer.st = aquifer_state["st"]
+        aquifer.dwl = aquifer_state["dwl"]
+        return Simulation(model, state, aquifer=aquifer)
+
+    model = new_model(state.get("model_step", 0))
+    aquifer_settings = state["settings"]["aquifer"]
+    aquifer_settings["init"]["st"] = aquifer_state["st"]
+    aquifer_settings["init"]["dwl"] = aquifer_state["dwl"]
+    aquifer = Aquifer(AQUIFER_ID, model, aquifer_settings)
+    model.schedule.add(aquifer)
+    return Simulation(model, state, aquifer=aquifer)
+
+
+def aquifer_stage(sim, withdrawal=WITHDRAWAL, inflow=INFLOW):
+    """Advance the aquifer one season; return the water level change"""
+    aquifer = sim.aquifer
+
+    print(f"\nAquifer state before step:")
+    print(f"  Saturated thickness: {aquifer.st} m")
+    print(f"  Depth to water: {aquifer.dwl} m")
+
+    print(f"\nSimulation inputs:")
+    print(f"  Withdrawal: {withdrawal} m-ha")
+    print(f"  Inflow: {inflow} m-ha")
+
+    # Run aquifer step
+    dwl_change = aquifer.step(withdrawal=withdrawal, inflow=inflow)
+
+    print(f"\nAquifer state after step:")
+    print(f"  Saturated thickness: {aquifer.st} m")
+    print(f"  Change in water level: {dwl_change} m")
+
+    # Update state
+    _advance(sim, "aquifer_simulation")
+    tables.update("aquifer", sim.state["components"]["aquifer"], {
+        "st": aquifer.st,
+        "dwl": aquifer.dwl,
+        "withdrawal": withdrawal,
+        "inflow": inflow,
+        "dwl_change": dwl_change
+    })
+    print("AQUIFER STEP COMPLETED")
+    return dwl_change
+
+
+def is_array_valued(settings):
+    """Whether any of the top-level settings or ``init`` values is a per-agent array"""
+    values = list(settings.values()) + list(settings.get("init", {}).values())
+    return any(isinstance(v, (list, tuple)) or hasattr(v, "shape") for v in values)
+
+
+def first_agent(settings):
+    """The settings of the first agent of array-valued ``settings``; others unchanged"""
+    if not is_array_valued(settings):
+        return settings
+
+    def first(value):
+        return value[0] if isinstance(value, (list, tuple)) or hasattr(value, "shape") else value
+
+    agent = {k: first(v) for k, v in settings.items() if k != "init"}
+    if "init" in settings:
+        agent["init"] = {k: first(v) for k, v in settings["init"].items()}
+    return agent
+
+
+def aquifer_batch_stage(state, withdrawal=WITHDRAWAL, inflow=INFLOW):
+    """
+    Advance every aquifer of array-valued aquifer settings one season with
+    the vectorized kernel, without building Aquifer objects. withdrawal and
+    inflow may be scalars or per-aquifer arrays. Returns the water level
+    changes.
+    """
+    import numpy as np
+
+    from . import kernels
+
+    settings = state["settings"]["aquifer"]
+    aquifer = state["components"]["aquifer"]
+    n = max(np.size(settings[k]) for k in ("aq_a", "aq_b", "area", "sy") if k in settings)
+    n = max(n, np.size(settings["init"]["st"]), tables.n_rows(aquifer))
+    if tables.n_rows(aquifer) == n:
+        st0 = aquifer["st"]
+    else:
+        # First batched step after a single-aquifer init: one row per aquifer
+        st0 = settings["init"]["st"]
+        aquifer = state["components"]["aquifer"] = tables.resize(aquifer, n)
+    st, dwl = kernels.aquifer_kernel(
+        np.broadcast_to(np.asarray(st0, dtype=float), (n,)),
+        np.asarray(withdrawal, dtype=float).reshape(-1, 1),
+        None if inflow is None else np.asarray(inflow, dtype=float).reshape(-1, 1),
+        aq_a=settings["aq_a"], aq_b=settings["aq_b"],
+        area=settings.get("area"), sy=settings.get("sy"),
+    )
+    st, dwl = st[:, -1], dwl[:, -1]
+
+    print(f"\nStepped {st.size} aquifers with the vectorized kernel")
+    print(f"  Saturated thickness: min {st.min():.3f}, mean {st.mean():.3f}, max {st.max():.3f} m")
+    print(f"  Change in water level: min {dwl.min():.3f}, mean {dwl.mean():.3f}, max {dwl.max():.3f} m")
+
+    state["workflow_step"] = "aquifer_simulation"
+    state["model_step"] = state.get("model_step", 0) + 1
+    tables.update("aquifer", aquifer, {
+        "st": st,
+        "dwl": dwl,
+        "withdrawal": withdrawal,
+        "inflow": inflow,
+        "dwl_change": dwl
+    })
+    print("AQUIFER STEP COMPLETED")
+    return dwl
+
+
+def aquifer_projection_stage(state, horizon, withdrawal=WITHDRAWAL, inflow=INFLOW, schedules=None):
+    """
+    Project every aquifer ``horizon`` seasons ahead from its current
+    saturated thickness, without stepping the state. ``schedules`` is a list
+    of withdrawal schedules (m-ha): one value per schedule (held constant)
+    or at least ``horizon`` values; by default the single constant
+    ``withdrawal``. Returns the (n_aquifers, n_schedules, horizon) float32
+    trajectory and records a summary in ``state["aquifer_projection"]``.
+    """
+    import numpy as np
+
+    from . import kernels
+
+    settings = state["settings"]["aquifer"]
+    schedules = np.atleast_2d(np.asarray(withdrawal if schedules is None else schedules, dtype=float))
+    if schedules.shape[1] == 1:
+        schedules = np.repeat(schedules, horizon, axis=1)
+    if schedules.shape[1] < horizon:
+        raise ValueError(f"Withdrawal schedules cover {schedules.shape[1]} seasons, "
+                         f"horizon is {horizon}")
+    trajectory = kernels.aquifer_projection(
+        state["components"]["aquifer"]["st"], schedules[:, :horizon],
+        None if inflow is None else np.broadcast_to(
+            np.asarray(inflow, dtype=float), (horizon,)),
+        aq_a=settings["aq_a"], aq_b=settings["aq_b"],
+        area=settings.get("area"), sy=settings.get("sy"), dtype=np.float32,
+    )
+
+    final = trajectory[:, :, -1]
+    depleted = (trajectory <= 0).any(axis=2)
+    print(f"\nProjected {trajectory.shape[0]} aquifers x {trajectory.shape[1]} withdrawal "
+          f"schedules over {horizon} seasons")
+    print(f"  Final saturated thickness: min {final.min():.3f}, mean {final.mean():.3f}, "
+          f"max {final.max():.3f} m")
+    print(f"  Depleted within horizon: {int(depleted.sum())}/{depleted.size}")
+    state["aquifer_projection"] = {
+        "horizon": horizon,
+        "schedules": trajectory.shape[1],
+        "final_st_mean": float(final.mean()),
+        "depleted": int(depleted.sum()),
+    }
+    return trajectory
+
+
+# field
+
+# Per-section/per-crop field arrays kept as state sidecars, shape
+# (n_fields, area_split, n_crops, 1)
+FIELD_ARRAYS = ("y", "i_crop", "pre_i_crop")
+
+
+def field_arrays(field):
+    """The FIELD_ARRAYS sidecars of a stepped Field, with a leading field axis"""
+    import numpy as np
+
+    return {f"field.{k}": np.asarray(getattr(field, k), dtype=float)[None] for k in FIELD_ARRAYS}
+
+
+def restore_field(state, objects=None):
+    """
+    Rebuild the model and field from a state holding field + settings, or
+    take them from snapshot ``objects``; either way, set the crops and
+    technologies the state carries
+    """
+    if objects:
+        model, field = _snapshot_model(objects, state), objects["field"]
+    else:
+        model = new_model(state.get("model_step", 0))
+        field = new_field(model, state["settings"]["field"])
+        model.schedule.add(field)
+
+    field_state = tables.row(state["components"]["field"])
+    field.crops = list(field_state["crops"])
+    field.te = field_state["tech"]
+    if field_state.get("pre_tech"):
+        field.pre_te = field_state["pre_tech"]
+    return Simulation(model, state, field=field)
+
+
+def field_stage(sim, irr_depth=IRR_DEPTH, tech=TECH, prec_aw=PREC_AW):
+    """Grow one season on every section as corn; return (y, avg_y_y, irr_vol)"""
+    import numpy as np
+
+    field = sim.field
+
+    print(f"\nField state before step:")
+    print(f"  Area: {field.field_area} ha")
+    print(f"  Current crops: {field.crops}")
+    print(f"  Current tech: {field.te}")
+
+    n_s = sim.model.area_split
+    n_c = len(sim.model.crop_options)
+
+    # Irrigation depth for all sections/crops
+    irr_depth = np.ones((n_s, n_c, 1)) * irr_depth  # cm
+
+    # Crop indicators: all growing corn (first crop)
+    i_crop = np.zeros((n_s, n_c, 1))
+    i_crop[:, 0, 0] = 1
+
+    print(f"\nSimulation inputs:")
+    print(f"  Irrigation depth: {irr_depth[0,0,0]} cm")
+    print(f"  Technology: {tech}")
+    print(f"  Precipitation: {prec_aw}")
+
+    # Run field step
+    y, avg_y_y, irr_vol = field.step(irr_depth, i_crop, tech, prec_aw)
+
+    print(f"\nField state after step:")
+    print(f"  Total yield: {np.sum(y):.2f} (1e4 bu)")
+    print(f"  Avg yield rate: {avg_y_y:.4f}")
+    print(f"  Irrigation volume: {irr_vol:.2f} m-ha")
+    print(f"  Pumping rate: {field.pumping_rate:.2f} m-ha/day")
+
+    # Update state
+    _advance(sim, "field_simulation")
+    tables.update("field", sim.state["components"]["field"], {
+        "crops": field.crops,
+        "tech": field.te,
+        "pre_tech": field.pre_te,
+        "yield": float(np.sum(y)),
+        "avg_yield_rate": float(avg_y_y),
+        "irrigation_volume": float(irr_vol),
+        "pumping_rate": float(field.pumping_rate)
+    })
+
+    print("FIELD STEP COMPLETED")
+    return y, avg_y_y, irr_vol
+
+
+def field_batch_stage(state, irr_depth=IRR_DEPTH, prec_aw=PREC_AW, pre_i_crop=None):
+    """
+    Grow one season on every field of array-valued field settings (one
+    ``field_area`` or ``init.tech`` per field) with the vectorized kernel,
+    all sections as corn, each field keeping its tech. Returns the kernel's
+    result arrays, plus the FIELD_ARRAYS sidecars under "arrays";
+    ``pre_i_crop`` is last season's ``field.i_crop`` sidecar, if any.
+    """
+    import numpy as np
+
+    from . import kernels
+
+    settings = state["settings"]["field"]
+    field = state["components"]["field"]
+    n = max(np.size(settings["field_area"]), np.size(settings["init"]["tech"]),
+            tables.n_rows(field))
+    if tables.n_rows(field) != n:
+        # First batched step after a single-field init: one row per field
+        field = state["components"]["field"] = tables.resize(field, n)
+        tables.update("field", field, {"tech": settings["init"]["tech"]})
+    techs = field["tech"]
+    n_s, n_c = AREA_SPLIT, len(CROP_OPTIONS)
+
+    curves, tech_coefs, tech_options = kernels.field_tables(settings, CROP_OPTIONS)
+    i_crop = np.zeros((n, n_s, n_c))
+    i_crop[:, :, 0] = 1
+    result = kernels.field_kernel(
+        np.full((n, n_s, n_c), irr_depth, dtype=float), i_crop,
+        np.array([tech_options.index(t) for t in techs]),
+        [prec_aw[c] for c in CROP_OPTIONS], curves, tech_coefs, settings["field_area"],
+    )
+    y = result["y"].sum(axis=(1, 2))
+    i_crop = i_crop[..., None]
+    if pre_i_crop is None or np.shape(pre_i_crop) != i_crop.shape:
+        pre_i_crop = i_crop
+    result["arrays"] = {
+        "field.y": result["y"][..., None],
+        "field.i_crop": i_crop,
+        "field.pre_i_crop": np.asarray(pre_i_crop, dtype=float),
+    }
+
+    print(f"\nGrew {n} fields with the vectorized kernel")
+    print(f"  Total yield: {y.sum():.2f} (1e4 bu), mean {y.mean():.4f} per field")
+    print(f"  Irrigation volume: {result['irr_vol'].sum():.2f} m-ha")
+    print(f"  Pumping rate: mean {result['pumping_rate'].mean():.2f} m-ha/day")
+
+    state["workflow_step"] = "field_simulation"
+    state["model_step"] = state.get("model_step", 0) + 1
+    tables.update("field", field, {
+        "crops": np.full((n, n_s), CROP_OPTIONS[0]),
+        "field_area": settings["field_area"],
+        "yield": y,
+        "avg_yield_rate": result["avg_y_y"],
+        "irrigation_volume": result["irr_vol"],
+        "pumping_rate": result["pumping_rate"]
+    })
+    print("FIELD STEP COMPLETED")
+    return result
+
+
+# finance
+
+
+class FieldView:
+    """
+    The field attributes Finance.step reads, without building a Field (and
+    sampling its truncated-normal parameters) in the finance step
+    """
+
+    def __init__(self, field_state, y, i_crop, pre_i_crop):
+        self.unique_id = field_state.get("id", FIELD_ID)
+        self.field_area = field_state.get("field_area")
+        self.crops = field_state.get("crops", ["corn"])
+        self.te = field_state.get("tech", "sprinkler")
+        self.pre_te = field_state.get("pre_tech", self.te)
+        self.pumping_rate = field_state.get("pumping_rate", 0)
+        self.irr_vol_per_field = field_state.get("irrigation_volume", 0)
+        self.y = y
+        self.i_crop = i_crop
+        self.pre_i_crop = pre_i_crop
+
+
+def restore_finance(state, arrays=None, objects=None):
+    """
+    Rebuild the model, well and finance from a state holding field, well,
+    finance + settings (or take them from snapshot ``objects``), with a
+    FieldView of the field. ``arrays`` are the field step's sidecars (see
+    ``field_arrays``); without them (runs from before sidecars) the yield
+    array is approximated from the total yield and every section is taken
+    as corn. A field table of several rows is settled by
+    ``finance_batch_stage`` instead.
+    """
+    import numpy as np
+    from py_champ.components.finance import Finance
+    from py_champ.components.well import Well
+
+    n_fields = tables.n_rows(state["components"]["field"])
+    if n_fields != 1:
+        raise ValueError(f"restore_finance settles one field, the field table has {n_fields} "
+                         "rows; use finance_batch_stage")
+
+    if objects:
+        model = _snapshot_model(objects, state)
+    else:
+        model = new_model(state.get("model_step", 0))
+
+    # Field
+    field_state = tables.row(state["components"]["field"])
+    if arrays:
+        y, i_crop, pre_i_crop = (arrays[f"field.{k}"][0] for k in FIELD_ARRAYS)
+    else:
+        n_s = model.area_split
+        n_c = len(model.crop_options)
+        y = np.ones((n_s, n_c, 1)) * field_state.get("yield", 0) / n_s
+        i_crop = np.zeros((n_s, n_c, 1))
+        i_crop[:, 0, 0] = 1  # corn
+        pre_i_crop = i_crop.copy()
+    field = FieldView(field_state, y, i_crop, pre_i_crop)
+
+    # Well and finance
+    well_st = tables.row(state["components"]["well"])["st"]
+    if objects:
+        well, finance = objects["well"], objects["finance"]
+        well.st = well_st
+    else:
+        well_settings = state["settings"]["well"]
+        well_settings["init"]["st"] = well_st
+        well = Well(WELL_ID, model, well_settings)
+        finance = Finance(FINANCE_ID, model, state["settings"]["finance"])
+
+    return Simulation(model, state, well=well, field=field, finance=finance)
+
+
+def finance_stage(sim):
+    """Settle one season's revenue and costs; return the profit"""
+    field, well, finance = sim.field, sim.well, sim.finance
+
+    # Simulate well energy consumption (simplified)
+    well.e = field.pumping_rate * 0.001  # Convert to PJ (simplified)
+
+    print(f"\nFinance inputs:")
+    print(f"  Field yield: {tables.row(sim.state['components']['field']).get('yield', 0):.2f} (1e4 bu)")
+    print(f"  Irrigation volume: {field.irr_vol_per_field:.2f} m-ha")
+    print(f"  Well energy: {well.e:.4f} PJ")
+
+    # Run finance step
+    profit = finance.step(fields={FIELD_ID: field}, wells={WELL_ID: well})
+
+    print(f"\nFinance results:")
+    print(f"  Revenue: ${finance.rev:.2f} (1e4$)")
+    print(f"  Energy cost: ${finance.cost_e:.2f} (1e4$)")
+    print(f"  Tech cost: ${finance.cost_tech:.2f} (1e4$)")
+    print(f"  Profit: ${profit:.2f} (1e4$)")
+
+    # Update state
+    _advance(sim, "finance_calculation")
+    tables.update("finance", sim.state["components"]["finance"], {
+        "profit": float(profit),
+        "revenue": float(finance.rev),
+        "energy_cost": float(finance.cost_e),
+        "tech_cost": float(finance.cost_tech)
+    })
+
+    print(" FINANCE STEP COMPLETED")
+    return profit
+
+
+def finance_batch_stage(state, arrays=None):
+    """
+    Settle every field of a multi-row field table with the vectorized
+    kernel, without building Well or Finance objects: one finance row per
+    field, at the settings' prices. As in ``finance_stage``, a field's well
+    energy is its pumping rate times 0.001 PJ. Its tech cost is the
+    operational cost of its tech, plus the change cost of that tech if it
+    switched and ``crop_change_cost`` if any section switched crop.
+    ``arrays`` are the field step's sidecars; without them every section is
+    taken as corn with the field's total yield. Returns the kernel inputs
+    (``y`` (F, C), ``energy`` (F,), ``tech_cost`` (F,)) for
+    ``price_risk_stage``.
+    """
+    import numpy as np
+
+    from . import kernels
+
+    settings = state["settings"]["finance"]
+    field = state["components"]["field"]
+    n = tables.n_rows(field)
+    if arrays:
+        y = np.asarray(arrays["field.y"], dtype=float).sum(axis=(1, 3))
+        i_crop, pre_i_crop = arrays["field.i_crop"], arrays["field.pre_i_crop"]
+        crop_changed = (np.asarray(i_crop) != np.asarray(pre_i_crop)).reshape(n, -1).any(axis=1)
+    else:
+        y = np.zeros((n, len(CROP_OPTIONS)))
+        y[:, 0] = field["yield"] if "yield" in field else 0.0
+        crop_changed = np.zeros(n, dtype=bool)
+
+    tech = field["tech"]
+    pre_tech = field["pre_tech"] if "pre_tech" in field else tech
+    operational, change = settings["irr_tech_operational_cost"], settings["irr_tech_change_cost"]
+    tech_cost = (np.array([operational[t] for t in tech.tolist()], dtype=float)
+                 + np.where(tech != pre_tech, [change[t] for t in tech.tolist()], 0.0)
+                 + crop_changed * float(settings["crop_change_cost"]))
+    energy = np.asarray(field["pumping_rate"] if "pumping_rate" in field else np.zeros(n),
+                        dtype=float) * 0.001
+    result = kernels.finance_kernel(
+        y, energy, [settings["crop_price"][c] for c in CROP_OPTIONS], settings["energy_price"],
+        tech_cost,
+    )
+    result = {k: v[0] for k, v in result.items()}
+
+    print(f"\nSettled {n} fields with the vectorized kernel")
+    print(f"  Field yield: {y.sum():.2f} (1e4 bu)")
+    print(f"  Irrigation volume: {float(np.sum(field.get('irrigation_volume', 0.0))):.2f} m-ha")
+    print(f"  Revenue: ${result['revenue'].sum():.2f}, energy cost: ${result['energy_cost'].sum():.2f}, "
+          f"tech cost: ${result['tech_cost'].sum():.2f} (1e4$)")
+    print(f"  Profit: ${result['profit'].sum():.2f} (1e4$), mean {result['profit'].mean():.2f} per field")
+
+    state["workflow_step"] = "finance_calculation"
+    state["model_step"] = state.get("model_step", 0) + 1
+    finance = state["components"]["finance"]
+    if tables.n_rows(finance) != n:
+        finance = state["components"]["finance"] = tables.resize(finance, n)
+    tables.update("finance", finance, {
+        "profit": result["profit"],
+        "revenue": result["revenue"],
+        "energy_cost": result["energy_cost"],
+        "tech_cost": result["tech_cost"],
+    })
+    print(" FINANCE STEP COMPLETED")
+    return {"y": y, "energy": energy, "tech_cost": tech_cost}
+
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def price_scenarios(finance_settings, spec):
+    """
+    (crop_price (S, C), energy_price (S,)) arrays from an ensemble-style
+    spec over ``crop_price.<crop>`` and ``energy_price`` (see
+    ``pychamp_faasr.ensemble``); unvaried prices keep their settings value
+    """
+    import numpy as np
+
+    from . import ensemble
+
+    scenarios = ensemble.expand(spec)
+    n = len(scenarios)
+    crop_price = np.tile([finance_settings["crop_price"][c] for c in CROP_OPTIONS], (n, 1))
+    crop_price = crop_price.astype(float)
+    energy_price = np.full(n, float(finance_settings["energy_price"]))
+    for path in ensemble.parameter_paths(scenarios):
+        base = energy_price if path == "energy_price" else None
+        if path.startswith("crop_price.") and path.split(".", 1)[1] in CROP_OPTIONS:
+            base = crop_price[:, CROP_OPTIONS.index(path.split(".", 1)[1])]
+        if base is None:
+            raise ValueError(f"Price scenarios can vary energy_price and crop_price.<crop>, not '{path}'")
+        base[:] = [s.get(path, b) for s, b in zip(scenarios, base)]
+    return crop_price, energy_price
+
+
+def quantile_summary(values, quantiles=QUANTILES):
+    """{"mean": ..., "p5": ..., ...} of a 1-D array"""
+    import numpy as np
+
+    summary = {"mean": float(np.mean(values))}
+    for q, v in zip(quantiles, np.quantile(values, quantiles)):
+        summary[f"p{q * 100:g}"] = float(v)
+    return summary
+
+
+def finance_scenarios_stage(sim, spec):
+    """
+    Re-settle the season just settled by finance_stage under every price
+    scenario of ``spec`` with the vectorized kernel. Yields, well energy and
+    the (price-independent) tech cost are this season's. Returns the
+    per-scenario table; quantiles go to state["price_risk"].
+    """
+    import numpy as np
+
+    from . import kernels
+
+    field, well, finance = sim.field, sim.well, sim.finance
+    y = np.asarray(field.y, dtype=float).sum(axis=(0, 2))[None, :]  # (1 field, crops)
+
+    # The kernel at the base prices must reproduce Finance.step
+    base = kernels.finance_kernel(
+        y, [well.e], [finance.crop_price[c] for c in CROP_OPTIONS], finance.energy_price,
+        finance.cost_tech,
+    )
+    if not np.isclose(base["profit"][0, 0], tables.row(sim.state["components"]["finance"])["profit"]):
+        print("  Warning: kernel profit at base prices differs from Finance.step")
+
+    return price_risk_stage(sim.state, {"y": y, "energy": [well.e], "tech_cost": finance.cost_tech},
+                            spec)
+
+
+def price_risk_stage(state, inputs, spec):
+    """
+    Settle the fields of ``inputs`` (``y`` (F, C), ``energy`` (F,),
+    ``tech_cost``) under every price scenario of ``spec``; return the
+    per-scenario table of totals over fields, with their quantiles in
+    state["price_risk"]
+    """
+    import numpy as np
+
+    from . import kernels
+
+    crop_price, energy_price = price_scenarios(state["settings"]["finance"], spec)
+    result = kernels.finance_kernel(inputs["y"], inputs["energy"], crop_price, energy_price,
+                                    inputs["tech_cost"])
+
+    table = {"scenario": np.arange(len(energy_price))}
+    table.update({f"crop_price.{c}": crop_price[:, i] for i, c in enumerate(CROP_OPTIONS)})
+    table["energy_price"] = energy_price
+    table.update({k: v.sum(axis=1) for k, v in result.items()})
+
+    risk = {k: quantile_summary(table[k]) for k in result}
+    print(f"\nPrice scenarios: {len(energy_price)}")
+    for k, summary in risk.items():
+        print(f"  {k}: " + ", ".join(f"{q}={v:.2f}" for q, v in summary.items()))
+    state["price_risk"] = risk
+    return table
+
+
+# seasons
+
+HISTORY_FIELDS = (
+    "withdrawal", "st", "dwl_change",
+    "yield", "avg_yield_rate", "irrigation_volume", "pumping_rate",
+    "revenue", "energy_cost", "tech_cost", "profit",
+)
+
+
+def run_seasons(sim, n_seasons, withdrawal=WITHDRAWAL, inflow=INFLOW):
+    """
+    Step aquifer, field and finance ``n_seasons`` times on the live objects
+
+    Season t's field irrigation volume is the aquifer withdrawal of season
+    t + 1. Full stage logs are printed for the first season only, then one
+    line per season. Returns the per-season history as float arrays.
+    """
+    import numpy as np
+
+    history = {k: np.zeros(n_seasons) for k in HISTORY_FIELDS}
+    components = sim.state["components"]
+
+    for t in range(n_seasons):
+        logs = contextlib.nullcontext() if t == 0 else contextlib.redirect_stdout(io.StringIO())
+        with logs:
+            aquifer_stage(sim, withdrawal=withdrawal, inflow=inflow)
+            _, _, irr_vol = field_stage(sim)
+            finance_stage(sim)
+
+        history["withdrawal"][t] = withdrawal
+        for key in ("st", "dwl_change"):
+            history[key][t] = components["aquifer"][key][0]
+        for key in ("yield", "avg_yield_rate", "irrigation_volume", "pumping_rate"):
+            history[key][t] = components["field"][key][0]
+        for key in ("revenue", "energy_cost", "tech_cost", "profit"):
+            history[key][t] = components["finance"][key][0]
+        print(f"Season {t + 1}/{n_seasons}: withdrawal={withdrawal:.2f} m-ha, "
+              f"st={history['st'][t]:.2f} m, profit=${history['profit'][t]:.2f} (1e4$)")
+
+        # This season's irrigation is drawn from the aquifer next season
+        withdrawal = float(irr_vol)
+
+    sim.state["n_seasons"] = n_seasons
+    return history
+
+
+# results
+
+# Summed over agents in the summary of a multi-agent table; others are averaged
+SUMMED_COLUMNS = (
+    "withdrawal", "dwl_change", "pumping_capacity", "field_area", "yield",
+    "irrigation_volume", "pumping_rate", "revenue", "energy_cost", "tech_cost", "profit",
+)
+
+
+def _summary(table):
+    """The table's single agent, or one record of totals/means over its agents"""
+    if tables.n_rows(table) > 1:
+        table = {
+            name: (column.sum(axis=0, keepdims=True) if name in SUMMED_COLUMNS
+                   else column.mean(axis=0, keepdims=True)) if column.dtype.kind == "f"
+            else column[:1]
+            for name, column in table.items()
+        }
+    return tables.row(table) if table else {}
+
+
+def results_stage(state):
+    """Print the run summary and store it in state["results_summary"]"""
+    components = state.get("components", {})
+    n_agents = {name: tables.n_rows(table) for name, table in components.items()}
+    if any(n > 1 for n in n_agents.values()):
+        print(f"\n Agents: {n_agents} (totals/means over agents below)")
+
+    # Aquifer results
+    print("\n AQUIFER:")
+    aquifer = _summary(components.get("aquifer", {}))
+    print(f"  Initial saturated thickness: 30.0 m")
+    print(f"  Final saturated thickness: {aquifer.get('st', 0):.2f} m")
+    print(f"  Water level change: {aquifer.get('dwl_change', 0):.2f} m")
+    print(f"  Total withdrawal: {aquifer.get('withdrawal', 0):.2f} m-ha")
+
+    # Well results
+    print("\n WELL:")
+    well = _summary(components.get("well", {}))
+    print(f"  Pumping capacity: {well.get('pumping_capacity', 0):.2f} m³/day")
+    print(f"  Pump efficiency: {well.get('eff_pump', 0)*100:.1f}%")
+    print(f"  Operating days: {well.get('pumping_days', 0)}")
+
+    # Field results
+    print("\n FIELD:")
+    field = _summary(components.get("field", {}))
+    print(f"  Field area: {field.get('field_area', 0):.2f} ha")
+    print(f"  Crops grown: {', '.join(field.get('crops', []))}")
+    print(f"  Irrigation tech: {field.get('tech', 'unknown')}")
+    print(f"  Total yield: {field.get('yield', 0):.2f} (1e4 bu)")
+    print(f"  Irrigation volume: {field.get('irrigation_volume', 0):.2f} m-ha")
+
+    # Finance results
+    print("\n FINANCE:")
+    finance = _summary(components.get("finance", {}))
+    print(f"  Revenue: ${finance.get('revenue', 0):.2f} (1e4$)")
+    print(f"  Energy cost: ${finance.get('energy_cost', 0):.2f} (1e4$)")
+    print(f"  Tech cost: ${finance.get('tech_cost', 0):.2f} (1e4$)")
+    print(f"  PROFIT: ${finance.get('profit', 0):.2f} (1e4$)")
+
+    # Workflow summary
+    print("WORKFLOW SUMMARY:")
+    print(f"  Total steps executed: {state.get('model_step', 0)}")
+    print(f"  Final workflow step: {state.get('workflow_step', 'unknown')}")
+    print(f"  Status: {state.get('status', 'unknown')}")
+
+    print("PYCHAMP WORKFLOW COMPLETED SUCCESSFULLY!")
+
+    results_summary = {
+        "aquifer_depletion_m": aquifer.get("st", 30) - 30.0,
+        "total_yield_1e4bu": field.get("yield", 0),
+        "profit_1e4dollar": finance.get("profit", 0),
+        "workflow_steps": state.get("model_step", 0)
+    }
+    state["results_summary"] = results_summary
+    return results_summary
@@ -0,0 +1,361 @@
+"""
+Sharded, invocation-scoped PyCHAMP state
+
+Each workflow run keeps its state under its own FaaSr invocation ID, so
+overlapping runs (a timer tick and a manual run, say) never share objects:
+
+    pychamp-workflow/runs/<invocation_id>/state/manifest
+    pychamp-workflow/runs/<invocation_id>/state/aquifer.v3
+    pychamp-workflow/runs/<invocation_id>/state/settings.v1
+    ...
+
+The manifest is JSON and holds the run metadata (workflow_step, model_step,
+status, ...), a version number and, per component (aquifer, well, field,
+finance, settings), the object that currently holds it. A step declares the
+shards it reads and writes and only transfers those, plus the manifest.
+The dict it works on has the same shape as the old payload's ``state``,
+restricted to the shards it read, except that each component is a
+struct-of-arrays table (see ``pychamp_faasr.tables``) with one row per agent.
+Component shards written before tables (layout version 2) are read as
+one-row tables. A write can also attach NumPy array sidecars (e.g. the
+field's per-section yields), stored as ``.npy`` objects and read back
+memory-mapped.
+
+Shard objects are never overwritten: a write puts new ``<shard>.v<N>``
+objects and then the manifest, which is the commit point. FaaSr's file API
+has no conditional put, so lost updates are detected around it: before
+committing, the manifest is re-read and its version compared with the one
+this step started from, and after committing it is read back to check that
+this step's writer token won. A write may also record the completion
+marker of the step making it (``completes``) in the manifest, so a step's
+state and its marker commit at once; resuming an invocation trusts those.
+"""
+
+import copy
+import json
+import time
+import uuid
+
+from . import codec, tables
+
+COMPONENTS = ("aquifer", "well", "field", "finance")
+SHARDS = COMPONENTS + ("settings",)
+MANIFEST = "manifest"
+LAYOUT_VERSION = 3
+RUNS_FOLDER = "pychamp-workflow/runs"
+DONE_FOLDER = "done"
+# Concurrent shard and sidecar transfers of one read or write
+TRANSFER_WORKERS = 8
+
+
+class LostUpdateError(RuntimeError):
+    """The manifest changed under a step between its read and its write"""
+
+
+def run_folder(invocation_id):
+    """Data store folder holding everything written by one invocation"""
+    return f"{RUNS_FOLDER}/{invocation_id}"
+
+
+def state_folder(invocation_id):
+    """Folder of one invocation's manifest and state shards"""
+    return f"{run_folder(invocation_id)}/state"
+
+
+def concurrently(calls, workers=TRANSFER_WORKERS):
+    """Run the zero-argument ``calls`` on up to ``workers`` threads; return their results in order"""
+    if len(calls) <= 1:
+        return [call() for call in calls]
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(calls))) as pool:
+        return list(pool.map(lambda call: call(), calls))
+
+
+def done_folder(invocation_id):
+    """Folder of one invocation's completion markers, ``<function name>.json`` per finished step"""
+    return f"{run_folder(invocation_id)}/{DONE_FOLDER}"
+
+
+class ShardedState:
+    """Read and write the sharded state of one invocation in a DataStore"""
+
+    def __init__(self, store, invocation_id=None, state_codec=codec.DEFAULT_CODEC):
+        self.store = store
+        self.invocation_id = invocation_id or store.invocation_id
+        self.folder = state_folder(self.invocation_id)
+        self.state_codec = state_codec
+        self.writer = uuid.uuid4().hex
+        self.manifest = None
+        # local file -> remote object already downloaded into it
+        self._fetched = {}
+        # local files of the last write: {"shards": {...}, "arrays": {...}, "meta": {...}}
+        self.written = None
+
+    def _local(self, name):
+        return f"state-{name}"
+
+    def _fetch_manifest(self):
+        """Return the stored manifest, or None if there is none yet"""
+        if not self.store.exists(self.folder, MANIFEST):
+            return None
+        local = self._local(MANIFEST)
+        self.store.get(self.folder, MANIFEST, local)
+        with open(local, "r") as f:
+            return json.load(f)
+
+    def read_manifest(self):
+        self.manifest = self._fetch_manifest()
+        if self.manifest is None:
+            raise FileNotFoundError(f"No state manifest under {self.folder}")
+        return self.manifest
+
+    def _download(self, remote, local):
+        if self._fetched.get(local) != remote:
+            self.store.get(self.folder, remote, local)
+            self._fetched[local] = remote
+        return local
+
+    def fetch(self, shards=SHARDS, arrays=()):
+        """
+        Download ``shards`` and the array sidecars ``arrays`` of the stored
+        manifest without decoding them; return their (name, local file)
+        pairs. A later ``read`` / ``read_arrays`` reuses the downloads.
+        Uses the manifest already read, if any.
+        """
+        manifest = self.manifest or self.read_manifest()
+        jobs = []
+        for name in shards:
+            if name not in manifest["shards"]:
+                raise KeyError(f"State shard '{name}' has not been written")
+            jobs.append((name, manifest["shards"][name]["file"], self._local(name)))
+        entries = manifest.get("arrays", {})
+        for name in arrays:
+            if name in entries:
+                jobs.append((name, entries[name]["file"], f"{self._local(name)}.npy"))
+        concurrently([
+            lambda remote=remote, local=local: self._download(remote, local)
+            for _, remote, local in jobs
+        ])
+        return [(name, local) for name, _, local in jobs]
+
+    def read(self, shards=SHARDS):
+        """Fetch the manifest and ``shards``; return them as a state dict"""
+        manifest = self.read_manifest()
+        state = dict(manifest["meta"])
+        state["components"] = {}
+        for name, local in self.fetch(shards):
+            value = codec.load_file(local)
+            if name == "settings":
+                state["settings"] = value
+            else:
+                state["components"][name] = tables.decode(name, value)
+        return state
+
+    def read_arrays(self, names):
+        """
+        Download the array sidecars ``names`` of the manifest last read;
+        return them memory-mapped from the local ``.npy`` files
+        """
+        import numpy as np
+
+        entries = (self.manifest or {}).get("arrays", {})
+        missing = [name for name in names if name not in entries]
+        if missing:
+            raise KeyError(f"Array sidecars {missing} have not been written")
+        arrays = {}
+        for name in names:
+            local = self._download(entries[name]["file"], f"{self._local(name)}.npy")
+            arrays[name] = np.load(local, mmap_mode="r")
+        return arrays
+
+    def has_arrays(self, names):
+        return all(name in (self.manifest or {}).get("arrays", {}) for name in names)
+
+    def write(self, state, shards=SHARDS, force=False, arrays=None, completes=None):
+        """
+        Upload ``shards`` of ``state``, plus the ``arrays`` sidecars given as
+        {name: ndarray}, and commit them in a new manifest, recording the
+        completion of the step ``completes`` if given (see ``commit``)
+
+        Raises LostUpdateError if another writer committed since this step
+        read the manifest (or, for a step that did not read it, if a
+        manifest already exists), unless ``force`` is set.
+        """
+        files = {}
+        for name in shards:
+            if name == "settings":
+                value = state["settings"]
+            else:
+                value = tables.encode(state["components"][name])
+            files[name] = self._local(name)
+            codec.dump_file(value, files[name], self.state_codec)
+            self._fetched.pop(files[name], None)
+
+        array_files = {}
+        array_info = {}
+        if arrays:
+            import numpy as np
+
+        for name, array in (arrays or {}).items():
+            array = np.ascontiguousarray(array)
+            array_files[name] = f"{self._local(name)}.npy"
+            array_info[name] = {"dtype": array.dtype.str, "shape": list(array.shape)}
+            np.save(array_files[name], array)
+            self._fetched.pop(array_files[name], None)
+
+        meta = {k: v for k, v in state.items() if k not in ("components", "settings")}
+        return self.commit(files, array_files, meta, force, array_info, completes)
+
+    def commit(self, files, array_files=None, meta=None, force=False, array_info=None,
+               completes=None):
+        """
+        Upload already encoded shard files ({shard: local file}, in this
+        layout's codec) and ``.npy`` sidecar files, and commit them with the
+        run metadata ``meta`` in a new manifest (see ``write``). The dtype
+        and shape of each sidecar come from ``array_info`` ({name: {"dtype",
+        "shape"}}), so committing needs no NumPy; sidecars missing there are
+        opened to read them. With ``completes`` (a step's function name),
+        the manifest also records that step's completion marker, so the
+        state and the marker are committed together.
+        """
+        expected = self.manifest["version"] if self.manifest else None
+        current = self._fetch_manifest()
+        found = current["version"] if current else None
+        if found != expected and not force:
+            raise LostUpdateError(
+                f"State under {self.folder} is at version {found}, expected {expected}"
+            )
+
+        # Build the new manifest on a copy: self.manifest only moves on once
+        # the commit is known to have won
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        manifest = copy.deepcopy(current if force and current else (
+            self.manifest or {"layout_version": LAYOUT_VERSION, "created_at": now, "shards": {}}
+        ))
+        version = (found or 0) + 1
+
+        # Shards and sidecars upload concurrently; the manifest goes up last
+        array_files = array_files or {}
+        jobs = [(local, f"{name}.v{version}") for name, local in files.items()]
+        jobs += [(local, f"{name}.v{version}.npy") for name, local in array_files.items()]
+        sizes = concurrently([
+            lambda local=local, remote=remote: self.store.put(local, self.folder, remote)
+            for local, remote in jobs
+        ])
+
+        for (name, local), size in zip(files.items(), sizes):
+            manifest["shards"][name] = {"file": f"{name}.v{version}", "codec": self.state_codec,
+                                        "bytes": size}
+
+        array_info = dict(array_info or {})
+        for name, local in array_files.items():
+            if name not in array_info:
+                import numpy as np
+
+                array = np.load(local, mmap_mode="r")
+                array_info[name] = {"dtype": array.dtype.str, "shape": list(array.shape)}
+
+        for (name, local), size in zip(array_files.items(), sizes[len(files):]):
+            manifest.setdefault("arrays", {})[name] = {
+                "file": f"{name}.v{version}.npy", "dtype": array_info[name]["dtype"],
+                "shape": list(array_info[name]["shape"]), "bytes": size,
+            }
+
+        manifest["meta"] = dict(meta or {})
+        if completes:
+            manifest.setdefault("completed", {})[completes] = self._marker(
+                completes, {**files, **array_files}, manifest["meta"], version
+            )
+        manifest.update(version=version, writer=self.writer, updated_at=now,
+                        layout_version=LAYOUT_VERSION)
+        local = self._local(MANIFEST)
+        with open(local, "w") as f:
+            json.dump(manifest, f, indent=2, default=codec.to_builtin)
+        self.store.put(local, self.folder, MANIFEST)
+
+        committed = self._fetch_manifest()
+        if not committed or committed.get("writer") != self.writer:
+            raise LostUpdateError(
+                f"Concurrent write to {self.folder} overtook version {version}"
+            )
+        self.manifest = manifest
+        self.written = {"shards": dict(files), "arrays": dict(array_files),
+                        "meta": manifest["meta"]}
+        return manifest
+
+    def _marker(self, step, files, meta, version):
+        """Completion marker of ``step``: the state version and a digest of its outputs"""
+        import hashlib
+
+        digest = hashlib.sha256(json.dumps(meta, sort_keys=True, default=codec.to_builtin).encode())
+        files = sorted(files.items())
+        for name, local in files:
+            digest.update(name.encode())
+            with open(local, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        return {
+            "step": step,
+            "invocation_id": self.invocation_id,
+            "state_version": version,
+            "digest": digest.hexdigest(),
+            "outputs": [name for name, _ in files],
+            "completed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+
+    def mark_complete(self, step):
+        """
+        Record that ``step`` (its function name) finished this invocation:
+        upload ``done/<step>.json`` with the state version and a digest of
+        the shards, sidecars and run metadata of its last write. A write
+        that already recorded the marker in the manifest (``completes``)
+        makes this a copy for listing; the manifest's record is the one
+        that counts.
+        """
+        version = self.manifest["version"] if self.manifest else None
+        marker = (self.manifest or {}).get("completed", {}).get(step)
+        if not marker or marker["state_version"] != version:
+            written = self.written or {"shards": {}, "arrays": {}, "meta": {}}
+            marker = self._marker(step, {**written["shards"], **written["arrays"]},
+                                  written["meta"], version)
+        local = f"done-{step}.json"
+        with open(local, "w") as f:
+            json.dump(marker, f, indent=2)
+        self.store.put(local, done_folder(self.invocation_id), f"{step}.json")
+        return marker
+
+
+def prune_runs(store, max_age_days, keep_latest=0, protect=()):
+    """
+    Delete invocation folders whose state was last updated more than
+    ``max_age_days`` ago, always keeping the ``keep_latest`` most recent
+    ones and any invocation in ``protect``. Folders without a manifest are
+    kept: their invocation may still be writing its first one, and object
+    listings carry no timestamps to age them by. Returns the pruned IDs.
+    """
+    keys_by_run = {}
+    for key in store.list(RUNS_FOLDER):
+        parts = key[len(RUNS_FOLDER):].strip("/").split("/", 1)
+        if len(parts) == 2:
+            keys_by_run.setdefault(parts[0], []).append(parts[1])
+
+    updated = {}
+    for run_id in keys_by_run:
+        manifest = ShardedState(store, invocation_id=run_id)._fetch_manifest()
+        if manifest and manifest.get("updated_at"):
+            updated[run_id] = manifest["updated_at"]
+
+    cutoff = time.strftime(
+        "%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - max_age_days * 86400)
+    )
+    newest_first = sorted(updated, key=updated.get, reverse=True)
+    pruned = []
+    for run_id in newest_first[keep_latest:]:
+        if run_id in protect or updated[run_id] >= cutoff:
+            continue
+        for rel in keys_by_run[run_id]:
+            folder, _, name = f"{run_folder(run_id)}/{rel}".rpartition("/")
+            store.delete(folder, name)
+        pruned.append(run_id)
+    return pruned
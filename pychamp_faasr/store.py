@@ -0,0 +1,144 @@
+"""
+Data store access for the PyCHAMP steps
+
+FaaSr injects its file API (``faasr_get_file``, ``faasr_put_file``, ...) into
+the namespace of the module that defines the action function, so shared code
+cannot call it directly. ``DataStore`` wraps those functions once, bound to a
+server name, and keeps per-action byte counters. Outside FaaSr (no API in the
+module namespace) it falls back to a local directory, so steps and
+benchmarks can run on a laptop.
+"""
+
+import os
+import shutil
+import threading
+
+LOCAL_STORE_ENV = "PYCHAMP_LOCAL_STORE"
+DEFAULT_LOCAL_STORE = ".faasr_local"
+INVOCATION_ID_ENV = "FAASR_INVOCATION_ID"
+
+
+class DataStore:
+    """One FaaSr data store, addressed by remote folder and file name"""
+
+    def __init__(self, get_file=None, put_file=None, delete_file=None,
+                 get_folder_list=None, invocation_id=None, server_name="S3",
+                 local_root=None):
+        self.server_name = server_name
+        self._invocation_id = invocation_id
+        self._get_file = get_file
+        self._put_file = put_file
+        self._delete_file = delete_file
+        self._get_folder_list = get_folder_list
+        self.local_root = None
+        if get_file is None or put_file is None:
+            self.local_root = local_root or os.environ.get(
+                LOCAL_STORE_ENV, DEFAULT_LOCAL_STORE
+            )
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # Transfers may run on several threads (see ShardedState)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_globals(cls, namespace, server_name="S3"):
+        """Build from the FaaSr API functions found in a step's globals()"""
+        return cls(
+            get_file=namespace.get("faasr_get_file"),
+            put_file=namespace.get("faasr_put_file"),
+            delete_file=namespace.get("faasr_delete_file"),
+            get_folder_list=namespace.get("faasr_get_folder_list"),
+            invocation_id=namespace.get("faasr_invocation_id"),
+            server_name=server_name,
+        )
+
+    @property
+    def invocation_id(self):
+        """The FaaSr invocation ID, shared by every action of one workflow run"""
+        if self._invocation_id is not None:
+            return str(self._invocation_id())
+        return os.environ.get(INVOCATION_ID_ENV, "local")
+
+    @property
+    def is_local(self):
+        return self.local_root is not None
+
+    def _local_path(self, remote_folder, remote_file):
+        return os.path.join(self.local_root, remote_folder, remote_file)
+
+    def get(self, remote_folder, remote_file, local_file):
+        """Download remote_folder/remote_file to local_file; return its size"""
+        if self.is_local:
+            src = self._local_path(remote_folder, remote_file)
+            if not os.path.exists(src):
+                raise FileNotFoundError(f"{remote_folder}/{remote_file} not in local store")
+            shutil.copyfile(src, local_file)
+        else:
+            self._get_file(
+                server_name=self.server_name,
+                remote_folder=remote_folder,
+                remote_file=remote_file,
+                local_folder="",
+                local_file=local_file,
+            )
+        size = os.path.getsize(local_file)
+        with self._lock:
+            self.bytes_in += size
+        return size
+
+    def put(self, local_file, remote_folder, remote_file):
+        """Upload local_file to remote_folder/remote_file; return its size"""
+        size = os.path.getsize(local_file)
+        if self.is_local:
+            dst = self._local_path(remote_folder, remote_file)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copyfile(local_file, dst)
+        else:
+            self._put_file(
+                server_name=self.server_name,
+                local_folder="",
+                local_file=local_file,
+                remote_folder=remote_folder,
+                remote_file=remote_file,
+            )
+        with self._lock:
+            self.bytes_out += size
+        return size
+
+    def delete(self, remote_folder, remote_file):
+        if self.is_local:
+            path = self._local_path(remote_folder, remote_file)
+            if os.path.exists(path):
+                os.remove(path)
+        elif self._delete_file is not None:
+            self._delete_file(
+                server_name=self.server_name,
+                remote_folder=remote_folder,
+                remote_file=remote_file,
+            )
+        else:
+            raise RuntimeError("faasr_delete_file is not available")
+
+    def exists(self, remote_folder, remote_file):
+        """
+        Whether remote_folder/remote_file exists. Checked by listing, since
+        faasr_get_file exits the action on a missing object.
+        """
+        if self.is_local:
+            return os.path.exists(self._local_path(remote_folder, remote_file))
+        key = f"{remote_folder}/{remote_file}"
+        return key in self.list(key)
+
+    def list(self, prefix):
+        """Return the object keys under ``prefix``"""
+        if self.is_local:
+            root = os.path.join(self.local_root, prefix)
+            keys = []
+            for dirpath, _, files in os.walk(root):
+                for name in files:
+                    path = os.path.join(dirpath, name)
+                    keys.append(os.path.relpath(path, self.local_root).replace(os.sep, "/"))
+            return sorted(keys)
+        if self._get_folder_list is None:
+            raise RuntimeError("faasr_get_folder_list is not available")
+        return list(self._get_folder_list(server_name=self.server_name, prefix=prefix))
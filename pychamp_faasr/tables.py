@@ -0,0 +1,172 @@
+"""
+Struct-of-arrays component tables
+
+Each component type (aquifer, well, field, finance) is held as a table: a
+dict of equal-length NumPy arrays, one column per attribute and one row per
+agent. Nested record values are flattened into dotted column names
+(``crop_price.corn``); per-section values are 2-D columns (``crops``, one row
+of ``area_split`` crop names per field). Links are index arrays: a well's
+``aquifer_index`` and a field's ``well_index`` are row numbers in the aquifer
+and well tables, kept next to the ``aquifer_id`` / ``well_id`` they resolve.
+
+Known columns have a fixed dtype (``COLUMNS``); others take the dtype NumPy
+infers. In a state shard a table is stored as ``{"__table__": <schema>,
+"columns": {...}}``, so codecs that keep arrays (npz, msgpack) store the
+columns as raw typed arrays, and ``decode`` restores the dtypes after json.
+"""
+
+TABLE_SCHEMA = 1
+TABLE_KEY = "__table__"
+
+_ID = "U32"
+COLUMNS = {
+    "aquifer": {
+        "id": _ID, "st": "f8", "dwl": "f8", "area": "f8",
+        "withdrawal": "f8", "inflow": "f8", "dwl_change": "f8",
+    },
+    "well": {
+        "id": _ID, "aquifer_id": _ID, "aquifer_index": "i8",
+        "pumping_capacity": "f8", "eff_pump": "f8", "st": "f8", "pumping_days": "i8",
+    },
+    "field": {
+        "id": _ID, "well_id": _ID, "well_index": "i8", "field_area": "f8",
+        "crops": _ID, "tech": _ID, "pre_tech": _ID, "yield": "f8",
+        "avg_yield_rate": "f8", "irrigation_volume": "f8", "pumping_rate": "f8",
+    },
+    "finance": {
+        "id": _ID, "energy_price": "f8",
+        "revenue": "f8", "energy_cost": "f8", "tech_cost": "f8", "profit": "f8",
+    },
+}
+
+# component: (id column, linked component, index column)
+LINKS = {
+    "well": ("aquifer_id", "aquifer", "aquifer_index"),
+    "field": ("well_id", "well", "well_index"),
+}
+
+
+def is_table(value):
+    return isinstance(value, dict) and TABLE_KEY in value
+
+
+def n_rows(table):
+    return len(next(iter(table.values()))) if table else 0
+
+
+def _flatten(record, prefix=""):
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def _column(component, name, value, n):
+    """``value`` as a column of ``n`` rows; a value whose length is not n is one row's value"""
+    import numpy as np
+
+    dtype = COLUMNS.get(component, {}).get(name)
+    array = np.asarray(value, dtype=dtype)
+    if array.ndim == 0 or array.shape[0] != n:
+        array = np.broadcast_to(array, (n,) + array.shape)
+    return np.array(array)
+
+
+def from_records(component, records):
+    """Build a table from a list of (nested) per-agent dicts"""
+    flat = [_flatten(r) for r in records]
+    names = list(dict.fromkeys(name for r in flat for name in r))
+    return {
+        name: _column(component, name, [r.get(name) for r in flat], len(flat))
+        for name in names
+    }
+
+
+def update(component, table, values):
+    """
+    Set columns of ``table`` in place from a (nested) dict. A scalar, or a
+    value whose length is not the row count, is broadcast to every row.
+    """
+    n = n_rows(table)
+    for name, value in _flatten(values).items():
+        table[name] = _column(component, name, value, n)
+    return table
+
+
+def resize(table, n):
+    """
+    Return ``table`` with ``n`` rows. A one-row table is repeated, its ids
+    suffixed with the row number; any other row count must already be n.
+    """
+    import numpy as np
+
+    rows = n_rows(table)
+    if rows == n:
+        return table
+    if rows != 1:
+        raise ValueError(f"Cannot resize a table of {rows} rows to {n}")
+    table = {name: np.repeat(column, n, axis=0) for name, column in table.items()}
+    if "id" in table:
+        table["id"] = np.char.add(table["id"], [f"_{i}" for i in range(n)])
+    return table
+
+
+def _scalar(value):
+    return value.tolist() if hasattr(value, "tolist") else value
+
+
+def row(table, i=0):
+    """Row ``i`` as a nested dict of Python values"""
+    record = {}
+    for name, column in table.items():
+        node = record
+        *parents, leaf = name.split(".")
+        for key in parents:
+            node = node.setdefault(key, {})
+        node[leaf] = _scalar(column[i])
+    return record
+
+
+def to_records(table):
+    return [row(table, i) for i in range(n_rows(table))]
+
+
+def link(components):
+    """Fill each linked table's index column from its id column, in place"""
+    import numpy as np
+
+    for component, (id_column, target, index_column) in LINKS.items():
+        table = components.get(component)
+        if table is None or id_column not in table or target not in components:
+            continue
+        position = {tid: i for i, tid in enumerate(components[target]["id"].tolist())}
+        table[index_column] = np.array(
+            [position.get(tid, -1) for tid in table[id_column].tolist()], dtype=np.int64
+        )
+    return components
+
+
+def encode(table):
+    return {TABLE_KEY: TABLE_SCHEMA, "columns": table}
+
+
+def decode(component, value):
+    """Table from a stored shard value; a legacy per-agent dict becomes one row"""
+    if not is_table(value):
+        return from_records(component, [value])
+    columns = value["columns"]
+    n = len(next(iter(columns.values()))) if columns else 0
+    return {name: _column(component, name, column, n) for name, column in columns.items()}
+
+
+def legacy(table):
+    """
+    The pre-table form of a component: a dict of scalars for one row, or of
+    per-agent lists for several
+    """
+    if n_rows(table) == 1:
+        return row(table)
+    return row({name: [column.tolist()] for name, column in table.items()})
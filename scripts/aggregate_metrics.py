@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Per-step percentile tables from the PyCHAMP step records
+
+Every PyCHAMP step uploads a record of its phases (wall and CPU time, peak
+memory, bytes transferred) to FaaSrLog/<InvocationID>/pychamp-metrics/
+<step>.json (see pychamp_faasr/phases.py). This script collects the records
+of many invocations, from the workflow's data store or from a local
+directory, and prints one table per step: a row per phase plus the step
+total, with the chosen percentiles of one metric.
+
+    python scripts/aggregate_metrics.py --workflow-file pychamp_workflow.json
+    python scripts/aggregate_metrics.py --local-dir .faasr_local --metric peak_rss_bytes
+    python scripts/aggregate_metrics.py --workflow-file pychamp_workflow.json --csv metrics.csv
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pychamp_faasr.phases import LOG_FOLDER, METRICS_FOLDER  # noqa: E402
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(message)s",
+    stream=sys.stdout,
+    force=True,
+)
+logger = logging.getLogger(__name__)
+
+METRICS = ("wall_seconds", "cpu_seconds", "peak_rss_bytes", "peak_traced_bytes",
+           "bytes_in", "bytes_out")
+TOTAL = "(total)"
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Aggregate PyCHAMP step records into per-step percentile tables"
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--workflow-file", help="Workflow JSON naming the data store to read")
+    source.add_argument("--local-dir", help="Local directory (e.g. a local data store) to scan")
+    parser.add_argument("--data-store", help="Data store name (default: the workflow's LoggingDataStore)")
+    parser.add_argument("--metric", default="wall_seconds", choices=METRICS,
+                        help="Metric of the printed tables")
+    parser.add_argument("--percentiles", type=float, nargs="+", default=[50, 90, 99])
+    parser.add_argument("--status", nargs="+", default=["ok"],
+                        help="Record statuses to include (ok, cache_hit, incomplete)")
+    parser.add_argument("--csv", help="Also write every metric's percentiles to this CSV file")
+    return parser.parse_args()
+
+
+def is_record(key):
+    parts = key.replace(os.sep, "/").split("/")
+    return len(parts) >= 2 and parts[-2] == METRICS_FOLDER and parts[-1].endswith(".json")
+
+
+def read_local(root):
+    records = []
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            if is_record(path):
+                with open(path, "r") as f:
+                    records.append(json.load(f))
+    return records
+
+
+def read_store(workflow_file, data_store=None):
+    import boto3
+
+    with open(workflow_file, "r") as f:
+        workflow = json.load(f)
+    store_name = data_store or workflow.get("LoggingDataStore") or workflow.get("DefaultDataStore")
+    store = workflow.get("DataStores", {}).get(store_name)
+    if not store:
+        logger.error(f"Data store '{store_name}' not found in workflow file")
+        sys.exit(1)
+
+    access_key = os.getenv(f"{store_name}_AccessKey")
+    secret_key = os.getenv(f"{store_name}_SecretKey")
+    if not access_key or not secret_key:
+        logger.error(
+            f"{store_name}_AccessKey and {store_name}_SecretKey environment variables must be set"  # noqa E501
+        )
+        sys.exit(1)
+
+    s3 = boto3.client(
+        "s3",
+        endpoint_url=store.get("Endpoint") or None,
+        region_name=store.get("Region") or "us-east-1",
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+    )
+    prefix = workflow.get("FaaSrLog") or LOG_FOLDER
+    records = []
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=store["Bucket"], Prefix=f"{prefix}/"):
+        for obj in page.get("Contents", []):
+            if is_record(obj["Key"]):
+                body = s3.get_object(Bucket=store["Bucket"], Key=obj["Key"])["Body"].read()
+                records.append(json.loads(body))
+    return records
+
+
+def percentile(values, q):
+    """The q-th percentile of ``values``, linearly interpolated between ranks"""
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def samples(records):
+    """{step: {phase: {metric: [values]}}}, the step totals under TOTAL"""
+    table = {}
+    for record in records:
+        phases = dict(record.get("phases", {}))
+        phases[TOTAL] = record
+        step = table.setdefault(record.get("step") or "unknown", {})
+        for phase, metrics in phases.items():
+            for metric in METRICS:
+                if metrics.get(metric) is not None:
+                    step.setdefault(phase, {}).setdefault(metric, []).append(metrics[metric])
+    return table
+
+
+def format_value(value, metric):
+    if metric.endswith("_bytes") or metric.startswith("bytes_"):
+        return f"{value / 2**20:.1f} MiB"
+    return f"{value:.2f}s"
+
+
+def print_tables(table, metric, percentiles, counts):
+    for step in sorted(table):
+        header = ["phase", "n"] + [f"p{q:g}" for q in percentiles] + ["max"]
+        rows = []
+        phases = sorted(p for p in table[step] if p != TOTAL) + [TOTAL]
+        for phase in phases:
+            values = table[step].get(phase, {}).get(metric)
+            if not values:
+                continue
+            rows.append([phase, str(len(values))]
+                        + [format_value(percentile(values, q), metric) for q in percentiles]
+                        + [format_value(max(values), metric)])
+        widths = [max(len(row[i]) for row in rows + [header]) for i in range(len(header))]
+        logger.info(f"\n{step} ({counts[step]} records, {metric})")
+        for row in [header] + rows:
+            logger.info("  ".join(cell.ljust(w) if i == 0 else cell.rjust(w)
+                                  for i, (cell, w) in enumerate(zip(row, widths))))
+
+
+def write_csv(path, table, percentiles):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["step", "phase", "metric", "n"] + [f"p{q:g}" for q in percentiles] + ["max"])
+        for step in sorted(table):
+            for phase in sorted(table[step]):
+                for metric, values in table[step][phase].items():
+                    writer.writerow([step, phase, metric, len(values)]
+                                    + [percentile(values, q) for q in percentiles] + [max(values)])
+    logger.info(f"\nWrote {path}")
+
+
+def main():
+    args = parse_arguments()
+    if args.local_dir:
+        records = read_local(args.local_dir)
+    else:
+        records = read_store(args.workflow_file, args.data_store)
+    records = [r for r in records if r.get("status") in args.status]
+    if not records:
+        logger.error(f"No step records with status {', '.join(args.status)} found")
+        sys.exit(1)
+
+    counts = Counter(record.get("step") or "unknown" for record in records)
+    invocations = {r.get("invocation_id") for r in records}
+    logger.info(f"{len(records)} step records from {len(invocations)} invocation(s)")
+
+    table = samples(records)
+    print_tables(table, args.metric, args.percentiles, counts)
+    if args.csv:
+        write_csv(args.csv, table, args.percentiles)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+import boto3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pychamp_faasr.deps import (  # noqa: E402
+    BASE_PACKAGES,
+    PYCHAMP_REPO,
+    WHEELHOUSE_FILE,
+    WHEELHOUSE_FOLDER,
+    WHEELHOUSE_MANIFEST,
+    WHEELHOUSE_REQUIREMENTS,
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(levelname)s: %(message)s",
+    stream=sys.stdout,
+    force=True,
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Build the pinned PyCHAMP wheelhouse and upload it to the data store"
+    )
+    parser.add_argument(
+        "--workflow-file", required=True, help="Path to the workflow JSON file"
+    )
+    parser.add_argument(
+        "--pychamp-ref",
+        default="main",
+        help="PyCHAMP branch, tag or commit to pin (resolved to a commit SHA)",
+    )
+    parser.add_argument(
+        "--data-store",
+        default="",
+        help="Data store to upload to. Defaults to the workflow's DefaultDataStore.",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="",
+        help="Keep the wheelhouse in this directory instead of a temporary one",
+    )
+    parser.add_argument(
+        "--no-upload", action="store_true", help="Build the archive but do not upload it"
+    )
+    return parser.parse_args()
+
+
+def read_workflow_file(file_path):
+    try:
+        with open(file_path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        logger.error(f"Error: Workflow file {file_path} not found")
+        sys.exit(1)
+    except json.JSONDecodeError:
+        logger.error(f"Error: Invalid JSON in workflow file {file_path}")
+        sys.exit(1)
+
+
+def resolve_pychamp_commit(ref):
+    """Resolve a PyCHAMP branch or tag to the commit SHA it currently points at"""
+    if len(ref) == 40 and all(c in "0123456789abcdef" for c in ref):
+        return ref
+
+    out = subprocess.run(
+        ["git", "ls-remote", PYCHAMP_REPO, ref],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    if not out:
+        logger.error(f"Could not resolve PyCHAMP ref '{ref}'")
+        sys.exit(1)
+    return out[0]
+
+
+def build_wheels(wheel_dir, commit):
+    """Build wheels for the base packages, PyCHAMP and all transitive dependencies"""
+    subprocess.check_call([
+        sys.executable, "-m", "pip", "wheel", "-q",
+        "--wheel-dir", wheel_dir,
+        *BASE_PACKAGES,
+        f"git+{PYCHAMP_REPO}@{commit}",
+    ])
+
+
+def write_requirements(wheel_dir):
+    """Pin every wheel in the wheelhouse by exact version"""
+    pins = []
+    for name in sorted(os.listdir(wheel_dir)):
+        if name.endswith(".whl"):
+            dist, version = name.split("-")[:2]
+            pins.append(f"{dist}=={version}")
+
+    with open(os.path.join(wheel_dir, WHEELHOUSE_REQUIREMENTS), "w") as f:
+        f.write("\n".join(pins) + "\n")
+    return pins
+
+
+def write_manifest(wheel_dir, commit, pins):
+    manifest = {
+        "pychamp_commit": commit,
+        "python": f"{sys.version_info.major}.{sys.version_info.minor}",
+        "packages": pins,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    with open(os.path.join(wheel_dir, WHEELHOUSE_MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def make_archive(wheel_dir):
+    archive = os.path.join(os.path.dirname(wheel_dir), WHEELHOUSE_FILE)
+    with tarfile.open(archive, "w:gz") as tar:
+        for name in os.listdir(wheel_dir):
+            tar.add(os.path.join(wheel_dir, name), arcname=name)
+    return archive
+
+
+def upload_archive(workflow_data, data_store, archive):
+    store_name = data_store or workflow_data.get("DefaultDataStore")
+    store = workflow_data.get("DataStores", {}).get(store_name)
+    if not store:
+        logger.error(f"Data store '{store_name}' not found in workflow file")
+        sys.exit(1)
+
+    access_key = os.getenv(f"{store_name}_AccessKey")
+    secret_key = os.getenv(f"{store_name}_SecretKey")
+    if not access_key or not secret_key:
+        logger.error(
+            f"{store_name}_AccessKey and {store_name}_SecretKey environment variables must be set"  # noqa E501
+        )
+        sys.exit(1)
+
+    s3 = boto3.client(
+        "s3",
+        endpoint_url=store.get("Endpoint") or None,
+        region_name=store.get("Region") or "us-east-1",
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+    )
+    key = f"{WHEELHOUSE_FOLDER}/{WHEELHOUSE_FILE}"
+    s3.upload_file(archive, store["Bucket"], key)
+    logger.info(f"Uploaded wheelhouse to s3://{store['Bucket']}/{key}")
+
+
+def main():
+    args = parse_arguments()
+    workflow_data = read_workflow_file(args.workflow_file)
+
+    commit = resolve_pychamp_commit(args.pychamp_ref)
+    logger.info(f"Pinning PyCHAMP to {commit}")
+
+    build_root = args.output_dir or tempfile.mkdtemp(prefix="pychamp-wheelhouse-")
+    wheel_dir = os.path.join(build_root, "wheels")
+    os.makedirs(wheel_dir, exist_ok=True)
+
+    build_wheels(wheel_dir, commit)
+    pins = write_requirements(wheel_dir)
+    write_manifest(wheel_dir, commit, pins)
+    archive = make_archive(wheel_dir)
+    logger.info(f"Built {archive} with {len(pins)} wheels")
+
+    if not args.no_upload:
+        upload_archive(workflow_data, args.data_store, archive)
+
+
+if __name__ == "__main__":
+    main()
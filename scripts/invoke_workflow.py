@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 import argparse
+import json
 import logging
 import os
 import sys
 from pathlib import Path
 
+import boto3
 from FaaSr_py import FaaSrPayload, Scheduler
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pychamp_faasr.state import MANIFEST, done_folder, state_folder  # noqa: E402
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(levelname)s: %(message)s",
@@ -16,22 +21,158 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def get_workflow_file():
-    """Gets workflow file from command line arguments"""
+def parse_arguments():
+    """Gets workflow file and resume options from command line arguments"""
     parser = argparse.ArgumentParser(
         description="Invoke a workflow defined in a JSON file"
     )
     parser.add_argument(
         "--workflow-file", required=True, help="Path to the workflow JSON file"
     )
+    parser.add_argument(
+        "--resume",
+        metavar="INVOCATION_ID",
+        help="Re-run a failed invocation from its first incomplete action, "
+        "reusing the outputs of the actions that completed",
+    )
+    parser.add_argument(
+        "--resume-action",
+        help="With --resume, the action to restart from instead of the first incomplete one",
+    )
+
+    args = parser.parse_args()
+
+    if not Path(args.workflow_file).is_file():
+        logger.error(f"Workflow file {args.workflow_file} not found")
+        sys.exit(1)
+    if args.resume_action and not args.resume:
+        logger.error("--resume-action requires --resume")
+        sys.exit(1)
 
-    workflow_path = parser.parse_args().workflow_file
+    return args
+
+
+def successors(action):
+    """
+    Action names an action invokes: plain and ranked ("name(3)") InvokeNext
+    entries and both branches of conditional ({"True": [...], "False": [...]}) ones
+    """
+    names = []
+    for entry in action.get("InvokeNext", []):
+        if isinstance(entry, dict):
+            names.extend(name for branch in entry.values() for name in branch)
+        else:
+            names.append(entry)
+    return [name.split("(")[0].strip() for name in names]
+
+
+def action_order(workflow):
+    """
+    Actions reachable from FunctionInvoke in topological order, and each
+    action's predecessors, following InvokeNext
+    """
+    actions = workflow["ActionList"]
+    entry = workflow["FunctionInvoke"]
+
+    predecessors = {entry: set()}
+    stack = [entry]
+    while stack:
+        name = stack.pop()
+        for nxt in successors(actions[name]):
+            if nxt not in predecessors:
+                predecessors[nxt] = set()
+                stack.append(nxt)
+            predecessors[nxt].add(name)
+
+    waiting = {name: set(pre) for name, pre in predecessors.items()}
+    order = []
+    ready = [entry]
+    while ready:
+        name = ready.pop(0)
+        order.append(name)
+        for nxt in successors(actions[name]):
+            waiting[nxt].discard(name)
+            if not waiting[nxt] and nxt not in order and nxt not in ready:
+                ready.append(nxt)
+
+    return order, predecessors
+
+
+def read_markers(workflow, invocation_id):
+    """
+    Completion markers the steps of an invocation wrote, by function name.
+    A step commits its marker in the state manifest together with its
+    state, so a step that died before uploading ``done/<step>.json`` still
+    counts as complete and is not applied twice; the manifest's markers win.
+    """
+    store_name = workflow.get("DefaultDataStore")
+    store = workflow.get("DataStores", {}).get(store_name)
+    if not store:
+        logger.error(f"Data store '{store_name}' not found in workflow file")
+        sys.exit(1)
 
-    if not Path(workflow_path).is_file():
-        logger.error(f"Workflow file {workflow_path} not found")
+    access_key = os.getenv(f"{store_name}_AccessKey")
+    secret_key = os.getenv(f"{store_name}_SecretKey")
+    if not access_key or not secret_key:
+        logger.error(
+            f"{store_name}_AccessKey and {store_name}_SecretKey environment variables must be set to resume"  # noqa E501
+        )
         sys.exit(1)
 
-    return workflow_path
+    s3 = boto3.client(
+        "s3",
+        endpoint_url=store.get("Endpoint") or None,
+        region_name=store.get("Region") or "us-east-1",
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+    )
+    markers = {}
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=store["Bucket"], Prefix=f"{done_folder(invocation_id)}/"):
+        for obj in page.get("Contents", []):
+            marker = json.loads(s3.get_object(Bucket=store["Bucket"], Key=obj["Key"])["Body"].read())
+            markers[marker["step"]] = marker
+    try:
+        manifest = s3.get_object(
+            Bucket=store["Bucket"], Key=f"{state_folder(invocation_id)}/{MANIFEST}"
+        )["Body"].read()
+    except s3.exceptions.NoSuchKey:
+        return markers
+    markers.update(json.loads(manifest).get("completed", {}))
+    return markers
+
+
+def resume_action(workflow, markers, requested=None):
+    """
+    The action to re-run an invocation from, or None if every action completed
+
+    An action completed if its function wrote a completion marker, or if one
+    of the actions it invokes completed (so actions that write no marker,
+    such as an R entry action, count as done once their successors are).
+    The first incomplete action in topological order has all its
+    predecessors complete; a requested action must too.
+    """
+    actions = workflow["ActionList"]
+    order, predecessors = action_order(workflow)
+
+    complete = set()
+    for name in reversed(order):
+        if actions[name]["FunctionName"] in markers or any(
+            nxt in complete for nxt in successors(actions[name])
+        ):
+            complete.add(name)
+
+    if requested:
+        if requested not in predecessors:
+            logger.error(f"Action {requested} is not reachable from {workflow['FunctionInvoke']}")
+            sys.exit(1)
+        missing = sorted(predecessors[requested] - complete)
+        if missing:
+            logger.error(f"Cannot resume from {requested}: {', '.join(missing)} did not complete")
+            sys.exit(1)
+        return requested
+
+    return next((name for name in order if name not in complete), None)
 
 
 def add_secrets_to_server_attributes(server, faas_type):
@@ -99,7 +240,8 @@ def add_secrets_to_server_attributes(server, faas_type):
 def main(testing: bool = False) -> FaaSrPayload:
     """Function invocation script"""
 
-    workflow_path = get_workflow_file()
+    args = parse_arguments()
+    workflow_path = args.workflow_file
 
     github_repo = os.getenv("GITHUB_REPOSITORY")
     ref = os.getenv("GITHUB_REF_NAME", "main")
@@ -135,6 +277,26 @@ def main(testing: bool = False) -> FaaSrPayload:
         logger.error("FunctionInvoke not found in payload")
         sys.exit(1)
 
+    # Resume: restart the invocation from its first incomplete action. The
+    # actions after the entry action skip FaaSr's new-invocation check, so
+    # they run under the old InvocationID and read the upstream state
+    if args.resume:
+        markers = read_markers(workflow, args.resume)
+        for step, marker in sorted(markers.items()):
+            logger.info(
+                f"Completed: {step} (state v{marker['state_version']}, {marker['digest'][:12]})"
+            )
+        action_name = resume_action(workflow, markers, args.resume_action)
+        if action_name is None:
+            logger.info(f"Every action of invocation {args.resume} completed; nothing to resume")
+            return workflow
+        if action_name == entry_action_name:
+            logger.info("No action completed; starting a new invocation instead")
+        else:
+            workflow["InvocationID"] = args.resume
+            entry_action_name = action_name
+            logger.info(f"Resuming invocation {args.resume} from action: {entry_action_name}")
+
     try:
         server_name = workflow["ActionList"][entry_action_name]["FaaSServer"]
 
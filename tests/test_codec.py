@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from pychamp_faasr import codec, stages, tables
+from test_stages import initial_state
+
+SPECS = [f"{fmt}{compression}" for fmt in codec.FORMATS for compression in ("", "+gzip", "+zstd")]
+
+
+@pytest.fixture(params=SPECS)
+def spec(request):
+    fmt, compression = codec.parse_spec(request.param)
+    if fmt == "msgpack":
+        pytest.importorskip("msgpack")
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    return request.param
+
+
+@pytest.fixture(scope="module")
+def state():
+    """A three-field state after one field and finance season"""
+    state = initial_state([100.0, 50.0, 10.0])
+    stages.finance_batch_stage(state, stages.field_batch_stage(state)["arrays"])
+    return state
+
+
+def test_round_trip_components(spec, state):
+    for name, table in state["components"].items():
+        data = codec.dumps(tables.encode(table), spec)
+        assert codec.detect(data) == spec
+        back = tables.decode(name, codec.loads(data))
+        assert list(back) == list(table)
+        for column, values in table.items():
+            assert back[column].dtype.kind == values.dtype.kind, (name, column)
+            np.testing.assert_array_equal(back[column], values)
+
+    # String columns and the nested crop_price dict survive
+    field, finance = state["components"]["field"], state["components"]["finance"]
+    assert tables.row(tables.decode("field", codec.loads(codec.dumps(tables.encode(field), spec))))[
+        "crops"] == ["corn"] * stages.AREA_SPLIT
+    back = tables.decode("finance", codec.loads(codec.dumps(tables.encode(finance), spec)))
+    assert tables.row(back)["crop_price"] == state["settings"]["finance"]["crop_price"]
+
+
+def test_round_trip_settings(spec, state):
+    assert codec.loads(codec.dumps(state["settings"], spec)) == state["settings"]
+
+
+def test_round_trip_long_lists_keep_types(spec):
+    value = {
+        "ints": list(range(codec.NPZ_MIN_LIST_LEN)),
+        "floats": [i / 2 for i in range(codec.NPZ_MIN_LIST_LEN)],
+        "mixed": [i if i % 2 else i / 2 for i in range(codec.NPZ_MIN_LIST_LEN)],
+        "names": ["corn", "soy"] * codec.NPZ_MIN_LIST_LEN,
+    }
+    back = codec.loads(codec.dumps(value, spec))
+    assert back == value
+    for key, values in value.items():
+        assert [type(v) for v in back[key]] == [type(v) for v in values], key
+
+
+def test_round_trip_arrays():
+    value = {"y": np.arange(12, dtype="f4").reshape(3, 4), "i": np.arange(5)}
+    back = codec.loads(codec.dumps(value, "npz+gzip"))
+    for key, array in value.items():
+        assert back[key].dtype == array.dtype
+        np.testing.assert_array_equal(back[key], array)
@@ -0,0 +1,100 @@
+import math
+
+import numpy as np
+import pytest
+
+from pychamp_faasr import consumat, neighbors
+
+hypothesis = pytest.importorskip("hypothesis")
+from hypothesis import example, given, settings  # noqa: E402
+from hypothesis import strategies as st  # noqa: E402
+
+
+def around(edges, low, high):
+    """Uniform draws, the rule boundaries, their neighbouring floats and NaN"""
+    special = [e for edge in edges
+               for e in (edge, math.nextafter(edge, -math.inf), math.nextafter(edge, math.inf))]
+    return st.one_of(
+        st.floats(low, high),
+        st.sampled_from(special),
+        st.just(math.nan),
+    )
+
+
+THRESHOLD = around([0.5], 0.0, 1.0)
+SOIL = around([consumat.DRY_SOIL, consumat.WET_SOIL], 0.0, 1.0)
+STORAGE = around(
+    [consumat.CRITICAL_STORAGE, consumat.LOW_STORAGE, consumat.CONSERVE_STORAGE], 0.0, 30.0
+)
+
+
+@st.composite
+def farmer(draw):
+    satisfaction_threshold = draw(THRESHOLD)
+    uncertainty_threshold = draw(THRESHOLD)
+    # Sometimes exactly on the farmer's own thresholds
+    satisfaction = draw(st.one_of(THRESHOLD, st.just(satisfaction_threshold)))
+    uncertainty = draw(st.one_of(THRESHOLD, st.just(uncertainty_threshold)))
+    return (satisfaction, uncertainty, satisfaction_threshold, uncertainty_threshold,
+            draw(SOIL), draw(STORAGE))
+
+
+def assert_batch_matches_scalar(farmers):
+    inputs = [np.array(column) for column in zip(*farmers)]
+    state, irrigate, amount = consumat.decide_batch(*inputs)
+    for i, args in enumerate(farmers):
+        expected = consumat.decide(*args)
+        actual = (consumat.STATES[state[i]],
+                  consumat.IRRIGATE if irrigate[i] else consumat.NO_IRRIGATION,
+                  float(amount[i]))
+        assert actual == expected, f"farmer {i} with inputs {args}"
+
+
+@settings(max_examples=300, deadline=None)
+@given(st.lists(farmer(), min_size=1, max_size=50))
+@example([(0.5, 0.5, 0.5, 0.5, consumat.DRY_SOIL, consumat.CONSERVE_STORAGE)])
+@example([(0.4, 0.6, 0.5, 0.5, 0.5, consumat.LOW_STORAGE)])
+@example([(0.9, 0.1, 0.5, 0.5, 0.9, consumat.CRITICAL_STORAGE - 1e-9)])
+def test_decide_batch_matches_decide(farmers):
+    assert_batch_matches_scalar(farmers)
+
+
+@pytest.mark.parametrize("storage", [0.0, 4.9, consumat.CRITICAL_STORAGE])
+@pytest.mark.parametrize("soil", [0.1, consumat.WET_SOIL, 0.95])
+def test_storage_and_soil_overrides(storage, soil):
+    # Every state under critical storage and wet soil
+    farmers = [(s, u, 0.5, 0.5, soil, storage) for s in (0.2, 0.8) for u in (0.2, 0.8)]
+    assert_batch_matches_scalar(farmers)
+    _, irrigate, amount = consumat.decide_batch(*(np.array(c) for c in zip(*farmers)))
+    if storage < consumat.CRITICAL_STORAGE:
+        assert not irrigate.any() and not amount.any()
+
+
+def test_social_adjustment_without_neighbors():
+    table = neighbors.from_points(np.zeros((1, 2)), 3)
+    assert table.k == 0
+    state_index, irrigate = np.array([1]), np.array([True])
+    amount = np.array([5.0])
+    got = consumat.social_adjustment(state_index, irrigate, amount, [0.2], table)
+    assert got[0] is irrigate and got[1] is amount
+
+
+def test_imitator_copies_whether_to_irrigate():
+    # Farmer 0 imitates farmer 1, more satisfied and not irrigating
+    table = neighbors.from_edges(2, [0], [1], 1)
+    irrigate, amount = consumat.social_adjustment(
+        np.array([1, 0]), np.array([True, False]), np.array([5.0, 0.0]),
+        np.array([0.2, 0.9]), table,
+    )
+    assert irrigate.tolist() == [False, False]
+    assert amount.tolist() == [0.0, 0.0]
+
+
+def test_imitator_copies_an_irrigating_neighbor():
+    table = neighbors.from_edges(2, [0], [1], 1)
+    irrigate, amount = consumat.social_adjustment(
+        np.array([1, 0]), np.array([True, True]), np.array([5.0, 8.0]),
+        np.array([0.2, 0.9]), table,
+    )
+    assert irrigate.tolist() == [True, True]
+    assert amount.tolist() == [8.0, 8.0]
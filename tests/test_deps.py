@@ -0,0 +1,19 @@
+import pytest
+
+from pychamp_faasr import deps
+
+
+def test_preinstalled_image_with_every_module(monkeypatch):
+    monkeypatch.setenv(deps.PREINSTALLED_ENV, "1")
+    monkeypatch.setattr(deps, "install_online",
+                        lambda modules: pytest.fail(f"installed {modules} in a complete image"))
+    assert deps.install_dependencies(modules=("json",)) >= 0.0
+
+
+def test_preinstalled_image_missing_a_module_installs_it(monkeypatch, tmp_path):
+    monkeypatch.setenv(deps.PREINSTALLED_ENV, "1")
+    monkeypatch.setattr(deps, "WHEELHOUSE_DIR", str(tmp_path))
+    installed = []
+    monkeypatch.setattr(deps, "install_online", installed.extend)
+    deps.install_dependencies(modules=("json", "no_such_module_xyz"))
+    assert installed == ["no_such_module_xyz"]
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from pychamp_faasr import ensemble, stages
+
+
+def test_apply_sets_nested_and_list_paths():
+    settings = ensemble.apply(stages.DEFAULT_SETTINGS, {
+        "aquifer.aq_a": 0.2,
+        "finance.crop_price.corn": 6.0,
+        "field.water_yield_curves.corn.0": 12.0,
+    })
+    assert settings["aquifer"]["aq_a"] == 0.2
+    assert settings["finance"]["crop_price"]["corn"] == 6.0
+    assert settings["field"]["water_yield_curves"]["corn"][0] == 12.0
+    # The base settings are left alone
+    assert stages.DEFAULT_SETTINGS["aquifer"]["aq_a"] == 0.1
+    assert stages.DEFAULT_SETTINGS["field"]["water_yield_curves"]["corn"][0] == 10.0
+
+
+def test_walk_returns_parent_and_key():
+    settings = {"a": {"b": [1, 2, {"c": 3}]}}
+    assert ensemble._walk(settings, "a.b.1") == (settings["a"]["b"], 1)
+    assert ensemble._walk(settings, "a.b.2.c") == (settings["a"]["b"][2], "c")
+    with pytest.raises(KeyError):
+        ensemble._walk(settings, "a.x.y")
+
+
+@pytest.mark.parametrize("n_scenarios,n_shards", [(10, 3), (3, 5), (0, 2), (7, 1)])
+def test_partition_covers_every_scenario_once(n_scenarios, n_shards):
+    shards = [ensemble.partition(n_scenarios, n_shards, rank) for rank in range(1, n_shards + 1)]
+    assert [i for shard in shards for i in shard] == list(range(n_scenarios))
+    sizes = [len(shard) for shard in shards]
+    assert max(sizes) - min(sizes) <= 1
+
+
+def test_partition_rejects_bad_rank():
+    with pytest.raises(ValueError):
+        ensemble.partition(10, 3, 4)
+
+
+def fake_run(settings, n_seasons=1):
+    """run_scenario stand-in: profit from the corn price, failing on an unknown tech"""
+    if settings["field"]["init"]["tech"] not in settings["finance"]["irr_tech_operational_cost"]:
+        raise ValueError("unknown tech")
+    row = {c: 0.0 for c in ensemble.RESULT_COLUMNS}
+    row["profit"] = settings["finance"]["crop_price"]["corn"] * n_seasons
+    return row
+
+
+def test_failed_rows_and_string_columns(monkeypatch):
+    monkeypatch.setattr(ensemble, "run_scenario", fake_run)
+    spec = {"method": "list", "n_seasons": 2, "scenarios": [
+        {"field.init.tech": "drip", "finance.crop_price.corn": 4.0},
+        {"field.init.tech": "bogus", "finance.crop_price.corn": 5.0},
+        {"field.init.tech": "gravity"},
+        {"field.missing.path": 1.0},
+    ]}
+    table = ensemble.run_shard(spec, 1, 1)
+
+    assert table["failed"].tolist() == [False, True, False, True]
+    assert table["field.init.tech"].dtype.kind == "U"
+    # Unset paths show the base setting, or nothing if the base has none
+    assert table["field.init.tech"].tolist() == ["drip", "bogus", "gravity", "sprinkler"]
+    np.testing.assert_array_equal(table["finance.crop_price.corn"], [4.0, 5.0, 5.0, 5.0])
+    np.testing.assert_array_equal(table["field.missing.path"], [np.nan, np.nan, np.nan, 1.0])
+    np.testing.assert_array_equal(table["profit"], [8.0, np.nan, 10.0, np.nan])
+    assert table["shard"].tolist() == [1] * 4
+
+
+def test_shards_concatenate_in_scenario_order(monkeypatch):
+    monkeypatch.setattr(ensemble, "run_scenario", fake_run)
+    spec = {"parameters": {"finance.crop_price.corn": [1.0, 2.0, 3.0, 4.0, 5.0]}}
+    parts = [ensemble.run_shard(spec, rank, 2) for rank in (2, 1)]
+    table = ensemble.concat_tables(parts)
+    assert table["scenario"].tolist() == [0, 1, 2, 3, 4]
+    assert table["shard"].tolist() == [1, 1, 1, 2, 2]
+    np.testing.assert_array_equal(table["profit"], [1.0, 2.0, 3.0, 4.0, 5.0])
@@ -0,0 +1,212 @@
+import numpy as np
+import pytest
+
+from pychamp_faasr import kernels, stages
+
+
+def aquifer_loop(st, withdrawals, inflows=None, aq_a=None, aq_b=None, area=None, sy=None):
+    """One aquifer season by season, with the arithmetic of Aquifer.step"""
+    trajectory = []
+    for t, withdrawal in enumerate(withdrawals):
+        inflow = None if inflows is None else inflows[t]
+        if inflow is None or np.isnan(inflow):
+            dwl = aq_b - aq_a * withdrawal
+        else:
+            dwl = (inflow - withdrawal) / (area * sy)
+        st += dwl
+        trajectory.append(st)
+    return trajectory
+
+
+def test_aquifer_kernel_regression_by_hand():
+    st, dwl = kernels.aquifer_kernel(30.0, [[50.0]], aq_a=0.001, aq_b=0.1)
+    assert dwl[0, 0] == pytest.approx(0.05)
+    assert st[0, 0] == pytest.approx(30.05)
+
+
+def test_aquifer_kernel_water_balance_by_hand():
+    st, dwl = kernels.aquifer_kernel(30.0, [[100.0]], inflow=[[200.0]], area=1000.0, sy=0.05)
+    assert dwl[0, 0] == pytest.approx(2.0)
+    assert st[0, 0] == pytest.approx(32.0)
+
+
+def test_aquifer_kernel_matches_season_loop():
+    withdrawal = np.array([[10.0, 80.0, 35.5, 0.0], [120.0, 5.0, 60.0, 44.0]])
+    inflow = np.array([[50.0, np.nan, 20.0, 0.0], [np.nan, np.nan, 300.0, 10.0]])
+    params = dict(aq_a=np.array([0.002, 0.0005]), aq_b=np.array([0.1, -0.05]),
+                  area=np.array([800.0, 2500.0]), sy=np.array([0.05, 0.12]))
+    st0 = np.array([30.0, 12.5])
+
+    st, _ = kernels.aquifer_kernel(st0, withdrawal, inflow, **params)
+    for i in range(2):
+        expected = aquifer_loop(st0[i], withdrawal[i], inflow[i],
+                                **{k: v[i] for k, v in params.items()})
+        # Same additions in the same order: bit-identical
+        assert st[i].tolist() == expected
+
+    projection = kernels.aquifer_projection(st0, withdrawal, inflow, **params)
+    assert projection.shape == (2, 2, 4)
+    np.testing.assert_allclose(projection[[0, 1], [0, 1]], st, rtol=1e-12)
+
+
+def test_aquifer_projection_regression_closed_form():
+    schedule = np.array([10.0, 20.0, 30.0])
+    trajectory = kernels.aquifer_projection(20.0, schedule, aq_a=0.01, aq_b=0.2)
+    np.testing.assert_allclose(trajectory[0, 0], aquifer_loop(20.0, schedule, aq_a=0.01, aq_b=0.2))
+
+
+CURVES = np.array([
+    # ymax, wmax, a, b, c, min_y_ratio
+    [200.0, 50.0, -1.0, 2.0, 0.0, 0.0],
+    [150.0, 40.0, -0.5, 1.2, 0.1, 0.2],
+])
+TECH = np.array([[2.0, 1.0, 4.0], [1.5, 0.5, 3.0]])
+
+
+def field_loop(irr_depth, i_crop, te, prec_aw, field_area):
+    """One field section by section and crop by crop, as Field.step computes it"""
+    n_s, n_c = i_crop.shape
+    section_area = field_area / n_s
+    y = np.zeros((n_s, n_c))
+    y_y_total = 0.0
+    irr_vol = 0.0
+    for s in range(n_s):
+        for c in range(n_c):
+            if not i_crop[s, c]:
+                continue
+            ymax, wmax, a, b, cc, min_y = CURVES[c]
+            w = (irr_depth[s, c] + prec_aw[c]) / wmax
+            y_y = min(max(a * w ** 2 + b * w + cc, min_y), 1)
+            y[s, c] = y_y * ymax * section_area * 1e-4
+            y_y_total += y_y
+            irr_vol += irr_depth[s, c] * section_area * 0.01
+    q_a, q_b, l_pr = TECH[te]
+    return y, y_y_total / n_s, irr_vol, q_a * irr_vol / l_pr + q_b
+
+
+def test_field_kernel_by_hand():
+    # w' = (20 + 30) / 50 = 1: y_y = -1 + 2 = 1, y = 200 * 10 ha * 1e-4
+    out = kernels.field_kernel([[[20.0, 0.0]]], [[[1, 0]]], [0], [30.0, 0.0], CURVES, TECH, 10.0)
+    assert out["y_y"][0, 0, 0] == pytest.approx(1.0)
+    assert out["y"][0, 0].tolist() == pytest.approx([0.2, 0.0])
+    assert out["avg_y_y"][0] == pytest.approx(1.0)
+    assert out["irr_vol"][0] == pytest.approx(2.0)
+    assert out["pumping_rate"][0] == pytest.approx(2.0 * 2.0 / 4.0 + 1.0)
+
+    # w' = 25 / 50 = 0.5: y_y = -0.25 + 1 = 0.75, no irrigation
+    out = kernels.field_kernel([[[0.0, 0.0]]], [[[1, 0]]], [1], [25.0, 0.0], CURVES, TECH, 10.0)
+    assert out["y_y"][0, 0, 0] == pytest.approx(0.75)
+    assert out["pumping_rate"][0] == pytest.approx(0.5)
+
+
+def test_field_kernel_matches_section_loop():
+    rng = np.random.default_rng(3)
+    n, n_s, n_c = 5, 3, 2
+    irr_depth = rng.uniform(0, 40, (n, n_s, n_c))
+    i_crop = np.zeros((n, n_s, n_c))
+    i_crop[np.arange(n)[:, None], np.arange(n_s), rng.integers(0, n_c, (n, n_s))] = 1
+    te = rng.integers(0, 2, n)
+    prec_aw = rng.uniform(0, 30, (n, n_c))
+    field_area = rng.uniform(5, 50, n)
+
+    out = kernels.field_kernel(irr_depth, i_crop, te, prec_aw, CURVES, TECH, field_area)
+    for i in range(n):
+        y, avg_y_y, irr_vol, pumping_rate = field_loop(irr_depth[i], i_crop[i], te[i],
+                                                       prec_aw[i], field_area[i])
+        np.testing.assert_allclose(out["y"][i], y, rtol=1e-12)
+        assert out["avg_y_y"][i] == pytest.approx(avg_y_y, rel=1e-12)
+        assert out["irr_vol"][i] == pytest.approx(irr_vol, rel=1e-12)
+        assert out["pumping_rate"][i] == pytest.approx(pumping_rate, rel=1e-12)
+
+
+def test_finance_kernel_by_hand():
+    # Two fields, corn/soy/wheat, one price scenario
+    y = [[2.0, 0.0, 1.0], [0.0, 3.0, 0.0]]
+    result = kernels.finance_kernel(y, [10.0, 20.0], [5.0, 10.0, 3.0], 0.1, [1.0, 2.0])
+    np.testing.assert_allclose(result["revenue"], [[13.0, 30.0]])
+    np.testing.assert_allclose(result["energy_cost"], [[1.0, 2.0]])
+    np.testing.assert_allclose(result["tech_cost"], [[1.0, 2.0]])
+    np.testing.assert_allclose(result["profit"], [[11.0, 26.0]])
+
+
+def test_finance_kernel_scenarios_match_loop():
+    rng = np.random.default_rng(3)
+    n_s, n_f, n_c = 4, 5, 3
+    y = rng.uniform(0, 5, (n_f, n_c))
+    energy = rng.uniform(0, 2, n_f)
+    crop_price = rng.uniform(2, 12, (n_s, n_c))
+    energy_price = rng.uniform(0.05, 0.2, n_s)
+    tech_cost = rng.uniform(0, 300, (n_s, n_f))
+
+    result = kernels.finance_kernel(y, energy, crop_price, energy_price, tech_cost)
+    for key in result:
+        assert result[key].shape == (n_s, n_f)
+    for s in range(n_s):
+        for f in range(n_f):
+            revenue = sum(y[f, c] * crop_price[s, c] for c in range(n_c))
+            energy_cost = energy[f] * energy_price[s]
+            assert result["revenue"][s, f] == pytest.approx(revenue)
+            assert result["energy_cost"][s, f] == pytest.approx(energy_cost)
+            assert result["tech_cost"][s, f] == tech_cost[s, f]
+            assert result["profit"][s, f] == pytest.approx(revenue - energy_cost - tech_cost[s, f])
+
+
+def test_finance_kernel_broadcasts_unvaried_prices():
+    y = np.array([[1.0, 2.0, 3.0]])
+    # Fixed crop prices under three energy prices, and the reverse
+    by_energy = kernels.finance_kernel(y, [4.0], [1.0, 1.0, 1.0], [0.1, 0.2, 0.3])
+    np.testing.assert_allclose(by_energy["revenue"], [[6.0], [6.0], [6.0]])
+    np.testing.assert_allclose(by_energy["energy_cost"], [[0.4], [0.8], [1.2]])
+    by_crop = kernels.finance_kernel(y, [4.0], [[1.0, 1.0, 1.0], [2.0, 0.0, 0.0]], 0.5, 1.0)
+    np.testing.assert_allclose(by_crop["profit"], [[6.0 - 2.0 - 1.0], [2.0 - 2.0 - 1.0]])
+
+
+# Parity with the PyCHAMP components themselves, where PyCHAMP is installed
+
+
+def test_aquifer_kernel_matches_pychamp():
+    pytest.importorskip("py_champ")
+    from py_champ.components.aquifer import Aquifer
+
+    rng = np.random.default_rng(5)
+    withdrawal = rng.uniform(0, 10, (3, 4))
+    inflow = rng.uniform(0, 5, (3, 4))
+    inflow[1] = np.nan
+    settings = stages.DEFAULT_SETTINGS["aquifer"]
+    params = {k: settings[k] for k in ("aq_a", "aq_b", "area", "sy")}
+    st, dwl = kernels.aquifer_kernel(settings["init"]["st"], withdrawal, inflow, **params)
+
+    model = stages.new_model()
+    for i in range(3):
+        aquifer = Aquifer(f"aq{i}", model, dict(params, init=dict(settings["init"])))
+        for t in range(4):
+            step_inflow = None if np.isnan(inflow[i, t]) else inflow[i, t]
+            assert dwl[i, t] == pytest.approx(aquifer.step(withdrawal=withdrawal[i, t],
+                                                           inflow=step_inflow), rel=1e-12)
+            assert st[i, t] == pytest.approx(aquifer.st, rel=1e-12)
+
+
+def test_field_kernel_matches_pychamp():
+    pytest.importorskip("py_champ")
+
+    rng = np.random.default_rng(6)
+    n, n_s, n_c = 4, stages.AREA_SPLIT, len(stages.CROP_OPTIONS)
+    settings = stages.DEFAULT_SETTINGS["field"]
+    curves, tech_coefs, tech_options = kernels.field_tables(settings, stages.CROP_OPTIONS)
+    irr_depth = rng.uniform(0, 40, (n, n_s, n_c))
+    i_crop = np.zeros((n, n_s, n_c))
+    i_crop[np.arange(n)[:, None], np.arange(n_s), rng.integers(0, n_c, (n, n_s))] = 1
+    te = rng.integers(0, len(tech_options), n)
+    field_area = rng.uniform(5, 50, n)
+    prec_aw = [stages.PREC_AW[c] for c in stages.CROP_OPTIONS]
+    out = kernels.field_kernel(irr_depth, i_crop, te, prec_aw, curves, tech_coefs, field_area)
+
+    model = stages.new_model()
+    for i in range(n):
+        field = stages.new_field(model, dict(settings, field_area=field_area[i]), f"f{i}")
+        y, avg_y_y, irr_vol = field.step(irr_depth[i][..., None], i_crop[i][..., None],
+                                         tech_options[te[i]], stages.PREC_AW)
+        np.testing.assert_allclose(out["y"][i], np.reshape(y, out["y"][i].shape), rtol=1e-12)
+        assert out["avg_y_y"][i] == pytest.approx(avg_y_y, rel=1e-12)
+        assert out["irr_vol"][i] == pytest.approx(irr_vol, rel=1e-12)
+        assert out["pumping_rate"][i] == pytest.approx(field.pumping_rate, rel=1e-12)
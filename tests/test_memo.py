@@ -0,0 +1,122 @@
+import json
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from pychamp_faasr import memo, tables
+from pychamp_faasr.state import ShardedState
+from pychamp_faasr.store import DataStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return DataStore(local_root=str(tmp_path / "store"))
+
+
+def initial_state():
+    return {
+        "workflow_step": 1,
+        "settings": {"years": 3},
+        "components": {"field": tables.from_records("field", [{"st": 1.0}, {"st": 2.0}])},
+    }
+
+
+def run_step(store, invocation_id):
+    """The cache round of a field-like step: lookup, and on a miss write and store"""
+    layout = ShardedState(store, invocation_id, state_codec="json")
+    layout.read_manifest()
+    cache, key, hit = memo.lookup("field", layout, ["settings", "field"], args={"n": 2})
+    if not hit:
+        state = layout.read(["settings", "field"])
+        state["workflow_step"] += 1
+        layout.write(state, ["field"], arrays={"yields": np.arange(6.0).reshape(2, 3)})
+        cache.put(key, "field", layout)
+    return layout, hit
+
+
+def test_cache_hit_commits_sidecars_without_numpy(store, monkeypatch):
+    for invocation_id in ("first", "second"):
+        ShardedState(store, invocation_id, state_codec="json").write(
+            initial_state(), ["settings", "field"], force=True
+        )
+
+    first, hit = run_step(store, "first")
+    assert not hit
+
+    # A cold container: the hit happens before the stack is installed
+    with monkeypatch.context() as m:
+        m.setitem(sys.modules, "numpy", None)
+        second, hit = run_step(store, "second")
+
+    assert hit
+    assert second.manifest["version"] == 2
+    assert second.manifest["meta"] == first.manifest["meta"]
+    assert second.manifest["arrays"]["yields"]["dtype"] == "<f8"
+    assert second.manifest["arrays"]["yields"]["shape"] == [2, 3]
+    reader = ShardedState(store, "second", state_codec="json")
+    reader.read_manifest()
+    np.testing.assert_array_equal(reader.read_arrays(["yields"])["yields"],
+                                  np.arange(6.0).reshape(2, 3))
+
+
+def entry_names(store, key):
+    return [p.rsplit("/", 1)[1] for p in store.list(f"{memo.CACHE_FOLDER}/{key}/")
+            if p.rsplit("/", 1)[1].startswith("entry-")]
+
+
+def test_hits_update_only_their_own_entry(store):
+    for invocation_id in ("first", "second", "third"):
+        ShardedState(store, invocation_id, state_codec="json").write(
+            initial_state(), ["settings", "field"], force=True
+        )
+    run_step(store, "first")
+    (key,) = memo.StepCache(store)._list()
+    before = entry_names(store, key)
+
+    assert run_step(store, "second")[1] and run_step(store, "third")[1]
+    after = entry_names(store, key)
+    assert len(after) == 1 and after != before
+    with open(store._local_path(f"{memo.CACHE_FOLDER}/{key}", after[0])) as f:
+        assert json.load(f)["hits"] == 2
+    # No shared index object
+    assert all("/" in p[len(memo.CACHE_FOLDER) + 1:] for p in store.list(f"{memo.CACHE_FOLDER}/"))
+
+
+def fake_entry(store, key, last_access, size=10, names=("field",)):
+    folder = f"{memo.CACHE_FOLDER}/{key}"
+    with open("blob", "w") as f:
+        f.write("x")
+    for name in names:
+        store.put("blob", folder, name)
+    store.put("blob", folder, memo._entry_file(last_access, size))
+
+
+def test_evict_finds_entries_by_listing(store):
+    cache = memo.StepCache(store, max_entries=2)
+    now = time.time()
+    for i, key in enumerate(["old", "mid", "new"]):
+        fake_entry(store, key, now - 100 + i)
+    with open("blob", "w") as f:
+        f.write("x")
+    # A store that died before its entry, one still uploading, and a
+    # leftover without a marker
+    store.put("blob", f"{memo.CACHE_FOLDER}/dead", f"pending-{int((now - 7200) * 1000)}")
+    store.put("blob", f"{memo.CACHE_FOLDER}/dead", "field")
+    store.put("blob", f"{memo.CACHE_FOLDER}/uploading", f"pending-{int(now * 1000)}")
+    store.put("blob", f"{memo.CACHE_FOLDER}/uploading", "field")
+    store.put("blob", f"{memo.CACHE_FOLDER}/stray", "field")
+
+    assert cache.evict(now) == 1
+    assert sorted(cache._list()) == ["mid", "new", "uploading"]
+
+
+def test_evict_by_bytes(store):
+    cache = memo.StepCache(store, max_bytes=25)
+    now = time.time()
+    for i, key in enumerate(["a", "b", "c"]):
+        fake_entry(store, key, now + i, size=10)
+    assert cache.evict(now) == 1
+    assert sorted(cache._list()) == ["b", "c"]
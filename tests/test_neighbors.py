@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from pychamp_faasr import neighbors
+
+pytest.importorskip("scipy")
+
+
+def assert_same_neighbors(points, k):
+    grid = neighbors.from_points(points, k, method="grid")
+    kdtree = neighbors.from_points(points, k, method="kdtree")
+    np.testing.assert_allclose(grid.distances, kdtree.distances)
+    # Ties may be broken differently, so compare distances, not indices
+    assert not (grid.indices == np.arange(len(points))[:, None]).any()
+
+
+@pytest.mark.parametrize("points", [
+    np.c_[np.arange(20.0), np.zeros(20)],
+    np.c_[np.zeros(30), np.arange(30.0) * 3],
+    np.c_[np.arange(25.0), np.arange(25.0) * 2],
+], ids=["horizontal", "vertical", "diagonal"])
+def test_grid_collinear_points(points):
+    assert_same_neighbors(points, 3)
+
+
+def test_grid_duplicate_points():
+    assert_same_neighbors(np.zeros((10, 2)), 3)
+    rng = np.random.default_rng(1)
+    points = np.repeat(rng.uniform(0, 10, (15, 2)), 3, axis=0)
+    assert_same_neighbors(points, 4)
+
+
+def test_grid_scattered_points():
+    rng = np.random.default_rng(0)
+    points = np.r_[rng.uniform(0, 1, (200, 2)), rng.uniform(50, 51, (50, 2))]
+    assert_same_neighbors(points, 5)
+
+
+def test_behavior_step_loads_neighbors_through_its_store(tmp_path, monkeypatch):
+    from behavior_step_faasr import load_neighbors
+    from pychamp_faasr.store import DataStore
+
+    monkeypatch.chdir(tmp_path)
+    store = DataStore(local_root=str(tmp_path / "store"))
+    state = {"field": {"x": [0.0, 1.0, 2.0], "y": [0.0, 0.0, 1.0]},
+             "behavior": {"neighbors_k": 1}}
+    built = load_neighbors(store, state)
+    assert store.bytes_out > 0 and store.bytes_in == 0
+
+    loaded = load_neighbors(store, state)
+    assert store.bytes_in > 0
+    np.testing.assert_array_equal(loaded.indices, built.indices)
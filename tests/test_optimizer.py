@@ -0,0 +1,36 @@
+from pychamp_faasr.optimizer import SolutionCache
+
+
+def test_solution_cache_update_adds_missing_entries_as_least_recent():
+    cache = SolutionCache({"a": 1, "b": 2}, max_size=4)
+    cache.update(SolutionCache({"b": 20, "c": 3, "d": 4, "e": 5}, {"farmer": 7}))
+
+    # Own entries stay most recent and keep their values; the oldest go first
+    assert list(cache.memo) == ["d", "e", "a", "b"]
+    assert cache.memo["b"] == 2
+    assert cache.previous == {"farmer": 7}
+
+
+def test_solution_cache_get_and_put_keep_lru_order():
+    cache = SolutionCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert list(cache.memo) == ["a", "c"]
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_solution_cache_bounds_previous_plans():
+    cache = SolutionCache(max_size=2)
+    for agent in ("a", "b", "c"):
+        cache.remember(agent, agent.upper())
+    assert list(cache.previous) == ["b", "c"]
+
+    # Merged plans of other agents come in as least recently used
+    cache.update(SolutionCache(previous={"x": "X", "b": "other"}))
+    assert cache.previous == {"b": "B", "c": "C"}
+    cache.remember("d", "D")
+    assert list(cache.previous) == ["c", "d"]
+    assert len(SolutionCache(previous={str(i): i for i in range(5)}, max_size=3).previous) == 3
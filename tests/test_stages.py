@@ -0,0 +1,114 @@
+import copy
+
+import numpy as np
+import pytest
+
+from pychamp_faasr import ensemble, stages, tables
+
+
+def initial_state(field_area):
+    """The state init writes, with array-valued field settings"""
+    settings = copy.deepcopy(stages.DEFAULT_SETTINGS)
+    settings["field"]["field_area"] = field_area
+    components = {
+        "field": tables.from_records("field", [{
+            "id": stages.FIELD_ID, "well_id": stages.WELL_ID, "field_area": 100.0,
+            "crops": ["corn"] * stages.AREA_SPLIT, "tech": "sprinkler",
+        }]),
+        "finance": tables.from_records("finance", [{
+            "id": stages.FINANCE_ID,
+            "energy_price": settings["finance"]["energy_price"],
+            "crop_price": settings["finance"]["crop_price"],
+            "crop_cost": settings["finance"]["crop_cost"],
+        }]),
+    }
+    return {"model_step": 0, "components": components, "settings": settings}
+
+
+def test_multi_row_fields_settle_every_row():
+    state = initial_state([100.0, 50.0, 10.0])
+    arrays = stages.field_batch_stage(state)["arrays"]
+    inputs = stages.finance_batch_stage(state, arrays)
+
+    field, finance = state["components"]["field"], state["components"]["finance"]
+    assert tables.n_rows(field) == tables.n_rows(finance) == 3
+    assert finance["id"].tolist() == ["fin1_0", "fin1_1", "fin1_2"]
+
+    # Every field's yield reaches finance, not only row 0
+    np.testing.assert_allclose(inputs["y"].sum(axis=1), field["yield"])
+    prices = np.array([state["settings"]["finance"]["crop_price"][c] for c in stages.CROP_OPTIONS])
+    np.testing.assert_allclose(finance["revenue"], inputs["y"] @ prices)
+    np.testing.assert_allclose(finance["energy_cost"],
+                               field["pumping_rate"] * 0.001
+                               * state["settings"]["finance"]["energy_price"])
+    np.testing.assert_allclose(finance["profit"],
+                               finance["revenue"] - finance["energy_cost"] - finance["tech_cost"])
+    # Fields of area 100, 50 and 10 ha grow in proportion
+    np.testing.assert_allclose(field["yield"] / field["yield"][0], [1.0, 0.5, 0.1])
+
+
+def test_tech_and_crop_changes_are_charged():
+    state = initial_state([100.0, 50.0])
+    arrays = stages.field_batch_stage(state)["arrays"]
+    state["components"]["field"]["pre_tech"] = np.array(["sprinkler", "drip"])
+    arrays["field.pre_i_crop"] = arrays["field.i_crop"].copy()
+    arrays["field.pre_i_crop"][1, 0] = np.roll(arrays["field.pre_i_crop"][1, 0], 1, axis=0)
+    stages.finance_batch_stage(state, arrays)
+
+    costs = state["settings"]["finance"]
+    operational = costs["irr_tech_operational_cost"]["sprinkler"]
+    change = costs["irr_tech_change_cost"]["sprinkler"]
+    assert state["components"]["finance"]["tech_cost"].tolist() == [
+        operational, operational + change + costs["crop_change_cost"]
+    ]
+
+
+def test_price_risk_over_every_field():
+    state = initial_state([100.0, 50.0, 10.0])
+    inputs = stages.finance_batch_stage(state, stages.field_batch_stage(state)["arrays"])
+    table = stages.price_risk_stage(state, inputs, {"parameters": {"energy_price": [0.12, 0.24]}})
+    assert table["revenue"][0] == pytest.approx(state["components"]["finance"]["revenue"].sum())
+    assert table["profit"][0] == pytest.approx(state["components"]["finance"]["profit"].sum())
+    assert table["energy_cost"][1] == pytest.approx(2 * table["energy_cost"][0])
+
+
+def test_first_agent_of_array_valued_settings():
+    settings = ensemble.apply(stages.DEFAULT_SETTINGS, {
+        "field.field_area": [100.0, 50.0, 10.0], "aquifer.init.st": np.array([30.0, 20.0]),
+    })
+    assert stages.first_agent(settings["field"])["field_area"] == 100.0
+    assert stages.first_agent(settings["field"])["init"] == settings["field"]["init"]
+    assert stages.first_agent(settings["aquifer"])["init"] == {"st": 30.0, "dwl": 0.0}
+    assert stages.first_agent(settings["well"]) is settings["well"]
+
+
+def season_from(state, objects):
+    """field then finance on ``state``, restored cold or from snapshot ``objects``"""
+    sim = stages.restore_field(state, objects)
+    stages.field_stage(sim)
+    arrays = stages.field_arrays(sim.field)
+    sim = stages.restore_finance(state, arrays, objects)
+    stages.finance_stage(sim)
+    return state["components"]
+
+
+def test_snapshot_restore_matches_cold_rebuild(tmp_path, monkeypatch):
+    pytest.importorskip("py_champ")
+    from pychamp_faasr import snapshot
+    from pychamp_faasr.store import DataStore
+
+    monkeypatch.chdir(tmp_path)
+    store = DataStore(local_root=str(tmp_path / "store"))
+    state = stages.init_components().state
+    snapshot.save(store, "run", state["settings"])
+    # A later season: the state's technology is no longer the settings' one
+    tables.update("field", state["components"]["field"], {"tech": "drip"})
+
+    cold = season_from(copy.deepcopy(state), None)
+    warm_state = copy.deepcopy(state)
+    warm = season_from(warm_state, snapshot.restore(store, "run", warm_state["settings"]))
+    for name in ("field", "finance"):
+        assert list(warm[name]) == list(cold[name])
+        for column, values in cold[name].items():
+            np.testing.assert_array_equal(warm[name][column], values, err_msg=f"{name}.{column}")
+    assert warm["field"]["pre_tech"].tolist() == ["drip"]
@@ -0,0 +1,106 @@
+import copy
+import json
+import time
+
+import pytest
+
+from pychamp_faasr import tables
+from pychamp_faasr.state import (
+    MANIFEST, LostUpdateError, ShardedState, done_folder, prune_runs, run_folder,
+)
+from pychamp_faasr.store import DataStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return DataStore(local_root=str(tmp_path / "store"))
+
+
+def small_state():
+    return {
+        "workflow_step": 1,
+        "settings": {"years": 3},
+        "components": {"aquifer": tables.from_records("aquifer", [{"st": 10.0}])},
+    }
+
+
+def test_write_commits_completion_marker_with_state(store):
+    layout = ShardedState(store, "run", state_codec="json")
+    layout.write(small_state(), ["settings", "aquifer"], force=True,
+                 completes="init_components_faasr")
+
+    # Nothing under done/ yet: the manifest alone records the completion
+    assert not store.list(done_folder("run"))
+    manifest = ShardedState(store, "run").read_manifest()
+    marker = manifest["completed"]["init_components_faasr"]
+    assert marker["state_version"] == manifest["version"] == 1
+    assert marker["outputs"] == ["aquifer", "settings"]
+
+    # The done/ copy is the committed marker
+    assert layout.mark_complete("init_components_faasr") == marker
+    store.get(done_folder("run"), "init_components_faasr.json", "marker.json")
+    with open("marker.json") as f:
+        assert json.load(f) == marker
+
+
+def test_mark_complete_without_recorded_marker(store):
+    layout = ShardedState(store, "run", state_codec="json")
+    layout.write(small_state(), ["settings", "aquifer"], force=True)
+    marker = layout.mark_complete("results_step_faasr")
+    assert marker["state_version"] == 1
+    assert "completed" not in ShardedState(store, "run").read_manifest()
+
+
+def test_second_writer_loses_and_can_retry(store):
+    ShardedState(store, "run", state_codec="json").write(small_state(), ["settings", "aquifer"],
+                                                          force=True)
+    first, second = ShardedState(store, "run"), ShardedState(store, "run")
+    state, state_b = first.read(["aquifer"]), second.read(["aquifer"])
+    read = copy.deepcopy(second.manifest)
+
+    first.write(state, ["aquifer"])
+    with pytest.raises(LostUpdateError, match="at version 2, expected 1"):
+        second.write(state_b, ["aquifer"])
+    assert second.manifest == read
+
+    # Re-reading picks up the first writer's commit
+    second.write(second.read(["aquifer"]), ["aquifer"])
+    assert ShardedState(store, "run").read_manifest()["version"] == 3
+
+
+def test_overtaken_commit_leaves_manifest_unchanged(store, monkeypatch):
+    ShardedState(store, "run", state_codec="json").write(small_state(), ["settings", "aquifer"],
+                                                          force=True)
+    first, second = ShardedState(store, "run"), ShardedState(store, "run")
+    state, state_b = first.read(["aquifer"]), second.read(["aquifer"])
+    read = copy.deepcopy(second.manifest)
+
+    # The first writer commits right after the second one's manifest upload
+    put, raced = store.put, []
+
+    def racing_put(local, folder, remote):
+        size = put(local, folder, remote)
+        if remote == MANIFEST and not raced:
+            raced.append(True)
+            first.write(state, ["aquifer"], force=True)
+        return size
+
+    monkeypatch.setattr(store, "put", racing_put)
+    with pytest.raises(LostUpdateError, match="overtook version 2"):
+        second.write(state_b, ["aquifer"])
+    assert second.manifest == read
+    assert ShardedState(store, "run").read_manifest()["writer"] == first.writer
+
+
+def test_prune_runs_keeps_runs_without_manifest(store, monkeypatch):
+    old = ShardedState(store, "old", state_codec="json")
+    old.write(small_state(), ["settings", "aquifer"], force=True)
+
+    # A run still uploading its first shards: no manifest yet
+    store.put("state-settings", f"{run_folder('starting')}/state", "settings.v1")
+
+    monkeypatch.setattr(time, "time", lambda real=time.time: real() + 30 * 86400)
+    assert prune_runs(store, max_age_days=7) == ["old"]
+    assert store.list(run_folder("old")) == []
+    assert store.list(run_folder("starting")) == [f"{run_folder('starting')}/state/settings.v1"]